@@ -1,13 +1,35 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+import json
 import os
-import aiml
+import signal
+import threading
+import time
 import requests
 import uuid
 
+import metrics
+import prompt_layout
+from bots import BOT_TURNS, DEFAULT_BOT, BotRegistry, UnknownBotError
+from brain_loader import BrainLoader
+from drain import Drainer
+from fallback_log import FallbackLog
+from language import LanguageRouter
+from llm_router import build_router
+from llm_resilience import CircuitOpenError
+from session_store import SessionStore
+from lanes import Lane, LaneFullError, SessionRateLimiter
+from match_budget import BudgetedKernel, BudgetExceeded, cap_input
+from memory_stats import MemoryAccountant, TracemallocDiff
+from near_miss import NearMissRetriever
+from spelling import SpellCorrector
+
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 CORS(app, supports_credentials=True)
+sock = Sock(app)
 
 # LiteLLM Configuration
 LITELLM_BASE_URL = os.getenv('LITELLM_BASE_URL', 'http://host.docker.internal:8080')
@@ -16,13 +38,144 @@ LITELLM_MODEL = os.getenv('LITELLM_MODEL', '')
 LITELLM_MAX_CONTEXT_TOKENS = int(os.getenv('LITELLM_MAX_CONTEXT_TOKENS', '1800'))
 LITELLM_MAX_COMPLETION_TOKENS = int(os.getenv('LITELLM_MAX_COMPLETION_TOKENS', '150'))
 LITELLM_SYSTEM_PROMPT = os.getenv('LITELLM_SYSTEM_PROMPT', 'You are a helpful and friendly chatbot assistant.')
+# Share one upstream call between concurrent byte-identical requests
+LITELLM_COALESCE = os.getenv('LITELLM_COALESCE', 'true').lower() == 'true'
+# Resilience: adaptive timeout bounds (seconds), circuit breaker and hedged requests
+LITELLM_TIMEOUT = float(os.getenv('LITELLM_TIMEOUT', '30'))
+LITELLM_MIN_TIMEOUT = float(os.getenv('LITELLM_MIN_TIMEOUT', '5'))
+LITELLM_BREAKER_FAILURES = int(os.getenv('LITELLM_BREAKER_FAILURES', '5'))
+LITELLM_BREAKER_COOLDOWN = float(os.getenv('LITELLM_BREAKER_COOLDOWN', '30'))
+LITELLM_HEDGE = os.getenv('LITELLM_HEDGE', 'false').lower() == 'true'
+# Prompt layout (see prompt_layout.py): "legacy" or "stable" (byte-stable
+# prefix for provider prompt caching)
+LITELLM_PROMPT_LAYOUT = os.getenv('LITELLM_PROMPT_LAYOUT', prompt_layout.LEGACY)
+# Stable layout: text file appended to the system prompt on every turn
+LITELLM_PINNED_CONTEXT_FILE = os.getenv('LITELLM_PINNED_CONTEXT_FILE', '')
+# Stable layout: history messages kept before the window start jumps ahead
+LITELLM_HISTORY_WINDOW = int(os.getenv('LITELLM_HISTORY_WINDOW', '10'))
+# Stable layout: send the prefix as a system message instead of in the first user message
+LITELLM_SYSTEM_ROLE = os.getenv('LITELLM_SYSTEM_ROLE', 'false').lower() == 'true'
+# Stable layout: mark cache breakpoints for Anthropic / Bedrock models
+LITELLM_CACHE_CONTROL = os.getenv('LITELLM_CACHE_CONTROL', 'false').lower() == 'true'
+
+# Execution lanes: AIML turns and LLM calls run on separate bounded pools
+FAST_LANE_WORKERS = int(os.getenv('FAST_LANE_WORKERS', '4'))
+FAST_LANE_QUEUE = int(os.getenv('FAST_LANE_QUEUE', '256'))
+SLOW_LANE_WORKERS = int(os.getenv('SLOW_LANE_WORKERS', '16'))
+SLOW_LANE_QUEUE = int(os.getenv('SLOW_LANE_QUEUE', '32'))
+# Per-session admission control: messages per second and burst size (0 = off)
+SESSION_RATE_LIMIT = float(os.getenv('SESSION_RATE_LIMIT', '0'))
+SESSION_BURST = int(os.getenv('SESSION_BURST', '10'))
+# Key anonymous clients by the first X-Forwarded-For hop instead of the peer
+# address (only behind a proxy that sets the header rather than appending to it)
+TRUST_X_FORWARDED_FOR = os.getenv('TRUST_X_FORWARDED_FOR', 'false').lower() == 'true'
+
+fast_lane = Lane("fast", FAST_LANE_WORKERS, FAST_LANE_QUEUE)
+slow_lane = Lane("slow", SLOW_LANE_WORKERS, SLOW_LANE_QUEUE)
+# Hedged calls run both attempts on a pool of their own; two workers per
+# slow-lane worker so a hedge never waits behind first attempts
+LITELLM_HEDGE_WORKERS = int(os.getenv('LITELLM_HEDGE_WORKERS', str(2 * SLOW_LANE_WORKERS)))
+rate_limiter = SessionRateLimiter(SESSION_RATE_LIMIT, SESSION_BURST)
+
+# Optional JSON list of models to route between (see llm_router.py); when
+# unset, every request goes to LITELLM_MODEL.
+LITELLM_MODELS = os.getenv('LITELLM_MODELS', '')
+# Default latency budget per request in milliseconds (0 = no budget)
+LITELLM_LATENCY_BUDGET_MS = int(os.getenv('LITELLM_LATENCY_BUDGET_MS', '0'))
+
+llm_router = build_router(
+    LITELLM_MODELS,
+    LITELLM_MODEL,
+    LITELLM_BASE_URL,
+    LITELLM_API_KEY,
+    LITELLM_MAX_COMPLETION_TOKENS,
+    latency_budget=LITELLM_LATENCY_BUDGET_MS / 1000.0 or None,
+    timeout=LITELLM_TIMEOUT,
+    coalesce=LITELLM_COALESCE,
+    min_timeout=LITELLM_MIN_TIMEOUT,
+    breaker_failures=LITELLM_BREAKER_FAILURES,
+    breaker_cooldown=LITELLM_BREAKER_COOLDOWN,
+    hedge=LITELLM_HEDGE,
+    hedge_workers=LITELLM_HEDGE_WORKERS
+)
+
+# Sent at the start of every stable-layout request
+LLM_PROMPT_PREFIX = LITELLM_SYSTEM_PROMPT
+if LITELLM_PINNED_CONTEXT_FILE:
+    with open(LITELLM_PINNED_CONTEXT_FILE, encoding='utf-8') as f:
+        LLM_PROMPT_PREFIX = f"{LITELLM_SYSTEM_PROMPT}\n\n{f.read().strip()}"
 
 BRAIN_FILE = "./data/aiml_pretrained_model.dump"
-k = aiml.Kernel()
+COMPACT_BRAIN_FILE = "./data/aiml_compact_model.dump"
+# Hold the brain in the compact representation (see compact_brain.py)
+AIML_COMPACT_BRAIN = os.getenv('AIML_COMPACT_BRAIN', 'true').lower() == 'true'
+# Serve from the core tier while the rest of data/ loads in the background
+AIML_TIERED_STARTUP = os.getenv('AIML_TIERED_STARTUP', 'true').lower() == 'true'
+AIML_CORE_FILES = os.getenv('AIML_CORE_FILES', 'reduction*.aiml,std-*.aiml').split(',')
+CORE_BRAIN_FILE = "./data/aiml_core_model.dump"
+k = BudgetedKernel()
+
+# Bound the work a single AIML response may do while holding the kernel lock;
+# past the budget the turn takes the fallback path (0 = unlimited).
+AIML_MATCH_MAX_STEPS = int(os.getenv('AIML_MATCH_MAX_STEPS', '100000'))
+AIML_MATCH_TIMEOUT_MS = int(os.getenv('AIML_MATCH_TIMEOUT_MS', '500'))
+# Inputs are trimmed to this many characters and sentences before matching
+AIML_MAX_INPUT_CHARS = int(os.getenv('AIML_MAX_INPUT_CHARS', '500'))
+AIML_MAX_SENTENCES = int(os.getenv('AIML_MAX_SENTENCES', '5'))
+# Longer chat messages are rejected outright (413)
+CHAT_MAX_MESSAGE_CHARS = int(os.getenv('CHAT_MAX_MESSAGE_CHARS', '4000'))
 
 # Store conversation context per session
 session_history = {}
 
+# Idle sessions (kernel predicates + session_history) are spilled to SQLite
+# and paged back in on their next turn; an empty AIML_SESSION_DB disables it.
+AIML_SESSION_DB = os.getenv('AIML_SESSION_DB', './data/sessions.db')
+AIML_MAX_HOT_SESSIONS = int(os.getenv('AIML_MAX_HOT_SESSIONS', '1000'))
+AIML_SESSION_IDLE_SECONDS = int(os.getenv('AIML_SESSION_IDLE_SECONDS', '600'))
+AIML_MAX_STORED_SESSIONS = int(os.getenv('AIML_MAX_STORED_SESSIONS', '100000'))
+session_store = SessionStore(
+    k,
+    session_history,
+    AIML_SESSION_DB,
+    max_hot=AIML_MAX_HOT_SESSIONS,
+    idle_seconds=AIML_SESSION_IDLE_SECONDS,
+    max_stored=AIML_MAX_STORED_SESSIONS
+)
+session_store.start()
+
+# Graceful drain on SIGTERM: refuse new sessions, let in-flight turns finish,
+# then hand every session over to the other pods through a directory they
+# all mount (see drain.py; an empty SESSION_HANDOFF_DIR drains without it).
+SESSION_HANDOFF_DIR = os.getenv('SESSION_HANDOFF_DIR', '')
+SESSION_HANDOFF_POLL_SECONDS = int(os.getenv('SESSION_HANDOFF_POLL_SECONDS', '10'))
+DRAIN_SETTLE_SECONDS = float(os.getenv('DRAIN_SETTLE_SECONDS', '5'))
+DRAIN_TIMEOUT_SECONDS = float(os.getenv('DRAIN_TIMEOUT_SECONDS', '30'))
+# The debug reloader serves from a child process that its parent kills on
+# SIGTERM, so it must be off for the drain to run
+FLASK_RELOADER = os.getenv('FLASK_RELOADER', 'true').lower() == 'true'
+drainer = Drainer(
+    session_store,
+    [fast_lane, slow_lane],
+    SESSION_HANDOFF_DIR,
+    settle_seconds=DRAIN_SETTLE_SECONDS,
+    timeout=DRAIN_TIMEOUT_SECONDS,
+    poll_seconds=SESSION_HANDOFF_POLL_SECONDS
+)
+# Under the debug reloader this module is also run by the parent process,
+# which only watches files and never serves: it must not claim handoff files
+RELOADER_PARENT = (__name__ == "__main__" and FLASK_RELOADER and
+                   os.environ.get('WERKZEUG_RUN_MAIN') != 'true')
+if not RELOADER_PARENT:
+    drainer.import_pending()
+    drainer.watch()
+
+# Hybrid-mode LLM fallbacks are appended here as JSON lines for offline
+# distillation into AIML (see distill.py); empty = off
+FALLBACK_LOG = os.getenv('FALLBACK_LOG', '')
+FALLBACK_LOG_MAX_MB = int(os.getenv('FALLBACK_LOG_MAX_MB', '100'))
+fallback_log = FallbackLog(FALLBACK_LOG, FALLBACK_LOG_MAX_MB * 1024 * 1024)
+
 def get_contextual_response(question, session_id, aiml_response):
     """
     Handle contextual responses based on conversation history
@@ -68,38 +221,94 @@ def get_contextual_response(question, session_id, aiml_response):
     # No contextual match, return original AIML response
     return aiml_response
 
-# Initialize AIML kernel
-if os.path.exists(BRAIN_FILE):
-    print("Loading from brain file: " + BRAIN_FILE)
-    k.loadBrain(BRAIN_FILE)
-else:
-    print("Parsing aiml files")
-    # Load all AIML files from data directory
-    # Load files in specific order: regular files first, then 'that' files last
-    # This ensures <that> patterns have higher priority
-    data_dir = "./data"
-    if os.path.exists(data_dir):
-        all_files = [f for f in os.listdir(data_dir) if f.endswith(".aiml")]
-        # Separate 'that' files from others
-        that_files = [f for f in all_files if 'that' in f.lower()]
-        other_files = [f for f in all_files if 'that' not in f.lower()]
-        
-        # Load other files first
-        for filename in sorted(other_files):
-            filepath = os.path.join(data_dir, filename)
-            print(f"Loading {filename}")
-            k.learn(filepath)
-        
-        # Load 'that' files last to ensure <that> patterns have priority
-        for filename in sorted(that_files):
-            filepath = os.path.join(data_dir, filename)
-            print(f"Loading {filename} (context patterns)")
-            k.learn(filepath)
-            
-        print("Saving brain file: " + BRAIN_FILE)
-        k.saveBrain(BRAIN_FILE)
-    else:
-        print("Warning: data directory not found")
+# Named bots: each answers from the shared brain plus its own overlay files,
+# e.g. {"german": ["std-german.aiml"], "alice": {"files": ["bot_profile.aiml",
+# "client_profile.aiml"], "predicates": {"name": "Alice"}}}.  Overlay files are
+# left out of the shared brain; the main kernel is the "default" bot.
+AIML_BOTS = os.getenv('AIML_BOTS', '')
+bot_registry = BotRegistry.from_json(k, "./data", AIML_BOTS)
+
+# Initialize AIML kernel: core tier now, remaining files in the background
+brain_loader = BrainLoader(
+    k,
+    data_dir="./data",
+    brain_file=BRAIN_FILE,
+    compact_brain_file=COMPACT_BRAIN_FILE,
+    core_brain_file=CORE_BRAIN_FILE,
+    core_patterns=AIML_CORE_FILES,
+    compact=AIML_COMPACT_BRAIN,
+    exclude_patterns=bot_registry.overlay_patterns()
+)
+bot_registry.load()
+brain_loader.listeners.append(bot_registry.rebuild)
+
+# Near-miss retrieval: answer inputs close to a literal pattern from AIML
+# instead of the LLM; the index is rebuilt whenever the brain is swapped.
+AIML_NEAR_MISS = os.getenv('AIML_NEAR_MISS', 'true').lower() == 'true'
+AIML_NEAR_MISS_THRESHOLD = float(os.getenv('AIML_NEAR_MISS_THRESHOLD', '0.75'))
+near_miss = NearMissRetriever(threshold=AIML_NEAR_MISS_THRESHOLD, enabled=AIML_NEAR_MISS)
+brain_loader.listeners.append(lambda brain, tier: near_miss.rebuild(brain))
+
+# Spelling correction against the pattern vocabulary; can be turned off per
+# request with "spell_correct": false.
+AIML_SPELL_CORRECT = os.getenv('AIML_SPELL_CORRECT', 'true').lower() == 'true'
+AIML_SPELL_MAX_EDIT = int(os.getenv('AIML_SPELL_MAX_EDIT', '1'))
+spell_corrector = SpellCorrector(max_edit=AIML_SPELL_MAX_EDIT, enabled=AIML_SPELL_CORRECT)
+brain_loader.listeners.append(lambda brain, tier: spell_corrector.rebuild(brain))
+
+# Language routing (see language.py): default-bot inputs detected as a
+# language with its own sub-brain are matched against that language's files
+# only, and the LLM is asked to answer in the detected language.
+# Language of data/ files without a <meta name="language"> tag
+LANGUAGE_DEFAULT = os.getenv('LANGUAGE_DEFAULT', 'en')
+# Languages given a sub-brain: comma-separated, "auto" (all but the default) or empty (none)
+AIML_LANGUAGE_BRAINS = os.getenv('AIML_LANGUAGE_BRAINS', 'auto')
+# Inputs detected with less confidence are matched against the main brain
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv('LANGUAGE_MIN_CONFIDENCE', '0.9'))
+LITELLM_LANGUAGE_HINT = os.getenv('LITELLM_LANGUAGE_HINT', 'true').lower() == 'true'
+language_router = LanguageRouter(
+    k,
+    "./data",
+    COMPACT_BRAIN_FILE,
+    default=LANGUAGE_DEFAULT,
+    brains=AIML_LANGUAGE_BRAINS if AIML_LANGUAGE_BRAINS == 'auto'
+    else [l.strip() for l in AIML_LANGUAGE_BRAINS.split(',') if l.strip()],
+    min_confidence=LANGUAGE_MIN_CONFIDENCE,
+    compact=AIML_COMPACT_BRAIN,
+    exclude_patterns=bot_registry.overlay_patterns()
+)
+brain_loader.listeners.append(language_router.on_swap)
+
+# Approximate memory accounting (see memory_stats.py), served on /debug/memory
+# and refreshed into the memory_* gauges every MEMORY_SAMPLE_SECONDS (0 = off)
+MEMORY_SAMPLE_SECONDS = int(os.getenv('MEMORY_SAMPLE_SECONDS', '60'))
+memory_accountant = MemoryAccountant(
+    brain_loader,
+    session_store,
+    caches={
+        "spelling_index": spell_corrector.approx_bytes,
+        "near_miss_index": near_miss.approx_bytes,
+        "rate_limiter": rate_limiter.approx_bytes,
+        "bot_overlays": bot_registry.approx_bytes,
+        "language_brains": language_router.approx_bytes,
+    },
+    in_flight=lambda: {lane.name: lane.stats()["queued"] + lane.stats()["active"]
+                       for lane in (fast_lane, slow_lane)},
+    interval=MEMORY_SAMPLE_SECONDS
+)
+brain_loader.listeners.append(memory_accountant.on_swap)
+memory_accountant.start()
+# tracemalloc snapshot diffs on /debug/memory/tracemalloc, for leak hunting
+MEMORY_TRACEMALLOC = os.getenv('MEMORY_TRACEMALLOC', 'false').lower() == 'true'
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv('MEMORY_TRACEMALLOC_FRAMES', '1'))
+tracemalloc_diff = TracemallocDiff(MEMORY_TRACEMALLOC_FRAMES)
+
+brain_loader.load(tiered=AIML_TIERED_STARTUP)
+
+HYBRID_TURNS = metrics.Counter(
+    "hybrid_turns_total",
+    "Hybrid mode turns by what answered them (aiml, near_miss, llm, aiml_llm_unavailable)",
+    ["answered_by"])
 
 
 @app.route("/")
@@ -110,9 +319,81 @@ def home():
     })
 
 
-@app.route("/stats", methods=["GET"])
-def get_stats():
-    """Get token usage and spend statistics from LiteLLM"""
+@app.route("/healthz", methods=["GET"])
+def liveness():
+    """Liveness probe: the process is up, with brain loading progress"""
+    return jsonify({"status": "alive", "brain": brain_loader.progress()})
+
+
+@app.route("/readyz", methods=["GET"])
+def readiness():
+    """Readiness probe: ready once at least the core brain tier is loaded"""
+    progress = brain_loader.progress()
+    if drainer.is_draining():
+        return jsonify({"status": drainer.state, "brain": progress}), 503
+    if brain_loader.is_ready():
+        return jsonify({"status": "ready", "brain": progress})
+    return jsonify({"status": "loading", "brain": progress}), 503
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Backend metrics in Prometheus text format"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/llm/models", methods=["GET"])
+def llm_models():
+    """Routable LLM models with their moving-average latency, errors and spend"""
+    return jsonify({"models": llm_router.stats()})
+
+
+# LiteLLM spend totals are cached and, while WebSockets are open, refreshed
+# in the background and pushed to clients instead of polled by each browser.
+USAGE_STATS_TTL = float(os.getenv('USAGE_STATS_TTL', '5'))
+_usage = {"stats": None, "at": 0.0, "poller": None, "clients": 0}
+_usage_lock = threading.Lock()
+
+
+def fetch_usage_stats(max_age=USAGE_STATS_TTL):
+    """Token usage and spend totals from LiteLLM, cached for `max_age` seconds"""
+    with _usage_lock:
+        if _usage["stats"] is not None and time.time() - _usage["at"] < max_age:
+            return _usage["stats"]
+    stats = _fetch_usage_stats()
+    with _usage_lock:
+        _usage["stats"] = stats
+        _usage["at"] = time.time()
+    return stats
+
+
+def start_usage_poller():
+    """Count a WebSocket client in; while any are connected a daemon thread
+    refreshes the usage cache every USAGE_STATS_TTL seconds"""
+    def run():
+        while True:
+            fetch_usage_stats(max_age=0)
+            time.sleep(USAGE_STATS_TTL)
+            with _usage_lock:
+                if _usage["clients"] == 0:
+                    _usage["poller"] = None
+                    return
+
+    with _usage_lock:
+        _usage["clients"] += 1
+        if _usage["poller"] is not None:
+            return
+        poller = _usage["poller"] = threading.Thread(target=run, name="usage-poller", daemon=True)
+    poller.start()
+
+
+def stop_usage_poller():
+    """Count a WebSocket client out; the poller exits once none are left"""
+    with _usage_lock:
+        _usage["clients"] -= 1
+
+
+def _fetch_usage_stats():
     try:
         # Fetch spend logs from LiteLLM
         response = requests.get(
@@ -137,40 +418,97 @@ def get_stats():
                     total_spend += entry.get('spend', 0)
                     total_tokens += entry.get('total_tokens', 0)
             
-            return jsonify({
+            return {
                 "total_tokens": total_tokens,
                 "total_spend": round(total_spend, 6),
                 "currency": "USD"
-            })
+            }
         else:
-            return jsonify({
+            return {
                 "total_tokens": 0,
                 "total_spend": 0,
                 "currency": "USD",
                 "error": "Could not fetch stats from LiteLLM"
-            })
+            }
     
     except Exception as e:
         print(f"Stats Error: {str(e)}")
-        return jsonify({
+        return {
             "total_tokens": 0,
             "total_spend": 0,
             "currency": "USD",
             "error": str(e)
-        })
+        }
+
+
+@app.route("/stats", methods=["GET"])
+def get_stats():
+    """Get token usage and spend statistics from LiteLLM"""
+    return jsonify(fetch_usage_stats())
 
 
 @app.route("/chat", methods=["POST"])
 def chat():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    return process_chat(data)
+
+
+def client_address():
+    """The requesting client's address, for rate limiting turns without a session."""
+    if TRUST_X_FORWARDED_FOR:
+        first_hop = request.headers.get("X-Forwarded-For", "").split(",")[0].strip()
+        if first_hop:
+            return first_hop
+    return request.remote_addr
+
+
+def process_chat(data, on_delta=None, limit_key=None):
+    """Handle one chat turn and return a Flask response value.
+
+    Shared by POST /chat and the /ws WebSocket.  `on_delta`, if given,
+    receives LLM output chunks as they stream in.  `limit_key` is the
+    rate-limiter bucket; by default the session, or the client address for
+    a turn without one.
+    """
+    session_id = data.get("session_id", None)
+    if not drainer.accepts(session_id):
+        return jsonify({
+            "response": "This server is shutting down. Please try again.",
+            "source": "error",
+            "session_id": session_id
+        }), 503, {"Retry-After": "1"}
+
+    limit_key = limit_key or session_id or f"addr:{client_address()}"
+    # Generate or use existing session ID
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    # Pinned for the whole turn, so eviction cannot spill it mid-request
+    with session_store.active(session_id):
+        return chat_turn(data, session_id, on_delta, limit_key)
+
+
+def chat_turn(data, session_id, on_delta=None, limit_key=None):
+    """Handle one chat turn for `session_id`, which the caller keeps in memory."""
     try:
-        data = request.get_json()
         user_message = data.get("message", "")
         mode = data.get("mode", "AIML")
-        session_id = data.get("session_id", None)
-        
-        # Generate or use existing session ID
-        if not session_id:
-            session_id = str(uuid.uuid4())
+        # Optional per-request latency budget for LLM model routing
+        latency_budget_ms = data.get("latency_budget_ms")
+        latency_budget = float(latency_budget_ms) / 1000.0 if latency_budget_ms else None
+        spell_correct = data.get("spell_correct", True)
+        bot = data.get("bot") or DEFAULT_BOT
+
+        try:
+            kernel = bot_registry.get_kernel(bot)
+        except UnknownBotError:
+            return jsonify({
+                "response": f"Unknown bot: {bot}",
+                "source": "error",
+                "bots": bot_registry.names(),
+                "session_id": session_id
+            }), 400
         
         if not user_message:
             return jsonify({
@@ -178,15 +516,47 @@ def chat():
                 "source": "error",
                 "session_id": session_id
             }), 400
+
+        if CHAT_MAX_MESSAGE_CHARS and len(user_message) > CHAT_MAX_MESSAGE_CHARS:
+            return jsonify({
+                "response": f"Message too long (at most {CHAT_MAX_MESSAGE_CHARS} characters)",
+                "source": "error",
+                "session_id": session_id
+            }), 413
+
+        if not rate_limiter.allow(limit_key or session_id):
+            return jsonify({
+                "response": "You're sending messages too quickly. Please slow down.",
+                "source": "error",
+                "mode": mode,
+                "bot": bot,
+                "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                "session_id": session_id
+            }), 429, {"Retry-After": "1"}
         
+        BOT_TURNS.inc(bot=bot)
+
         # Use original message without modification
         question = user_message
         print(f"DEBUG: User message: '{question}'")
+
+        # Detected language: picks the AIML sub-brain and the LLM's reply language
+        language, language_confidence = language_router.detect(question)
+        if language:
+            print(f"DEBUG: Language: {language} ({language_confidence:.3f})")
+        aiml_kernel = kernel
+        if bot == DEFAULT_BOT and mode != "LLM":
+            aiml_kernel = language_router.get_kernel(language) or kernel
+        # The spelling and near-miss indexes hold the main brain's patterns,
+        # which a language sub-brain would only answer with its fallback
+        routed = aiml_kernel is not kernel
+        if routed:
+            spell_correct = False
         
         # Handle different modes
         if mode == "LLM":
             # Use LLM only
-            llm_result = get_llm_response(question, session_id)
+            llm_result = run_llm(question, session_id, latency_budget, on_delta, language)
             
             # Store conversation history
             if session_id not in session_history:
@@ -198,7 +568,10 @@ def chat():
                 "response": llm_result["content"],
                 "source": "LLM",
                 "mode": mode,
+                "bot": bot,
+                "language": language,
                 "tokens": llm_result["tokens"],
+                "model": llm_result.get("model"),
                 "session_id": session_id,
                 "error": llm_result.get("error")
             })
@@ -208,7 +581,7 @@ def chat():
             print(f"DEBUG: Session ID: {session_id}, Question: {question}")
             
             # Get base AIML response
-            aiml_response = k.respond(question, sessionID=session_id)
+            aiml_response, corrections = fast_lane.run(aiml_respond, aiml_kernel, question, session_id, spell_correct)
             print(f"DEBUG: AIML Response: {aiml_response}")
             
             # Apply contextual response handling
@@ -223,25 +596,75 @@ def chat():
             
             # Check if it's a fallback response (contains "Fallback:" anywhere)
             if contextual_response and "Fallback:" not in contextual_response:
+                HYBRID_TURNS.inc(answered_by="aiml")
                 return jsonify({
                     "response": contextual_response,
                     "source": "AIML",
                     "mode": mode,
+                    "bot": bot,
+                    "language": language,
                     "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                    "corrections": corrections,
                     "session_id": session_id
                 })
             else:
+                # Close to a known pattern: answer from AIML without the LLM
+                near = None if routed else \
+                    fast_lane.run(near_miss_response, aiml_kernel, question, session_id)
+                if near:
+                    pattern, similarity, response = near
+                    session_history[session_id]['messages'][-1] = {'role': 'bot', 'text': response}
+                    HYBRID_TURNS.inc(answered_by="near_miss")
+                    return jsonify({
+                        "response": response,
+                        "source": "AIML (near match)",
+                        "mode": mode,
+                        "bot": bot,
+                        "language": language,
+                        "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                        "matched_pattern": pattern,
+                        "similarity": round(similarity, 3),
+                        "session_id": session_id
+                    })
+
                 # Use LLM as fallback
-                llm_result = get_llm_response(question, session_id)
+                llm_start = time.time()
+                llm_result = run_llm(question, session_id, latency_budget, on_delta, language,
+                                     in_history=True)
+                llm_seconds = time.time() - llm_start
+                
+                # LLM circuit breaker is open or the slow lane is full:
+                # fail fast with the AIML answer
+                if llm_result.get("circuit_open") or llm_result.get("shed"):
+                    aiml_answer = (contextual_response or "").replace("Fallback:", "").strip()
+                    HYBRID_TURNS.inc(answered_by="aiml_llm_unavailable")
+                    return jsonify({
+                        "response": aiml_answer or ":) (No pattern matched)",
+                        "source": "AIML (LLM unavailable)",
+                        "mode": mode,
+                        "bot": bot,
+                        "language": language,
+                        "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                        "session_id": session_id,
+                        "error": llm_result.get("error")
+                    })
                 
                 # Update conversation history with LLM response
                 session_history[session_id]['messages'][-1] = {'role': 'bot', 'text': llm_result["content"]}
+                HYBRID_TURNS.inc(answered_by="llm")
+                if not llm_result.get("error"):
+                    fallback_log.record(question, llm_result["content"], bot, llm_result.get("model"),
+                                        llm_result["tokens"], llm_seconds,
+                                        len(session_history[session_id]['messages']) - 2)
                 
                 return jsonify({
                     "response": llm_result["content"],
                     "source": "LLM (AIML fallback)",
                     "mode": mode,
+                    "bot": bot,
+                    "language": language,
                     "tokens": llm_result["tokens"],
+                    "model": llm_result.get("model"),
                     "session_id": session_id,
                     "error": llm_result.get("error")
                 })
@@ -251,7 +674,7 @@ def chat():
             print(f"DEBUG: Session ID: {session_id}, Question: {question}")
             
             # Get base AIML response
-            aiml_response = k.respond(question, sessionID=session_id)
+            aiml_response, corrections = fast_lane.run(aiml_respond, aiml_kernel, question, session_id, spell_correct)
             print(f"DEBUG: AIML Response: {aiml_response}")
             
             # Apply contextual response handling
@@ -270,7 +693,10 @@ def chat():
                     "response": response,
                     "source": "AIML",
                     "mode": mode,
+                    "bot": bot,
+                    "language": language,
                     "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                    "corrections": corrections,
                     "session_id": session_id
                 })
             else:
@@ -278,130 +704,212 @@ def chat():
                     "response": ":) (No pattern matched)",
                     "source": "AIML",
                     "mode": mode,
+                    "bot": bot,
+                    "language": language,
                     "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                    "corrections": corrections,
                     "session_id": session_id
                 })
     
+    except LaneFullError as e:
+        print(f"Shed: {str(e)}")
+        return jsonify({
+            "response": "Sorry, I'm too busy right now. Please try again in a moment.",
+            "source": "error",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0},
+            "session_id": session_id
+        }), 503, {"Retry-After": "1"}
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({
             "response": "Sorry, an error occurred processing your message",
             "source": "error",
             "tokens": {"prompt": 0, "completion": 0, "total": 0},
-            "session_id": session_id if 'session_id' in locals() else str(uuid.uuid4())
+            "session_id": session_id
         }), 500
 
 
-def get_llm_response(message, session_id=None):
-    """Get response from LiteLLM with conversation context"""
+def aiml_respond(kernel, question, session_id, spell_correct=True):
+    """Kernel response, spelling-corrected when the input would otherwise fall back.
+
+    Returns an empty response (the fallback path) if matching exceeds its budget.
+    """
+    question, capped = cap_input(question, AIML_MAX_INPUT_CHARS, AIML_MAX_SENTENCES)
+    if capped:
+        print(f"DEBUG: Input trimmed ({capped}) to '{question}'")
+    corrections = []
     try:
-        # Build messages with conversation history for context
-        # Note: AWS Bedrock requires conversations to start with user message
-        messages = []
-        
-        # Add conversation history if available (budget-friendly: last 5 messages only)
+        with match_budget(kernel, session_id):
+            if spell_correct:
+                question, corrections = spell_corrector.apply(kernel, question, session_id)
+                if corrections:
+                    print(f"DEBUG: Spelling corrected to '{question}'")
+            response = kernel.respond(question, session_id)
+    except BudgetExceeded as e:
+        print(f"DEBUG: {e}")
+        response = ""
+    return response, [{"from": old, "to": new} for old, new in corrections]
+
+
+def match_budget(kernel, session_id):
+    """Bound the kernel work of one turn by the configured matching budget"""
+    return kernel.bounded(session_id, AIML_MATCH_MAX_STEPS, AIML_MATCH_TIMEOUT_MS / 1000.0)
+
+
+def near_miss_response(kernel, question, session_id):
+    """Answer from the closest literal AIML pattern; (pattern, similarity, response) or None
+
+    The session's <input>/<that> history is left as the user's turn made it,
+    with the near-miss answer as the last response instead of the fallback.
+    """
+    found = near_miss.lookup(question)
+    if found is None:
+        return None
+    pattern, similarity = found
+    response = kernel.respond_in_place(
+        pattern, session_id, lambda answer: answer and "Fallback:" not in answer,
+        AIML_MATCH_MAX_STEPS, AIML_MATCH_TIMEOUT_MS / 1000.0)
+    if response is None:
+        return None
+    print(f"DEBUG: Near miss '{question}' -> '{pattern}' ({similarity:.3f})")
+    return pattern, similarity, response
+
+
+def run_llm(message, session_id=None, latency_budget=None, on_delta=None, language=None,
+            in_history=False):
+    """Run get_llm_response on the slow lane, shedding it when the lane is full"""
+    try:
+        return slow_lane.run(get_llm_response, message, session_id, latency_budget, on_delta,
+                             language, in_history)
+    except LaneFullError as e:
+        return {
+            "content": "Sorry, the LLM service is busy right now. Please try again in a moment.",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0},
+            "error": str(e),
+            "shed": True
+        }
+
+
+def build_llm_messages(message, session_id=None, language=None, in_history=False):
+    """Return the chat messages for `message`: recent history, then the message.
+
+    A message in a non-default `language` is followed by a hint to reply in it.
+    `in_history` means the session's history already ends with this turn
+    (Hybrid mode records it before falling back to the LLM); the stable
+    layout leaves that turn out of the history it sends.
+    """
+    hint = language_router.hint(language) if LITELLM_LANGUAGE_HINT else None
+    prompt_message = f"{message}\n\n{hint}" if hint else message
+    if LITELLM_PROMPT_LAYOUT == prompt_layout.STABLE:
+        history = []
         if session_id and session_id in session_history:
             history = session_history[session_id]['messages']
-            print(f"DEBUG LLM: Total history length: {len(history)}")
-            print(f"DEBUG LLM: Full history: {history}")
-            
-            # Keep only last 5 messages for budget optimization
-            recent_history = history[-5:] if len(history) > 5 else history
-            print(f"DEBUG LLM: Recent history (last 5): {recent_history}")
-            
-            # Sliding window approach: prioritize recent messages, drop oldest when exceeding limit
-            total_tokens = 15  # System prompt
-            context_messages = []
-            
-            # First pass: add all messages
-            for msg in recent_history:
-                # Rough estimate: 1 token ≈ 0.75 words ≈ 4 characters
-                msg_tokens = len(msg['text']) // 4
-                role = "user" if msg['role'] == 'user' else "assistant"
-                context_messages.append({
-                    "role": role, 
-                    "content": msg['text'],
-                    "tokens": msg_tokens
-                })
-                total_tokens += msg_tokens
-            
-            # Second pass: if exceeds limit, remove oldest messages until within budget
-            while total_tokens > LITELLM_MAX_CONTEXT_TOKENS and len(context_messages) > 0:
-                removed = context_messages.pop(0)  # Remove oldest message
-                total_tokens -= removed['tokens']
-
-            # CRITICAL: Ensure conversation starts with user message (Bedrock requirement)
-            # Remove any leading assistant messages
-            while context_messages and context_messages[0]['role'] == 'assistant':
-                removed = context_messages.pop(0)
-                print(f"DEBUG LLM: Removed leading assistant message to comply with Bedrock requirements")
-            
-            # Clean up: remove 'tokens' field before sending to LLM
-            for msg in context_messages:
-                del msg['tokens']
-            
-            messages.extend(context_messages)
-            print(f"DEBUG LLM: Messages being sent to LLM: {messages}")
+        if in_history:
+            # Leave out the turn being answered, whatever AIML put in it
+            history = history[:-2]
+        return prompt_layout.stable_messages(
+            LLM_PROMPT_PREFIX, history, prompt_message,
+            window=LITELLM_HISTORY_WINDOW,
+            max_tokens=LITELLM_MAX_CONTEXT_TOKENS,
+            system_role=LITELLM_SYSTEM_ROLE,
+            cache_control=LITELLM_CACHE_CONTROL)
 
-        else:
-            print(f"DEBUG LLM: No history found for session {session_id}")
+    # Build messages with conversation history for context
+    # Note: AWS Bedrock requires conversations to start with user message
+    messages = []
+    
+    # Add conversation history if available (budget-friendly: last 5 messages only)
+    if session_id and session_id in session_history:
+        history = session_history[session_id]['messages']
+        print(f"DEBUG LLM: Total history length: {len(history)}")
+        print(f"DEBUG LLM: Full history: {history}")
         
-        # Add current message
-        # Prepend system prompt to first user message for Bedrock compatibility
-        current_message = message
-        if not messages:
-            # First message in conversation - include system prompt
-            current_message = f"{LITELLM_SYSTEM_PROMPT}\n\n{message}"
+        # Keep only last 5 messages for budget optimization
+        recent_history = history[-5:] if len(history) > 5 else history
+        print(f"DEBUG LLM: Recent history (last 5): {recent_history}")
         
-        messages.append({"role": "user", "content": current_message})
+        # Sliding window approach: prioritize recent messages, drop oldest when exceeding limit
+        total_tokens = 15  # System prompt
+        context_messages = []
         
-        response = requests.post(
-            f"{LITELLM_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {LITELLM_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": LITELLM_MODEL,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": LITELLM_MAX_COMPLETION_TOKENS
-            },
-            timeout=30
-        )
+        # First pass: add all messages
+        for msg in recent_history:
+            # Rough estimate: 1 token ≈ 0.75 words ≈ 4 characters
+            msg_tokens = len(msg['text']) // 4
+            role = "user" if msg['role'] == 'user' else "assistant"
+            context_messages.append({
+                "role": role, 
+                "content": msg['text'],
+                "tokens": msg_tokens
+            })
+            total_tokens += msg_tokens
         
-        if response.status_code == 200:
-            data = response.json()
-            usage = data.get('usage', {})
-            return {
-                "content": data['choices'][0]['message']['content'],
-                "tokens": {
-                    "prompt": usage.get('prompt_tokens', 0),
-                    "completion": usage.get('completion_tokens', 0),
-                    "total": usage.get('total_tokens', 0)
-                },
-                "error": None
-            }
-        else:
-            error_msg = f"Status {response.status_code}"
-            try:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', error_msg)
-            except:
-                error_msg = response.text[:200] if response.text else error_msg
-            
-            print(f"LLM API Error: {response.status_code} - {error_msg}")
-            return {
-                "content": "Sorry, I'm having trouble connecting to the LLM service.",
-                "tokens": {"prompt": 0, "completion": 0, "total": 0},
-                "error": error_msg
-            }
+        # Second pass: if exceeds limit, remove oldest messages until within budget
+        while total_tokens > LITELLM_MAX_CONTEXT_TOKENS and len(context_messages) > 0:
+            removed = context_messages.pop(0)  # Remove oldest message
+            total_tokens -= removed['tokens']
+
+        # CRITICAL: Ensure conversation starts with user message (Bedrock requirement)
+        # Remove any leading assistant messages
+        while context_messages and context_messages[0]['role'] == 'assistant':
+            removed = context_messages.pop(0)
+            print(f"DEBUG LLM: Removed leading assistant message to comply with Bedrock requirements")
+        
+        # Clean up: remove 'tokens' field before sending to LLM
+        for msg in context_messages:
+            del msg['tokens']
+        
+        messages.extend(context_messages)
+        print(f"DEBUG LLM: Messages being sent to LLM: {messages}")
+
+    else:
+        print(f"DEBUG LLM: No history found for session {session_id}")
+    
+    # Add current message
+    # Prepend system prompt to first user message for Bedrock compatibility
+    current_message = prompt_message
+    if not messages:
+        # First message in conversation - include system prompt
+        current_message = f"{LITELLM_SYSTEM_PROMPT}\n\n{prompt_message}"
+    
+    messages.append({"role": "user", "content": current_message})
+    return messages
+
+
+def get_llm_response(message, session_id=None, latency_budget=None, on_delta=None, language=None,
+                     in_history=False):
+    """Get response from LiteLLM with conversation context.
+
+    The model is chosen by llm_router from the prompt size, the context
+    length and `latency_budget` (seconds).  With `on_delta` the completion
+    is streamed and each chunk of text is passed to it as it arrives.
+    `language` is the detected language of `message`.
+    """
+    try:
+        messages = build_llm_messages(message, session_id, language, in_history)
+        prompt_tokens = 15 + sum(
+            prompt_layout.estimate_tokens(prompt_layout.content_text(msg['content']))
+            for msg in messages)
+        history_length = sum(1 for msg in messages[:-1] if msg['role'] != 'system')
+        return llm_router.complete({
+            "model": LITELLM_MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": LITELLM_MAX_COMPLETION_TOKENS
+        }, prompt_tokens, history_length, latency_budget, on_delta)
     
+    except CircuitOpenError as e:
+        return {
+            "content": "Sorry, the LLM service is temporarily unavailable.",
+            "tokens": {"prompt": 0, "completion": 0, "total": 0},
+            "error": str(e),
+            "circuit_open": True
+        }
     except requests.exceptions.Timeout:
         return {
             "content": "Sorry, the LLM service is taking too long to respond.",
             "tokens": {"prompt": 0, "completion": 0, "total": 0},
-            "error": "Request timeout (30s)"
+            "error": "Request timeout"
         }
     except Exception as e:
         print(f"LLM Error: {str(e)}")
@@ -412,11 +920,102 @@ def get_llm_response(message, session_id=None):
         }
 
 
+WS_CONNECTIONS = metrics.Gauge(
+    "ws_connections",
+    "Open chat WebSocket connections")
+WS_MESSAGES = metrics.Counter(
+    "ws_messages_total",
+    "WebSocket frames by direction and type",
+    ["direction", "type"])
+
+
+def ws_send(ws, kind, body):
+    WS_MESSAGES.inc(direction="out", type=kind)
+    ws.send(json.dumps(dict(body, type=kind)))
+
+
+@sock.route("/ws")
+def chat_socket(ws):
+    """WebSocket chat transport: one connection per session.
+
+    The session ID (query parameter "session_id", or a new one), chat mode
+    and bot are kept for the life of the connection, and the session stays in memory
+    until it closes.  Client frames are {"type": "chat", "message": ...} with
+    the optional /chat fields; the server sends "session", "delta" (streamed
+    LLM output), "reply" (the /chat response body plus "status"), "usage"
+    (LiteLLM totals, pushed when they change) and "error" (a frame or turn
+    that could not be handled).
+    """
+    if not drainer.accepts(request.args.get("session_id")):
+        ws_send(ws, "error", {"error": "This server is shutting down. Please reconnect.",
+                              "status": 503})
+        return
+    session_id = request.args.get("session_id") or str(uuid.uuid4())
+    # Connections that did not bring a session are rate-limited by address
+    limit_key = request.args.get("session_id") or f"addr:{client_address()}"
+    mode = request.args.get("mode", "AIML")
+    bot = request.args.get("bot", DEFAULT_BOT)
+    session_store.pin(session_id)
+    WS_CONNECTIONS.inc()
+    start_usage_poller()
+    try:
+        ws_send(ws, "session", {"session_id": session_id})
+        last_usage = None
+        while True:
+            with _usage_lock:
+                usage = _usage["stats"]
+            if usage is not None and usage != last_usage:
+                ws_send(ws, "usage", usage)
+                last_usage = usage
+
+            raw = ws.receive(timeout=USAGE_STATS_TTL)
+            if raw is None:
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                ws_send(ws, "error", {"error": "Invalid JSON"})
+                continue
+            if not isinstance(data, dict):
+                ws_send(ws, "error", {"error": "Frames must be JSON objects"})
+                continue
+            if data.get("type", "chat") != "chat":
+                ws_send(ws, "error", {"error": f"Unknown message type: {data.get('type')}"})
+                continue
+            WS_MESSAGES.inc(direction="in", type="chat")
+
+            mode = data.get("mode") or mode
+            bot = data.get("bot") or bot
+            turn = dict(data, mode=mode, bot=bot, session_id=session_id)
+            try:
+                response = app.make_response(process_chat(
+                    turn, on_delta=lambda text: ws_send(ws, "delta", {"text": text}),
+                    limit_key=limit_key))
+            except ConnectionClosed:
+                raise
+            except Exception as e:
+                print(f"Error: {str(e)}")
+                ws_send(ws, "error", {"error": "An error occurred processing your message",
+                                      "status": 500})
+                continue
+            ws_send(ws, "reply", dict(response.get_json(), status=response.status_code))
+    except ConnectionClosed:
+        pass
+    finally:
+        session_store.unpin(session_id)
+        WS_CONNECTIONS.dec()
+        stop_usage_poller()
+
+
 @app.route("/get")
 def get_bot_response():
     """Legacy endpoint for compatibility"""
-    question = request.args.get('msg', '')
-    response = k.respond(question)
+    question, _ = cap_input(request.args.get('msg', ''), AIML_MAX_INPUT_CHARS, AIML_MAX_SENTENCES)
+    try:
+        with match_budget(k, k._globalSessionID):
+            response = k.respond(question)
+    except BudgetExceeded:
+        response = ""
     if response:
         return str(response)
     else:
@@ -425,17 +1024,23 @@ def get_bot_response():
 
 @app.route("/session/<session_id>", methods=["GET"])
 def get_session_info(session_id):
-    """Debug endpoint to check session predicates"""
+    """Debug endpoint to check session predicates, in memory or spilled to disk"""
     try:
-        # Get session predicates
-        predicates = {}
-        # Note: pyAIML doesn't expose a direct way to get all predicates
-        # but we can test if session exists by trying to get a predicate
-        test_pred = k.getPredicate("topic", sessionID=session_id)
+        found = session_store.get(session_id)
+        if found is None:
+            return jsonify({
+                "session_id": session_id,
+                "topic": "",
+                "message": "Session may be new"
+            })
+        tier, predicates, messages = found
         return jsonify({
             "session_id": session_id,
-            "topic": test_pred,
-            "message": "Session exists" if test_pred else "Session may be new"
+            "tier": tier,
+            "topic": predicates.get("topic", ""),
+            "predicates": predicates,
+            "messages": len(messages),
+            "message": "Session exists"
         })
     except Exception as e:
         return jsonify({
@@ -444,5 +1049,61 @@ def get_session_info(session_id):
         })
 
 
+@app.route("/bots", methods=["GET"])
+def get_bots():
+    """Configured bots with their overlay sizes"""
+    return jsonify(bot_registry.stats())
+
+
+@app.route("/languages", methods=["GET"])
+def get_languages():
+    """Languages of the data set and their sub-brains; ?text= also detects its language"""
+    stats = language_router.stats()
+    text = request.args.get("text")
+    if text:
+        language, confidence = language_router.detector.detect(text)
+        stats["detected"] = {"language": language, "confidence": round(confidence, 4),
+                             "confident": confidence >= language_router.min_confidence}
+    return jsonify(stats)
+
+
+@app.route("/lanes", methods=["GET"])
+def get_lanes():
+    """Queue depth and active tasks of the fast (AIML) and slow (LLM) lanes"""
+    return jsonify({"fast": fast_lane.stats(), "slow": slow_lane.stats()})
+
+
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    """Approximate bytes held by the brain, sessions and caches, against the RSS"""
+    return jsonify(dict(memory_accountant.sample(), tracemalloc=tracemalloc_diff.status()))
+
+
+@app.route("/debug/memory/tracemalloc", methods=["GET", "POST", "DELETE"])
+def debug_tracemalloc():
+    """Leak hunting: POST starts tracing with a baseline snapshot, GET diffs against it, DELETE stops"""
+    if not MEMORY_TRACEMALLOC:
+        return jsonify({"error": "tracemalloc snapshots are disabled (MEMORY_TRACEMALLOC=false)"}), 403
+    if request.method == "POST":
+        return jsonify(tracemalloc_diff.start())
+    if request.method == "DELETE":
+        return jsonify(tracemalloc_diff.stop())
+    group_by = request.args.get("group_by", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        return jsonify({"error": "group_by must be lineno, filename or traceback"}), 400
+    diff = tracemalloc_diff.diff(request.args.get("limit", 20, type=int), group_by)
+    if diff is None:
+        return jsonify({"error": "No baseline snapshot: POST to start tracing first"}), 409
+    return jsonify(diff)
+
+
+@app.route("/sessions/stats", methods=["GET"])
+def get_session_stats():
+    """Number of sessions held in memory and spilled to the session database"""
+    return jsonify(dict(session_store.stats(), handoff=drainer.stats()))
+
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=3011, debug=True)
+    # Drain (see drain.py) instead of dropping sessions when the pod stops
+    signal.signal(signal.SIGTERM, lambda signum, frame: drainer.start())
+    app.run(host='0.0.0.0', port=3011, debug=True, use_reloader=FLASK_RELOADER)
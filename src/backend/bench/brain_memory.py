@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Compare backend RSS with the dict-based brain versus the compact brain.
+
+The full data/ set is parsed once (in app.py's load order) and saved both as
+a regular python-aiml brain file and as a compact snapshot.  Each variant is
+then loaded in a fresh subprocess, the way a restarted pod would load it, so
+the numbers are not polluted by the other one.
+
+Usage (from src/backend):
+    python bench/brain_memory.py [--data ./data]
+"""
+
+import argparse
+import gc
+import json
+import re
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import aiml
+
+from compact_brain import compact_kernel, iter_categories, load_compact_brain
+
+SAMPLE_SIZE = 2000
+
+# <date> renders time.asctime(), which differs between the two runs.
+_asctimeRE = re.compile(r"\w{3} \w{3} [ \d]\d \d\d:\d\d:\d\d \d{4}")
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux only)."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def new_kernel():
+    k = aiml.Kernel()
+    k.verbose(False)
+    return k
+
+
+def parse_data(data_dir):
+    """Learn every .aiml file in app.py's order ('that' files last)."""
+    k = new_kernel()
+    all_files = [f for f in os.listdir(data_dir) if f.endswith(".aiml")]
+    that_files = [f for f in all_files if 'that' in f.lower()]
+    other_files = [f for f in all_files if 'that' not in f.lower()]
+    for filename in sorted(other_files) + sorted(that_files):
+        k.learn(os.path.join(data_dir, filename))
+    return k
+
+
+def sample_inputs(k):
+    """A fixed sample of pattern texts to replay against each variant."""
+    inputs = [" ".join(w for w in keys if isinstance(w, str))
+              for keys, _ in iter_categories(k._brain._root)]
+    random.seed(0)
+    return random.sample(inputs, min(SAMPLE_SIZE, len(inputs)))
+
+
+def replay(k, inputs):
+    """Respond to every input with a fixed seed; return (responses, seconds)."""
+    responses = []
+    start = time.time()
+    for i, text in enumerate(inputs):
+        random.seed(i)
+        response = k.respond(text, sessionID="bench-%d" % (i % 50))
+        responses.append(_asctimeRE.sub("<date>", response))
+    return responses, time.time() - start
+
+
+def measure(variant, workdir):
+    """Load the brain as `variant` and return a dict of measurements."""
+    with open(os.path.join(workdir, 'inputs.json')) as f:
+        inputs = json.load(f)
+    baseline = rss_mb()
+    k = new_kernel()
+    start = time.time()
+    if variant == 'dict':
+        k.loadBrain(os.path.join(workdir, 'brain.dump'))
+    else:
+        load_compact_brain(k, os.path.join(workdir, 'compact.dump'))
+    load_seconds = time.time() - start
+    gc.collect()
+    brain_mb = rss_mb() - baseline
+    responses, respond_seconds = replay(k, inputs)
+    with open(os.path.join(workdir, variant + '.responses.json'), 'w') as f:
+        json.dump(responses, f)
+    return {
+        "variant": variant,
+        "categories": k.numCategories(),
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "brain_rss_mb": round(brain_mb, 1),
+        "respond_us": round(1e6 * respond_seconds / len(inputs), 1),
+    }
+
+
+def prepare(data_dir, workdir):
+    start = time.time()
+    k = parse_data(data_dir)
+    print(f"parsed {k.numCategories()} categories in {time.time() - start:.1f}s")
+    with open(os.path.join(workdir, 'inputs.json'), 'w') as f:
+        json.dump(sample_inputs(k), f)
+    k.saveBrain(os.path.join(workdir, 'brain.dump'))
+    start = time.time()
+    brain = compact_kernel(k)
+    print(f"compacted in {time.time() - start:.1f}s "
+          f"({brain.numUniqueTemplates()} unique templates)")
+    brain.save_snapshot(os.path.join(workdir, 'compact.dump'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Brain memory report')
+    parser.add_argument('--data', default=os.path.join(BACKEND_DIR, 'data'),
+                        help='AIML data directory (default: src/backend/data)')
+    parser.add_argument('--variant', choices=['dict', 'compact'],
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.workdir)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare(args.data, workdir)
+        results = []
+        for variant in ('dict', 'compact'):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--variant', variant,
+                 '--workdir', workdir],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+        with open(os.path.join(workdir, 'dict.responses.json')) as f:
+            expected = json.load(f)
+        with open(os.path.join(workdir, 'compact.responses.json')) as f:
+            actual = json.load(f)
+
+    before, after = results
+    print(f"\n{'variant':<10}{'RSS MB':>10}{'brain MB':>10}{'load s':>8}{'respond us':>12}")
+    for r in results:
+        print(f"{r['variant']:<10}{r['rss_mb']:>10}{r['brain_rss_mb']:>10}"
+              f"{r['load_seconds']:>8}{r['respond_us']:>12}")
+    saved = before['brain_rss_mb'] - after['brain_rss_mb']
+    if before['brain_rss_mb']:
+        print(f"\nbrain memory saved: {saved:.1f} MB "
+              f"({100.0 * saved / before['brain_rss_mb']:.0f}%)")
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"responses identical: {len(expected) - mismatches}/{len(expected)}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
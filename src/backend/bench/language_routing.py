@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare AIML matching on the main brain with matching on language sub-brains.
+
+Builds a LanguageRouter with sub-brains for --brains (their compact brain
+files are cached in data/ like the app's), then sends German and English
+inputs to the main brain and to the sub-brain of their detected language.
+Prints matching steps (trie nodes, template elements and <srai> calls, as
+counted by match_budget.py) and median milliseconds per input and brain,
+and the detector's accuracy and cost on the same inputs.
+
+Usage (from src/backend):
+    python bench/language_routing.py [--brains de,en] [--calls 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import MESSAGES, import_app, quiet, start_mock_llm
+
+from language import LanguageRouter
+from match_budget import MatchBudget
+
+GERMAN = ["hallo wie geht es dir", "wie heisst du", "kannst du mir helfen",
+          "ich habe hunger", "ich bin ein roboter", "was ist dein lieblingsfilm",
+          "wo wohnst du", "erzaehl mir einen witz", "magst du musik", "tschuess"]
+
+
+def respond(kernel, text, session_id):
+    """(steps, seconds, response) of one response of `kernel`."""
+    budget = MatchBudget()
+    with kernel._respondLock:
+        kernel._budget = kernel._brain._budget = budget
+        try:
+            start = time.perf_counter()
+            response = kernel.respond(text, session_id)
+            return budget.steps, time.perf_counter() - start, response
+        finally:
+            kernel._budget = kernel._brain._budget = None
+
+
+def measure(kernel, inputs, calls):
+    steps = []
+    times = []
+    answered = 0
+    for text in inputs:
+        for i in range(calls):
+            s, seconds, response = respond(kernel, text, "language-bench")
+            times.append(seconds)
+        steps.append(s)
+        answered += bool(response) and "Fallback:" not in response
+    return statistics.mean(steps), statistics.median(times) * 1000, answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--brains", default="de,en", help="languages given a sub-brain")
+    parser.add_argument("--calls", type=int, default=50, help="responses per input and brain")
+    args = parser.parse_args()
+
+    app = import_app(start_mock_llm())
+    with quiet():
+        router = LanguageRouter(app.k, "./data", app.COMPACT_BRAIN_FILE,
+                                brains=[l for l in args.brains.split(",") if l],
+                                compact=app.AIML_COMPACT_BRAIN)
+        router.load()
+
+    print(f"{'inputs':<10}{'brain':<8}{'categories':>12}{'steps':>8}{'ms':>9}{'answered':>10}")
+    for language, inputs in (("de", GERMAN), ("en", MESSAGES)):
+        sub = router.get_kernel(language)
+        brains = [("main", app.k)] + ([(language, sub)] if sub is not None else [])
+        for name, kernel in brains:
+            with quiet():
+                steps, ms, answered = measure(kernel, inputs, args.calls)
+            print(f"{language:<10}{name:<8}{kernel.numCategories():>12}{steps:>8.1f}"
+                  f"{ms:>9.3f}{answered:>7}/{len(inputs)}")
+
+    labelled = [(text, "de") for text in GERMAN] + [(text, "en") for text in MESSAGES]
+    start = time.perf_counter()
+    results = [router.detector.detect(text) for text, _ in labelled]
+    micros = (time.perf_counter() - start) / len(labelled) * 1e6
+    confident = [(r, want) for r, (_, want) in zip(results, labelled)
+                 if r[1] >= router.min_confidence]
+    correct = sum(r[0] == want for r, want in confident)
+    print(f"\ndetection: {micros:.0f}us per input, {len(confident)}/{len(labelled)} confident, "
+          f"{correct}/{len(confident)} of those correct")
+
+
+if __name__ == "__main__":
+    main()
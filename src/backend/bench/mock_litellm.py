@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for LiteLLM's /chat/completions endpoint.
+
+Answers every request after a configurable delay, optionally failing a share
+of them with HTTP 500, so model routing, timeouts and the circuit breaker can
+be exercised without a real provider.  Requests with "stream": true get a
+server-sent-event stream, one word per chunk.  A provider prompt cache is
+simulated: the longest run of leading messages already seen in an earlier
+request is reported as cached prompt tokens.  Settings can be changed while
+it runs:
+
+    curl 'http://127.0.0.1:4001/config?latency=1.5&error_rate=0.2'
+
+Usage (from src/backend):
+    python bench/mock_litellm.py --port 4001 --latency 0.2 [--error-rate 0.1]
+
+then point a model at it with "base_url": "http://127.0.0.1:4001" in
+LITELLM_MODELS (or LITELLM_BASE_URL).
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+settings = {"latency": 0.2, "error_rate": 0.0, "chunk_delay": 0.02, "calls": 0}
+_lock = threading.Lock()
+_seen_prefixes = set()
+MAX_SEEN_PREFIXES = 100000
+
+
+def message_text(message):
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content)
+    return str(content)
+
+
+def cached_tokens(model, messages):
+    """Tokens in the longest leading run of `messages` seen before; remembers this one."""
+    digest = hashlib.sha256(str(model).encode("utf-8"))
+    cached = chars = 0
+    with _lock:
+        if len(_seen_prefixes) > MAX_SEEN_PREFIXES:
+            _seen_prefixes.clear()
+        for message in messages:
+            text = message_text(message)
+            digest.update(f"\0{message.get('role')}\0{text}".encode("utf-8"))
+            chars += len(text)
+            key = digest.hexdigest()
+            if key in _seen_prefixes:
+                cached = chars // 4
+            _seen_prefixes.add(key)
+    return cached
+
+
+class MockLiteLLM(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with _lock:
+            settings["calls"] += 1
+            latency, error_rate = settings["latency"], settings["error_rate"]
+            chunk_delay = settings["chunk_delay"]
+        time.sleep(latency)
+
+        if random.random() < error_rate:
+            self._send_json(500, {"error": {"message": "mock upstream error"}})
+            return
+
+        messages = payload.get("messages", [])
+        prompt_tokens = sum(len(message_text(m)) for m in messages) // 4
+        last = message_text(messages[-1]) if messages else ""
+        content = f"[{payload.get('model')}] {last[-60:]}"
+        cached = cached_tokens(payload.get("model"), messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 12,
+                 "total_tokens": prompt_tokens + 12,
+                 "prompt_tokens_details": {"cached_tokens": cached}}
+        if payload.get("stream"):
+            self._send_stream(payload.get("model"), content, usage, chunk_delay)
+            return
+        self._send_json(200, {
+            "model": payload.get("model"),
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _send_stream(self, model, content, usage, chunk_delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": text}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(chunk_delay)
+        final = {"model": model, "choices": [], "usage": usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/config":
+            with _lock:
+                for key, values in parse_qs(url.query).items():
+                    if key in ("latency", "error_rate", "chunk_delay"):
+                        settings[key] = float(values[0])
+                current = dict(settings)
+            self._send_json(200, current)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500s (0-1)")
+    args = parser.parse_args()
+
+    settings["latency"] = args.latency
+    settings["error_rate"] = args.error_rate
+    server = ThreadingHTTPServer((args.host, args.port), MockLiteLLM)
+    print(f"Mock LiteLLM on http://{args.host}:{args.port} "
+          f"(latency {args.latency}s, error rate {args.error_rate})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
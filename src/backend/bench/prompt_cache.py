@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compare how much of the LLM prompt a provider cache can serve per layout.
+
+Replays the same multi-turn LLM conversations through POST /chat once with
+each prompt layout, against bench/mock_litellm.py, whose simulated prompt
+cache reports the longest run of leading messages it has seen before as
+cached tokens.  Prints prompt, cached and uncached (full price) tokens per
+layout and the share of the prompt that was cached.
+
+Usage (from src/backend):
+    python bench/prompt_cache.py [--sessions 20] [--turns 12]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_litellm
+from suite import LLM_MESSAGES, import_app, quiet, start_mock_llm
+
+LAYOUTS = ("legacy", "stable")
+
+
+def replay(app, layout, sessions, turns):
+    """Run the conversations with `layout`; return summed token counts."""
+    app.LITELLM_PROMPT_LAYOUT = layout
+    with mock_litellm._lock:
+        mock_litellm._seen_prefixes.clear()
+    client = app.app.test_client()
+    totals = {"requests": 0, "prompt": 0, "cached": 0}
+    with quiet():
+        for s in range(sessions):
+            session_id = f"prompt-cache-{layout}-{s}"
+            for t in range(turns):
+                message = f"{LLM_MESSAGES[t % len(LLM_MESSAGES)]} (session {s}, turn {t})"
+                response = client.post("/chat", json={
+                    "message": message, "mode": "LLM", "session_id": session_id})
+                assert response.status_code == 200, response.get_data(as_text=True)
+                tokens = response.get_json()["tokens"]
+                totals["requests"] += 1
+                totals["prompt"] += tokens["prompt"]
+                totals["cached"] += tokens.get("cached", 0)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=12, help="LLM turns per session")
+    args = parser.parse_args()
+
+    app = import_app(start_mock_llm())
+    print(f"{'layout':<10}{'requests':>10}{'prompt tok':>12}{'cached tok':>12}"
+          f"{'uncached tok':>14}{'cached':>8}")
+    for layout in LAYOUTS:
+        r = replay(app, layout, args.sessions, args.turns)
+        share = r["cached"] / r["prompt"] if r["prompt"] else 0.0
+        print(f"{layout:<10}{r['requests']:>10}{r['prompt']:>12}{r['cached']:>12}"
+              f"{r['prompt'] - r['cached']:>14}{share:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
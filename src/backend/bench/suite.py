@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the backend's hot paths, with stored baselines.
+
+Runs fully offline: the LLM is bench/mock_litellm.py served in-process with
+no latency, and app.py is imported with session persistence and rate
+limiting turned off.  Cases:
+
+- brain.*: cold learn() of data/, loadBrain() of the dict brain file and
+  loading the compact snapshot (built in a temporary directory)
+- aiml.*: k.respond() on everyday inputs and on a sample of the data set's
+  own patterns
+- context.*: get_contextual_response() at several history lengths
+- llm.*: the context assembly of get_llm_response() at several history lengths
+- chat.*: POST /chat end to end (Flask test client) in each mode
+
+Every case reports per-call median, p95 and mean in milliseconds.  Results
+are written as JSON that can be compared between commits; --compare exits
+with status 1 when a case's median is more than --threshold slower than the
+baseline's.
+
+Usage (from src/backend):
+    python bench/suite.py [--filter chat] [--save out.json]
+    python bench/suite.py --compare bench/baseline.json [--threshold 0.25]
+    python bench/suite.py --save bench/baseline.json   # refresh the baseline
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import aiml
+
+from brain_loader import aiml_files
+from compact_brain import CompactPatternMgr, iter_categories, load_compact_brain
+from mock_litellm import MockLiteLLM, settings as mock_settings
+
+DEFAULT_THRESHOLD = 0.25
+HISTORY_LENGTHS = (0, 5, 50, 500)
+
+MESSAGES = ["hello", "what is your name", "how are you", "do you like movies",
+            "tell me a joke", "where do you live", "what is ai", "who created you",
+            "i am hungry", "what time is it", "can you help me", "bye"]
+# Inputs the AIML set has no real answer for, so hybrid mode asks the LLM
+LLM_MESSAGES = ["explain the difference between tcp and udp",
+                "summarize the plot of hamlet in two sentences",
+                "what are good stretches after running"]
+
+
+def start_mock_llm():
+    """Serve the mock LiteLLM on a free local port, answering immediately."""
+    mock_settings.update(latency=0.0, chunk_delay=0.0, error_rate=0.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockLiteLLM)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def import_app(llm_url):
+    """Import app.py with a quiet, offline configuration and wait for the brain."""
+    os.environ["LITELLM_BASE_URL"] = llm_url
+    os.environ["LITELLM_MODEL"] = "bench-model"
+    os.environ["LITELLM_MODELS"] = ""
+    os.environ["AIML_SESSION_DB"] = ""
+    os.environ["AIML_BOTS"] = ""
+    os.environ["SESSION_RATE_LIMIT"] = "0"
+    os.chdir(BACKEND_DIR)
+    with quiet():
+        import app
+        app.brain_loader.wait()
+        app.spell_corrector.wait()
+        app.near_miss.wait()
+    return app
+
+
+@contextlib.contextmanager
+def quiet():
+    """Send the app's (and python-aiml's) debug prints to /dev/null."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        yield
+
+
+def measure(fn, calls, warmup=0):
+    """Call fn(i) `calls` times after `warmup` calls; return seconds per call."""
+    with quiet():
+        for i in range(warmup):
+            fn(i)
+        samples = []
+        for i in range(calls):
+            start = time.perf_counter()
+            fn(i)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "calls": len(samples),
+        "median_ms": round(statistics.median(ordered) * 1000, 6),
+        "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 6),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 6),
+    }
+
+
+def history(length):
+    """A conversation of `length` messages alternating user and bot."""
+    return [{"role": "user" if i % 2 == 0 else "bot",
+             "text": f"message number {i} about travelling to a city far away"}
+            for i in range(length)]
+
+
+def new_kernel():
+    k = aiml.Kernel()
+    k.verbose(False)
+    return k
+
+
+def brain_op(op, workdir):
+    """Run one brain operation in this (fresh) process; return its seconds."""
+    brain_file = os.path.join(workdir, "brain.dump")
+    compact_file = os.path.join(workdir, "compact.dump")
+    start = time.perf_counter()
+    if op in ("learn_cold", "prepare"):
+        k = new_kernel()
+        data_dir = os.path.join(BACKEND_DIR, "data")
+        for filename in aiml_files(data_dir):
+            k.learn(os.path.join(data_dir, filename))
+    elif op == "load_dict":
+        new_kernel().loadBrain(brain_file)
+    elif op == "load_compact":
+        load_compact_brain(new_kernel(), compact_file)
+    seconds = time.perf_counter() - start
+    if op == "prepare":
+        k.saveBrain(brain_file)
+        CompactPatternMgr.from_pattern_mgr(k._brain).save_snapshot(compact_file)
+    return seconds
+
+
+def brain_cases(workdir):
+    """Brain loads, each run in a fresh subprocess like a restarted pod."""
+    def run_op(op):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--brain-op", op, "--workdir", workdir],
+            check=True, capture_output=True, text=True).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    def case(op, runs):
+        def measure_op():
+            if op != "learn_cold" and not os.path.exists(os.path.join(workdir, "brain.dump")):
+                run_op("prepare")
+            return [run_op(op) for _ in range(runs)]
+        return measure_op
+
+    yield "brain.learn_cold", case("learn_cold", 2)
+    yield "brain.load_dict", case("load_dict", 3)
+    yield "brain.load_compact", case("load_compact", 3)
+
+
+def aiml_cases(get_app):
+    def respond():
+        k = get_app().k
+        return measure(
+            lambda i: k.respond(MESSAGES[i % len(MESSAGES)], "bench-aiml-%d" % (i % 20)),
+            2000, warmup=100)
+
+    def respond_patterns():
+        k = get_app().k
+        patterns = [" ".join(w for w in keys if isinstance(w, str))
+                    for keys, _ in iter_categories(k._brain._root)]
+        patterns = random.Random(0).sample(patterns, 1000)
+
+        def respond_pattern(i):
+            random.seed(i)
+            k.respond(patterns[i], "bench-patterns-%d" % (i % 20))
+        return measure(respond_pattern, len(patterns), warmup=100)
+
+    yield "aiml.respond", respond
+    yield "aiml.respond_patterns", respond_patterns
+
+
+def with_history(get_app, length, fn, calls, warmup):
+    """Measure fn(app, session_id) for a session with `length` messages of history."""
+    def case():
+        app = get_app()
+        session_id = f"bench-history-{length}"
+        app.session_history[session_id] = {"messages": history(length)}
+        try:
+            return measure(lambda i: fn(app, session_id), calls, warmup)
+        finally:
+            del app.session_history[session_id]
+    return case
+
+
+def context_cases(get_app):
+    for length in HISTORY_LENGTHS:
+        yield f"context.contextual_h{length}", with_history(
+            get_app, length,
+            lambda app, session_id: app.get_contextual_response(
+                "i want to travel there", session_id, "Fallback: no match"),
+            2000, 100)
+
+
+def llm_cases(get_app):
+    for length in HISTORY_LENGTHS:
+        yield f"llm.build_messages_h{length}", with_history(
+            get_app, length,
+            lambda app, session_id: app.build_llm_messages("tell me more about it", session_id),
+            1000, 50)
+
+
+def chat_cases(get_app):
+    def chat(mode, messages, calls, turns_per_session):
+        def case():
+            client = get_app().app.test_client()
+
+            def turn(i):
+                response = client.post("/chat", json={
+                    "message": messages[i % len(messages)],
+                    "mode": mode,
+                    "session_id": f"bench-chat-{mode}-{i // turns_per_session}",
+                })
+                assert response.status_code == 200, response.get_data(as_text=True)
+            return measure(turn, calls, warmup=20)
+        return case
+
+    # A new session every 10 turns keeps the history length bounded; LLM
+    # turns get a fresh session each so no AIML <that> answers them instead
+    yield "chat.aiml", chat("AIML", MESSAGES, 500, 10)
+    yield "chat.hybrid_aiml", chat("Hybrid", MESSAGES, 500, 10)
+    yield "chat.hybrid_llm", chat("Hybrid", LLM_MESSAGES, 300, 1)
+    yield "chat.llm", chat("LLM", LLM_MESSAGES, 300, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(name_filter):
+    selected = re.compile(name_filter or "")
+    results = {}
+    apps = []
+
+    def get_app():
+        if not apps:
+            apps.append(import_app(start_mock_llm()))
+        return apps[0]
+
+    print(f"{'case':<28}{'median ms':>12}{'p95 ms':>12}{'mean ms':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for cases in (brain_cases(workdir), aiml_cases(get_app), context_cases(get_app),
+                      llm_cases(get_app), chat_cases(get_app)):
+            for name, case in cases:
+                if not selected.search(name):
+                    continue
+                r = results[name] = summarize(case())
+                print(f"{name:<28}{r['median_ms']:>12}{r['p95_ms']:>12}{r['mean_ms']:>12}")
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print the change against `baseline`; return the regressed case names."""
+    regressed = []
+    print(f"\n{'case':<28}{'baseline ms':>12}{'now ms':>12}{'change':>9}")
+    for name, r in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{r['median_ms']:>12}{'new':>9}")
+            continue
+        change = r["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSED"
+            regressed.append(name)
+        print(f"{name:<28}{base['median_ms']:>12}{r['median_ms']:>12}{change:>+9.0%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", help="only run cases whose name matches this regex")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed median slowdown before failing (default 0.25 = 25%%)")
+    parser.add_argument("--brain-op", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.brain_op:
+        print(json.dumps(brain_op(args.brain_op, args.workdir)))
+        return
+
+    current = run(args.filter)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(current, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) regressed by more than "
+                  f"{args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+        print(f"\nNo case regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
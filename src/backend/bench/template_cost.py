@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Compare per-response template cost with raw and with compiled templates.
+
+The full data/ set is parsed once and compacted twice: once with the
+templates as python-aiml parses them and no star memo (the brain before
+template compilation), and once the way BrainLoader builds it.  The same
+sample of pattern texts is replayed against both.  Template cost is the
+respond time minus the time spent matching the input itself, so it covers
+the template walk, <star/> lookups, <srai> and everything they call.
+
+Usage (from src/backend):
+    python bench/template_cost.py [--data ./data]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import aiml
+
+import template_compiler
+from brain_memory import _asctimeRE, parse_data, sample_inputs
+from compact_brain import CompactPatternMgr
+
+PASSES = 3
+
+
+class TimedKernel(aiml.Kernel):
+    """Kernel that times the match of each top-level input, <srai> excluded."""
+
+    def __init__(self, brain):
+        aiml.Kernel.__init__(self)
+        self.verbose(False)
+        self._brain = brain
+        self._depth = 0
+        self.match_seconds = 0.0
+        match = brain.match
+
+        def timed_match(pattern, that, topic):
+            if self._depth > 1:
+                return match(pattern, that, topic)
+            start = time.perf_counter()
+            try:
+                return match(pattern, that, topic)
+            finally:
+                self.match_seconds += time.perf_counter() - start
+
+        brain.match = timed_match
+        template_compiler.install(self)
+
+    def _respond(self, input_, sessionID):
+        self._depth += 1
+        try:
+            return aiml.Kernel._respond(self, input_, sessionID)
+        finally:
+            self._depth -= 1
+
+
+def replay(k, inputs):
+    """Return (responses, respond seconds, template seconds) per input."""
+    responses, respond, template = [], [], []
+    for i, text in enumerate(inputs):
+        random.seed(i)
+        k.match_seconds = 0.0
+        start = time.perf_counter()
+        response = k.respond(text, sessionID="bench-%d" % (i % 50))
+        elapsed = time.perf_counter() - start
+        responses.append(_asctimeRE.sub("<date>", response))
+        respond.append(elapsed)
+        template.append(elapsed - k.match_seconds)
+    return responses, respond, template
+
+
+def measure(name, brain, inputs):
+    k = TimedKernel(brain)
+    replay(k, inputs[:200])  # warm up
+    best_respond = [float("inf")] * len(inputs)
+    best_template = [float("inf")] * len(inputs)
+    for _ in range(PASSES):
+        for sessionID in list(k._sessions):
+            if sessionID != k._globalSessionID:
+                k._deleteSession(sessionID)
+        responses, respond, template = replay(k, inputs)
+        best_respond = [min(a, b) for a, b in zip(best_respond, respond)]
+        best_template = [min(a, b) for a, b in zip(best_template, template)]
+    return responses, {
+        "variant": name,
+        "template_mean_us": round(1e6 * statistics.mean(best_template), 1),
+        "template_p50_us": round(1e6 * statistics.median(best_template), 1),
+        "template_p95_us": round(1e6 * sorted(best_template)[int(0.95 * (len(inputs) - 1))], 1),
+        "respond_mean_us": round(1e6 * statistics.mean(best_respond), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=os.path.join(BACKEND_DIR, 'data'),
+                        help='AIML data directory (default: src/backend/data)')
+    args = parser.parse_args()
+
+    start = time.time()
+    k = parse_data(args.data)
+    inputs = sample_inputs(k)
+    print(f"parsed {k.numCategories()} categories in {time.time() - start:.1f}s, "
+          f"replaying {len(inputs)} inputs x {PASSES}")
+
+    raw = CompactPatternMgr.from_pattern_mgr(k._brain, compile_templates=False)
+    raw._recent = None
+    compiled = CompactPatternMgr.from_pattern_mgr(k._brain)
+    constant = sum(1 for t in compiled._templates.templates
+                   if template_compiler.is_constant(t))
+    print(f"{constant}/{compiled.numUniqueTemplates()} templates compile to a constant string")
+
+    expected, before = measure("raw", raw, inputs)
+    actual, after = measure("compiled", compiled, inputs)
+
+    print(f"\n{'variant':<10}{'template us':>13}{'p50 us':>9}{'p95 us':>9}{'respond us':>12}")
+    for r in (before, after):
+        print(f"{r['variant']:<10}{r['template_mean_us']:>13}{r['template_p50_us']:>9}"
+              f"{r['template_p95_us']:>9}{r['respond_mean_us']:>12}")
+    saved = before['template_mean_us'] - after['template_mean_us']
+    print(f"\ntemplate cost saved: {saved:.1f} us per response "
+          f"({100.0 * saved / before['template_mean_us']:.0f}%)")
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"responses identical: {len(expected) - mismatches}/{len(expected)}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compare per-turn overhead of the HTTP /chat path with the /ws WebSocket.
+
+The backend is started in-process on a local port and the same AIML-mode
+turns (which take well under a millisecond to match) are sent three ways:
+
+- http+preflight: what the browser does cross-origin, an OPTIONS preflight
+  and a POST per turn over a kept-alive connection
+- http: a POST per turn over a kept-alive connection, no preflight
+- websocket: one frame out and one reply frame back per turn
+
+Usage (from src/backend):
+    python bench/transport_overhead.py [--turns 500]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MESSAGES = ["hello", "what is your name", "how are you", "do you like movies",
+            "tell me a joke", "where do you live", "what is ai", "bye"]
+ORIGIN = "http://localhost:5173"
+
+
+def start_backend(port):
+    """Import app.py with a quiet, LLM-free configuration and serve it."""
+    os.environ.setdefault("LITELLM_BASE_URL", "http://127.0.0.1:9")
+    os.environ["AIML_SESSION_DB"] = ""
+    os.environ["SESSION_RATE_LIMIT"] = "0"
+    os.chdir(BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        from werkzeug.serving import make_server
+        app.brain_loader.wait()
+    server = make_server("127.0.0.1", port, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    return {
+        "transport": name,
+        "turns": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def bench_http(base, turns, preflight):
+    import requests
+    session = requests.Session()
+    session_id = None
+    samples = []
+    for i in range(turns):
+        body = {"message": MESSAGES[i % len(MESSAGES)], "mode": "AIML", "session_id": session_id}
+        start = time.perf_counter()
+        if preflight:
+            session.options(f"{base}/chat", headers={
+                "Origin": ORIGIN,
+                "Access-Control-Request-Method": "POST",
+                "Access-Control-Request-Headers": "content-type"})
+        response = session.post(f"{base}/chat", json=body, headers={"Origin": ORIGIN})
+        data = response.json()
+        samples.append(time.perf_counter() - start)
+        session_id = data["session_id"]
+    return samples
+
+
+def bench_ws(base, turns):
+    import simple_websocket
+    ws = simple_websocket.Client.connect(base.replace("http", "ws", 1) + "/ws?mode=AIML")
+    json.loads(ws.receive())  # session frame
+    samples = []
+    for i in range(turns):
+        start = time.perf_counter()
+        ws.send(json.dumps({"type": "chat", "message": MESSAGES[i % len(MESSAGES)]}))
+        while json.loads(ws.receive())["type"] != "reply":
+            pass
+        samples.append(time.perf_counter() - start)
+    ws.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--port", type=int, default=3911)
+    args = parser.parse_args()
+
+    print("Starting backend...")
+    start_backend(args.port)
+    base = f"http://127.0.0.1:{args.port}"
+
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Warm up the kernel and connections
+        bench_http(base, 20, preflight=False)
+        bench_ws(base, 20)
+        results.append(summarize("http+preflight", bench_http(base, args.turns, preflight=True)))
+        results.append(summarize("http", bench_http(base, args.turns, preflight=False)))
+        results.append(summarize("websocket", bench_ws(base, args.turns)))
+
+    print(f"{'transport':<16} {'median ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    for r in results:
+        print(f"{r['transport']:<16} {r['median_ms']:>10} {r['p95_ms']:>10} {r['mean_ms']:>10}")
+    ws_median = results[-1]["median_ms"]
+    for r in results[:-1]:
+        print(f"{r['transport']} overhead vs websocket: {r['median_ms'] - ws_median:+.3f} ms per turn (median)")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
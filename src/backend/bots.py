@@ -0,0 +1,204 @@
+"""
+Several named bots served from one shared brain.
+
+Every bot answers from the same base brain (the data/ files not claimed by
+any bot) plus its own overlay: the categories of the files configured for it,
+for example std-german.aiml for a German bot or bot_profile.aiml for a
+persona.  Overlays are applied with compact_brain.overlay_tree(), which copies
+only the trie nodes on the overlay's paths, so the base categories are held
+once however many bots there are.
+
+Each bot gets its own kernel (and so its own bot predicates) that shares
+the main kernel's session dict and respond lock: a session's predicates and
+history follow it across bots, and SessionStore manages them as before.
+"""
+
+import fnmatch
+import json
+import os
+import threading
+import time
+
+import aiml
+from aiml.PatternMgr import PatternMgr
+
+import template_compiler
+from brain_loader import aiml_files
+from compact_brain import CompactPatternMgr, overlay_tree
+from memory_stats import deep_size
+from metrics import Counter, Gauge
+
+DEFAULT_BOT = "default"
+
+BOT_CATEGORIES = Gauge(
+    "aiml_bot_categories",
+    "Categories each bot answers from, shared base included",
+    ["bot"])
+BOT_OVERLAY_NODES = Gauge(
+    "aiml_bot_overlay_nodes",
+    "Trie nodes held only by a bot's overlay (the rest are shared with the base brain)",
+    ["bot"])
+BOT_TURNS = Counter(
+    "aiml_bot_turns_total",
+    "Chat turns by the bot that handled them",
+    ["bot"])
+
+
+class UnknownBotError(KeyError):
+    """Raised for a bot name that is not configured."""
+
+
+class SharedPatternMgr(PatternMgr):
+    """Dict-based PatternMgr with a copy-on-write add() for shared nodes.
+
+    Categories learned at runtime (<learn>) path-copy the nodes they touch
+    instead of writing into nodes the base brain and other bots still use.
+    CompactPatternMgr.add() already works this way.
+    """
+
+    def add(self, data, template):
+        category = PatternMgr()
+        category.add(data, template)
+        stats = {}
+        self._root = overlay_tree(self._root, category._root, None, stats)
+        self._templateCount += 1 - stats["replaced"]
+
+
+def overlay_brain(base, overlay_root, overlay_count):
+    """Return a PatternMgr of `base`'s kind with the dict trie `overlay_root` added.
+
+    Also returns the number of trie nodes the overlay added or copied.
+    """
+    table = None
+    if isinstance(base, CompactPatternMgr):
+        brain = CompactPatternMgr()
+        table = brain._templates
+    else:
+        brain = SharedPatternMgr()
+    stats = {}
+    brain._root = overlay_tree(base._root, overlay_root, table, stats)
+    if table is not None:
+        table.seal()
+    brain._botName = base._botName
+    brain._templateCount = base._templateCount + overlay_count - stats["replaced"]
+    return brain, stats["nodes"]
+
+
+class Bot:
+    """One named bot: its overlay files, bot predicates and kernel."""
+
+    def __init__(self, name, files, predicates, kernel):
+        self.name = name
+        self.files = files
+        self.predicates = predicates
+        self.kernel = kernel
+        self.overlay_root = None
+        self.overlay_count = 0
+        self.overlay_nodes = 0
+        self.tier = None
+
+
+class BotRegistry:
+    """Named bots layered over the brain that BrainLoader installs in `kernel`.
+
+    `specs` maps bot names to a list of file patterns (matched against the
+    .aiml files in `data_dir`), or to {"files": [...], "predicates": {...}}.
+    The main kernel itself is the "default" bot.
+    """
+
+    def __init__(self, kernel, data_dir, specs):
+        self.kernel = kernel
+        self.data_dir = data_dir
+        self.bots = {}
+        self._lock = threading.Lock()
+        for name, spec in specs.items():
+            if name == DEFAULT_BOT:
+                raise ValueError(f'"{DEFAULT_BOT}" is the base brain and cannot have an overlay')
+            if isinstance(spec, list):
+                spec = {"files": spec}
+            bot_kernel = type(kernel)()
+            bot_kernel.verbose(False)
+            bot_kernel._sessions = kernel._sessions
+            bot_kernel._respondLock = kernel._respondLock
+            template_compiler.install(bot_kernel)
+            predicates = spec.get("predicates", {})
+            for key, value in predicates.items():
+                bot_kernel.setBotPredicate(key, value)
+            self.bots[name] = Bot(name, list(spec.get("files", [])), predicates, bot_kernel)
+
+    @classmethod
+    def from_json(cls, kernel, data_dir, specs_json):
+        return cls(kernel, data_dir, json.loads(specs_json) if specs_json else {})
+
+    def overlay_patterns(self):
+        """File patterns claimed by bots, to be left out of the base brain."""
+        return sorted({p for bot in self.bots.values() for p in bot.files})
+
+    def names(self):
+        return [DEFAULT_BOT] + sorted(self.bots)
+
+    def get_kernel(self, name=None):
+        """Return the kernel for bot `name` (the default bot if empty)."""
+        if not name or name == DEFAULT_BOT:
+            return self.kernel
+        bot = self.bots.get(name)
+        if bot is None:
+            raise UnknownBotError(name)
+        return bot.kernel
+
+    def load(self):
+        """Parse every bot's overlay files; call once before the first rebuild()."""
+        files = aiml_files(self.data_dir) if os.path.exists(self.data_dir) else []
+        for bot in self.bots.values():
+            start = time.time()
+            scratch = aiml.Kernel()
+            scratch.verbose(False)
+            matched = [f for f in files if any(fnmatch.fnmatch(f, p) for p in bot.files)]
+            for filename in matched:
+                scratch.learn(os.path.join(self.data_dir, filename))
+            bot.overlay_root = scratch._brain._root
+            bot.overlay_count = scratch.numCategories()
+            print(f"Bot '{bot.name}': {bot.overlay_count} overlay categories from "
+                  f"{len(matched)} files in {time.time() - start:.2f}s")
+
+    def rebuild(self, brain, tier):
+        """Layer every bot's overlay over a newly swapped-in base brain."""
+        BOT_CATEGORIES.set(brain._templateCount, bot=DEFAULT_BOT)
+        if self.bots and type(brain) is PatternMgr:
+            # The overlays share the base brain's nodes, so its own <learn>
+            # must not write into them either.
+            brain.__class__ = SharedPatternMgr
+        for bot in self.bots.values():
+            if bot.overlay_root is None:
+                continue
+            start = time.time()
+            overlaid, nodes = overlay_brain(brain, bot.overlay_root, bot.overlay_count)
+            with bot.kernel._respondLock:
+                bot.kernel._brain = overlaid
+            with self._lock:
+                bot.overlay_nodes = nodes
+                bot.tier = tier
+            BOT_CATEGORIES.set(overlaid._templateCount, bot=bot.name)
+            BOT_OVERLAY_NODES.set(nodes, bot=bot.name)
+            print(f"Bot '{bot.name}' ready on the {tier} brain "
+                  f"({nodes} overlay nodes in {time.time() - start:.2f}s)")
+
+    def approx_bytes(self):
+        """Bytes of the parsed overlays kept for rebuilds (see memory_stats.py)."""
+        with self._lock:
+            return sum(deep_size(bot.overlay_root) for bot in self.bots.values()
+                       if bot.overlay_root is not None)
+
+    def stats(self):
+        with self._lock:
+            bots = {DEFAULT_BOT: {"categories": self.kernel.numCategories()}}
+            for bot in self.bots.values():
+                bots[bot.name] = {
+                    "files": bot.files,
+                    "predicates": bot.predicates,
+                    "tier": bot.tier,
+                    "categories": bot.kernel.numCategories(),
+                    "overlay_categories": bot.overlay_count,
+                    "overlay_nodes": bot.overlay_nodes,
+                }
+            return bots
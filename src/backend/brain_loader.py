@@ -0,0 +1,226 @@
+"""
+Tiered AIML brain loading.
+
+The core tier (reductions and std-* files) is loaded synchronously so the
+backend can start serving; the full data set (including large topical files
+such as movies, sports, geography and mp0-6) is then loaded in a background
+thread and swapped into the kernel once complete.  Until the swap, inputs the
+core tier cannot answer fall through to the LLM in Hybrid mode.
+"""
+
+import fnmatch
+import hashlib
+import os
+import threading
+import time
+
+import aiml
+
+import template_compiler
+from compact_brain import CompactPatternMgr
+
+# States reported by BrainLoader.progress()
+STARTING = "starting"
+CORE_READY = "core_ready"
+READY = "ready"
+FAILED = "failed"
+
+
+def aiml_files(data_dir):
+    """Return the .aiml files in load order.
+
+    Regular files are loaded first, then 'that' files last to ensure <that>
+    patterns have priority.
+    """
+    all_files = [f for f in os.listdir(data_dir) if f.endswith(".aiml")]
+    that_files = [f for f in all_files if 'that' in f.lower()]
+    other_files = [f for f in all_files if 'that' not in f.lower()]
+    return sorted(other_files) + sorted(that_files)
+
+
+def cache_file_name(filename, exclude_patterns):
+    """Name of a brain cache file for a brain built without some files.
+
+    Brains that leave out different files must not share cache files, so
+    the exclusion list is hashed into the name.
+    """
+    if not filename or not exclude_patterns:
+        return filename
+    tag = hashlib.sha1(",".join(sorted(exclude_patterns)).encode("utf-8")).hexdigest()[:8]
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{tag}{ext}"
+
+
+class BrainLoader:
+    """Load a kernel's brain in tiers and report loading progress."""
+
+    def __init__(self, kernel, data_dir, brain_file, compact_brain_file,
+                 core_brain_file, core_patterns, compact=True, exclude_patterns=()):
+        self.kernel = kernel
+        self.data_dir = data_dir
+        # Files left out of this brain (e.g. claimed by a bot overlay)
+        self.exclude_patterns = list(exclude_patterns)
+        self.brain_file = cache_file_name(brain_file, self.exclude_patterns)
+        self.compact_brain_file = cache_file_name(compact_brain_file, self.exclude_patterns)
+        self.core_brain_file = cache_file_name(core_brain_file, self.exclude_patterns)
+        self.core_patterns = core_patterns
+        self.compact = compact
+        # Called as listener(brain, tier) after each brain swap
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = STARTING
+        self.tier = None
+        self.source = None
+        self.files_total = 0
+        self.files_loaded = 0
+        self.error = None
+        self.started_at = time.time()
+        self.core_seconds = None
+        self.full_seconds = None
+
+    def is_core_file(self, filename):
+        return any(fnmatch.fnmatch(filename, p) for p in self.core_patterns)
+
+    def is_excluded(self, filename):
+        return any(fnmatch.fnmatch(filename, p) for p in self.exclude_patterns)
+
+    def progress(self):
+        """Loading progress for the health endpoints."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "tier": self.tier,
+                "source": self.source,
+                "files_loaded": self.files_loaded,
+                "files_total": self.files_total,
+                "categories": self.kernel.numCategories(),
+                "core_seconds": self.core_seconds,
+                "full_seconds": self.full_seconds,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "error": self.error,
+            }
+
+    def is_ready(self):
+        """True once the kernel can answer requests (core tier or better)."""
+        return self.state in (CORE_READY, READY)
+
+    def load(self, tiered=True):
+        """Load the brain.
+
+        With `tiered`, load the core tier now and the full brain in the
+        background; otherwise load the full brain before returning.
+        """
+        if not tiered:
+            self._load_full()
+            return
+        start = time.time()
+        try:
+            brain = self._build(self.core_brain_file, None, self.is_core_file, "core")
+        except Exception as e:
+            print(f"Core brain load failed ({e}), loading full brain instead")
+            self._load_full()
+            return
+        self._swap(brain, "core")
+        with self._lock:
+            self.core_seconds = round(time.time() - start, 2)
+            self.state = CORE_READY
+        print(f"Core brain ready ({self.kernel.numCategories()} categories "
+              f"in {self.core_seconds}s), loading remaining files in background")
+        self._thread = threading.Thread(target=self._load_full, name="brain-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until background loading has finished."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _load_full(self):
+        start = time.time()
+        try:
+            brain = self._build(self.compact_brain_file, self.brain_file, None, "full")
+        except Exception as e:
+            print(f"Full brain load failed: {e}")
+            with self._lock:
+                self.state = FAILED if self.tier is None else self.state
+                self.error = str(e)
+            return
+        self._swap(brain, "full")
+        with self._lock:
+            self.full_seconds = round(time.time() - start, 2)
+            self.state = READY
+        print(f"Full brain ready ({self.kernel.numCategories()} categories in {self.full_seconds}s)")
+
+    def _is_fresh(self, cache_file, files):
+        """True if `cache_file` exists and is newer than each of `files`."""
+        try:
+            built = os.path.getmtime(cache_file)
+        except OSError:
+            return False
+        for filename in files:
+            if os.path.getmtime(os.path.join(self.data_dir, filename)) > built:
+                print(f"{filename} changed since {cache_file} was saved, rebuilding it")
+                return False
+        return True
+
+    def _build(self, compact_file, brain_file, file_filter, tier):
+        """Build a PatternMgr for one tier, using cached brain files if present.
+
+        A cache file older than one of the tier's AIML files (edited, or added
+        e.g. by distill.py) is rebuilt.
+        """
+        with self._lock:
+            self.files_total = self.files_loaded = 0
+        files = []
+        if os.path.exists(self.data_dir):
+            files = [f for f in aiml_files(self.data_dir)
+                     if (file_filter is None or file_filter(f)) and not self.is_excluded(f)]
+        if self.compact and compact_file and self._is_fresh(compact_file, files):
+            print(f"Loading {tier} brain from compact brain file: {compact_file}")
+            try:
+                brain = CompactPatternMgr.load_snapshot(compact_file)
+                self.source = compact_file
+                return brain
+            except ValueError as e:
+                print(f"Ignoring compact brain file ({e}), rebuilding it")
+
+        scratch = aiml.Kernel()
+        scratch.verbose(False)
+        if brain_file and self._is_fresh(brain_file, files):
+            print(f"Loading {tier} brain from brain file: {brain_file}")
+            self.source = brain_file
+            scratch.loadBrain(brain_file)
+        elif os.path.exists(self.data_dir):
+            self.source = self.data_dir
+            with self._lock:
+                self.files_total = len(files)
+            print(f"Parsing {len(files)} aiml files ({tier} brain)")
+            for filename in files:
+                scratch.learn(os.path.join(self.data_dir, filename))
+                with self._lock:
+                    self.files_loaded += 1
+            if brain_file:
+                print("Saving brain file: " + brain_file)
+                scratch.saveBrain(brain_file)
+        else:
+            print("Warning: data directory not found")
+
+        brain = scratch._brain
+        if self.compact and scratch.numCategories() > 0:
+            brain = CompactPatternMgr.from_pattern_mgr(brain)
+            if compact_file:
+                brain.save_snapshot(compact_file)
+                print(f"Saved compact {tier} brain file: {compact_file}")
+        return brain
+
+    def _swap(self, brain, tier):
+        """Install `brain` in the kernel between two respond() calls."""
+        with self.kernel._respondLock:
+            brain._botName = self.kernel._brain._botName
+            template_compiler.install(self.kernel)
+            self.kernel._brain = brain
+        with self._lock:
+            self.tier = tier
+        for listener in self.listeners:
+            listener(brain, tier)
@@ -0,0 +1,566 @@
+"""
+Compact in-memory representation of the python-aiml pattern graph.
+
+python-aiml stores the brain as nested dicts keyed by pattern words, one dict
+per trie node, with a separate template list per category.  With ~100k
+categories that is the bulk of a backend process' memory.  This module
+converts the loaded graph into:
+
+- a process-wide word table, so every pattern word is stored once and trie
+  nodes only hold small integer word IDs,
+- array-backed trie nodes (`__slots__` objects with a sorted `array` of key
+  IDs and a parallel tuple of children; the ~80% of nodes that have a single
+  child store that key and child inline),
+- a deduplicated template table, so identical templates (and identical
+  attribute dicts inside them) share one object.  Templates are stored
+  compiled (see template_compiler.py).
+
+`CompactNode` answers the same `in` / `[]` protocol as the dicts it replaces,
+so PatternMgr's matching code runs unchanged and `k.respond` behaves exactly
+as before.
+
+Converting a loaded dict brain leaves the process at its dict-sized peak RSS
+(freed dicts fragment the heap), so the compact brain is also saved as its own
+snapshot file; loading that snapshot never builds the dict graph at all.
+"""
+import gc
+import marshal
+import re
+import sys
+from array import array
+from bisect import bisect_left
+
+from aiml.PatternMgr import PatternMgr
+
+import template_compiler
+
+# PatternMgr uses small ints (0-5) for its special keys; word IDs start above
+# them so both kinds of key fit in one sorted array.
+_TEMPLATE = PatternMgr._TEMPLATE
+_FIRST_WORD_ID = 8
+
+SNAPSHOT_VERSION = 2
+
+# Top-level match results CompactPatternMgr keeps for <star/> lookups
+_RECENT_MATCHES = 32
+
+# Process-wide word table.  It only ever grows, so brains built at different
+# times (or several brains in one process) share a single copy of each word.
+# `_ids` holds one int object per ID so single-child nodes can share it.
+_word_ids = {}
+_words = []
+_ids = list(range(_FIRST_WORD_ID))
+
+_NO_KEYS = array('i')
+_NO_CHILDREN = ()
+
+_whitespaceRE = re.compile(r"\s+")
+
+
+def word_id(word):
+    """Return the ID of `word`, adding it to the word table if needed."""
+    wid = _word_ids.get(word)
+    if wid is None:
+        word = sys.intern(word)
+        wid = _FIRST_WORD_ID + len(_words)
+        _words.append(word)
+        _ids.append(wid)
+        _word_ids[word] = wid
+    return wid
+
+
+def word_for_id(wid):
+    """Return the key a node ID stands for (a word, or a PatternMgr int key)."""
+    if wid < _FIRST_WORD_ID:
+        return wid
+    return _words[wid - _FIRST_WORD_ID]
+
+
+def _key_id(key):
+    if key.__class__ is int:
+        return key
+    return _word_ids.get(key)
+
+
+class CompactNode:
+    """Trie node holding its children keyed by word ID.
+
+    `_keys` is either a single int (exactly one child, stored inline in
+    `_children`) or a sorted array of IDs with `_children` the parallel tuple.
+    """
+
+    __slots__ = ('_keys', '_children', '_template')
+
+    def __init__(self, keys=_NO_KEYS, children=_NO_CHILDREN, template=None):
+        self._keys = keys
+        self._children = children
+        self._template = template
+
+    def _child(self, kid):
+        keys = self._keys
+        if keys.__class__ is int:
+            return self._children if keys == kid else None
+        i = bisect_left(keys, kid)
+        if i < len(keys) and keys[i] == kid:
+            return self._children[i]
+        return None
+
+    def __contains__(self, key):
+        kid = _key_id(key)
+        if kid is None:
+            return False
+        if kid == _TEMPLATE:
+            return self._template is not None
+        return self._child(kid) is not None
+
+    def __getitem__(self, key):
+        kid = _key_id(key)
+        if kid is not None:
+            found = self._template if kid == _TEMPLATE else self._child(kid)
+            if found is not None:
+                return found
+        raise KeyError(key)
+
+    def __len__(self):
+        return len(self.key_ids()) + (self._template is not None)
+
+    def key_ids(self):
+        """Return the child key IDs as a sequence."""
+        keys = self._keys
+        return (keys,) if keys.__class__ is int else keys
+
+    def children(self):
+        """Return the children as a sequence parallel to key_ids()."""
+        return (self._children,) if self._keys.__class__ is int else self._children
+
+    def items(self):
+        """Yield (key, child) pairs like dict.items(), template included."""
+        for kid, child in zip(self.key_ids(), self.children()):
+            yield word_for_id(kid), child
+        if self._template is not None:
+            yield _TEMPLATE, self._template
+
+
+def _make_node(kids, children, template):
+    if not kids:
+        return CompactNode(template=template)
+    if len(kids) == 1:
+        return CompactNode(_ids[kids[0]], children[0], template)
+    return CompactNode(array('i', kids), tuple(children), template)
+
+
+class TemplateTable:
+    """Deduplicating store for compiled template element trees."""
+
+    def __init__(self, compile=True):
+        self.compile = compile
+        self._by_key = {}
+        self._attrs = {}
+        self.templates = []
+
+    def __len__(self):
+        return len(self.templates)
+
+    def add(self, template):
+        """Return the shared compiled copy of `template`, storing it if it is new."""
+        if self._by_key is None:
+            self._by_key = {marshal.dumps(t): t for t in self.templates}
+        if self.compile:
+            template = template_compiler.compile_template(template)
+        key = marshal.dumps(template)
+        shared = self._by_key.get(key)
+        if shared is None:
+            shared = self._intern(template)
+            self._by_key[key] = shared
+            self.templates.append(shared)
+        return shared
+
+    def seal(self):
+        """Drop the lookup indexes once bulk loading is done.
+
+        The template index holds a marshalled copy of every template; both
+        are rebuilt on demand if a category is added later.
+        """
+        self._by_key = None
+        self._attrs = {}
+
+    def _intern(self, elem):
+        """Copy an element tree with its strings and attribute dicts shared.
+
+        Kernel._processText() collapses whitespace in "default" text elements
+        the first time they are rendered and flips them to "preserve".  Doing
+        that here up front keeps the result identical and means no shared
+        attribute dict is ever mutated at respond time.
+        """
+        tag, attrs = elem[0], elem[1]
+        if tag == "text" and attrs.get("xml:space") == "default":
+            attrs = dict(attrs, **{"xml:space": "preserve"})
+            children = [_whitespaceRE.sub(" ", elem[2])]
+        else:
+            children = elem[2:]
+        out = [sys.intern(tag), self._intern_attrs(attrs)]
+        for child in children:
+            if isinstance(child, list):
+                out.append(self._intern(child))
+            elif isinstance(child, str):
+                out.append(sys.intern(child))
+            else:
+                out.append(child)
+        return out
+
+    def _intern_attrs(self, attrs):
+        key = tuple(sorted(attrs.items()))
+        shared = self._attrs.get(key)
+        if shared is None:
+            shared = {sys.intern(k): (sys.intern(v) if isinstance(v, str) else v)
+                      for k, v in attrs.items()}
+            self._attrs[key] = shared
+        return shared
+
+
+class _GCPaused:
+    """Pause the cyclic GC while building ~1M small, acyclic objects.
+
+    Otherwise the collector rescans the whole (growing) brain on every
+    generation-0 overflow, which makes the conversion several times slower.
+    """
+
+    def __enter__(self):
+        self._was_enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *exc):
+        if self._was_enabled:
+            gc.enable()
+
+
+def compact_tree(root, table):
+    """Convert a dict-based pattern trie into CompactNodes."""
+    with _GCPaused():
+        node = _compact_node(root, table)
+    table.seal()
+    return node
+
+
+def _compact_node(root, table):
+    template = root.get(_TEMPLATE)
+    if template is not None:
+        template = table.add(template)
+    branches = []
+    for key, child in root.items():
+        if key == _TEMPLATE:
+            continue
+        kid = key if key.__class__ is int else word_id(key)
+        branches.append((kid, child))
+    branches.sort(key=lambda branch: branch[0])
+    return _make_node([kid for kid, _ in branches],
+                      [_compact_node(child, table) for _, child in branches],
+                      template)
+
+
+def overlay_tree(base, overlay, table=None, stats=None):
+    """Return the trie `base` with the categories of dict trie `overlay` added.
+
+    Only the nodes on the overlay's paths are copied; every other subtree is
+    the same object as in `base`, and `base` itself is left untouched.  Where
+    both define a template the overlay's wins.  `base` may be a dict or a
+    CompactNode trie; for a CompactNode trie the overlay's templates are
+    stored in `table`.  If given, `stats` counts the copied "nodes" and the
+    "replaced" base templates.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("nodes", 0)
+    stats.setdefault("replaced", 0)
+    if isinstance(base, CompactNode):
+        return _overlay_compact(base, overlay, table, stats)
+    return _overlay_dict(base, overlay, stats)
+
+
+def _overlay_dict(base, overlay, stats):
+    node = dict(base)
+    stats["nodes"] += 1
+    for key, child in overlay.items():
+        if key == _TEMPLATE:
+            if _TEMPLATE in base:
+                stats["replaced"] += 1
+            node[key] = child
+        else:
+            node[key] = _overlay_dict(base.get(key, {}), child, stats)
+    return node
+
+
+def _overlay_compact(base, overlay, table, stats):
+    branches = dict(zip(base.key_ids(), base.children()))
+    template = base._template
+    stats["nodes"] += 1
+    for key, child in overlay.items():
+        if key == _TEMPLATE:
+            if template is not None:
+                stats["replaced"] += 1
+            template = table.add(child)
+            continue
+        kid = key if key.__class__ is int else word_id(key)
+        shared = branches.get(kid)
+        branches[kid] = _overlay_compact(CompactNode() if shared is None else shared,
+                                         child, table, stats)
+    kids = sorted(branches)
+    return _make_node(kids, [branches[kid] for kid in kids], template)
+
+
+def iter_categories(root, path=()):
+    """Yield (keys, template) for every category in a dict or compact trie.
+
+    `keys` is the tuple of node keys leading to the template: pattern words,
+    followed by PatternMgr._THAT / _TOPIC markers and their words.
+    """
+    for key, child in root.items():
+        if key == _TEMPLATE:
+            yield path, child
+        else:
+            for category in iter_categories(child, path + (key,)):
+                yield category
+
+
+class CompactPatternMgr(PatternMgr):
+    """PatternMgr whose pattern graph is held in CompactNodes."""
+
+    # MatchBudget charged while BudgetedKernel.respond_within() runs
+    _budget = None
+
+    def __init__(self):
+        PatternMgr.__init__(self)
+        self._templates = TemplateTable()
+        self._root = CompactNode()
+        # (words, that words, topic words) -> (pattern, template) of recent
+        # top-level matches; None disables
+        self._recent = {}
+
+    @classmethod
+    def from_pattern_mgr(cls, pm, compile_templates=True):
+        """Build a compact copy of a (dict-based) PatternMgr."""
+        compact = cls()
+        compact._templates.compile = compile_templates
+        compact._templateCount = pm._templateCount
+        compact._botName = pm._botName
+        if isinstance(pm._root, CompactNode):
+            compact._root = pm._root
+            compact._templates = getattr(pm, '_templates', compact._templates)
+        else:
+            compact._root = compact_tree(pm._root, compact._templates)
+        return compact
+
+    def numUniqueTemplates(self):
+        """Return the number of distinct templates in the template table."""
+        return len(self._templates)
+
+    def save(self, filename):
+        """Save in the regular python-aiml brain format.
+
+        Templates stay compiled, so the kernel that loads the file needs
+        template_compiler.install().
+        """
+        root = self._root
+        self._root = _thaw(root)
+        try:
+            PatternMgr.save(self, filename)
+        finally:
+            self._root = root
+
+    def restore(self, filename):
+        """Restore a python-aiml brain file and compact it."""
+        PatternMgr.restore(self, filename)
+        self._templates = TemplateTable()
+        self._root = compact_tree(self._root, self._templates)
+
+    def add(self, data, template):
+        """Add a category at runtime (e.g. from a <learn> tag).
+
+        The nodes on the category's path are copied instead of changed in
+        place, since the rest of the trie may be shared with bot overlays
+        (see bots.py).
+        """
+        category = PatternMgr()
+        category.add(data, template)
+        stats = {}
+        self._root = overlay_tree(self._root, category._root, self._templates, stats)
+        self._templateCount += 1 - stats["replaced"]
+        if self._recent:
+            self._recent.clear()
+
+    def _match(self, words, thatWords, topicWords, root):
+        """PatternMgr._match() over CompactNodes.
+
+        Same algorithm and result, but each input word is looked up in the
+        word table once up front instead of on every node visited.  Every
+        <star/> in a template makes PatternMgr.star() repeat the match that
+        selected the template, so recent top-level results are kept.
+        """
+        recent = self._recent
+        if recent is None or root is not self._root:
+            return self._match_ids(words, [_word_ids.get(w) for w in words],
+                                   thatWords, [_word_ids.get(w) for w in thatWords],
+                                   topicWords, [_word_ids.get(w) for w in topicWords],
+                                   root)
+        key = (tuple(words), tuple(thatWords), tuple(topicWords))
+        found = recent.get(key)
+        if found is None:
+            found = self._match_ids(words, [_word_ids.get(w) for w in words],
+                                    thatWords, [_word_ids.get(w) for w in thatWords],
+                                    topicWords, [_word_ids.get(w) for w in topicWords],
+                                    root)
+            if len(recent) >= _RECENT_MATCHES:
+                recent.clear()
+            recent[key] = found
+        return found
+
+    def _match_ids(self, words, ids, thatWords, thatIds, topicWords, topicIds, root):
+        if self._budget is not None:
+            self._budget.charge()  # one step per node visited (see match_budget.py)
+        if len(words) == 0:
+            pattern = []
+            template = None
+            if len(thatWords) > 0:
+                node = root._child(self._THAT)
+                if node is not None:
+                    pattern, template = self._match_ids(thatWords, thatIds, [], [],
+                                                        topicWords, topicIds, node)
+                    if pattern is not None:
+                        pattern = [self._THAT] + pattern
+            elif len(topicWords) > 0:
+                node = root._child(self._TOPIC)
+                if node is not None:
+                    pattern, template = self._match_ids(topicWords, topicIds, [], [],
+                                                        [], [], node)
+                    if pattern is not None:
+                        pattern = [self._TOPIC] + pattern
+            if template is None:
+                pattern = []
+                template = root._template
+            return (pattern, template)
+
+        first = words[0]
+        suffix = words[1:]
+        suffixIds = ids[1:]
+
+        node = root._child(self._UNDERSCORE)
+        if node is not None:
+            for j in range(len(suffix) + 1):
+                pattern, template = self._match_ids(suffix[j:], suffixIds[j:], thatWords, thatIds,
+                                                    topicWords, topicIds, node)
+                if template is not None:
+                    return ([self._UNDERSCORE] + pattern, template)
+
+        if ids[0] is not None:
+            node = root._child(ids[0])
+            if node is not None:
+                pattern, template = self._match_ids(suffix, suffixIds, thatWords, thatIds,
+                                                    topicWords, topicIds, node)
+                if template is not None:
+                    return ([first] + pattern, template)
+
+        if first == self._botName:
+            node = root._child(self._BOT_NAME)
+            if node is not None:
+                pattern, template = self._match_ids(suffix, suffixIds, thatWords, thatIds,
+                                                    topicWords, topicIds, node)
+                if template is not None:
+                    return ([first] + pattern, template)
+
+        node = root._child(self._STAR)
+        if node is not None:
+            for j in range(len(suffix) + 1):
+                pattern, template = self._match_ids(suffix[j:], suffixIds[j:], thatWords, thatIds,
+                                                    topicWords, topicIds, node)
+                if template is not None:
+                    return ([self._STAR] + pattern, template)
+
+        return (None, None)
+
+    def save_snapshot(self, filename):
+        """Save the compact graph so load_snapshot() can skip the dicts.
+
+        Layout: the templates list, the words used, and the trie as a
+        pre-order int array of [template index + 1, child count, key IDs...]
+        per node.
+        """
+        index = {id(t): i for i, t in enumerate(self._templates.templates)}
+        local_ids = {}
+        words = []
+        flat = array('i')
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            template = node._template
+            flat.append(0 if template is None else index[id(template)] + 1)
+            kids = node.key_ids()
+            flat.append(len(kids))
+            for kid in kids:
+                if kid >= _FIRST_WORD_ID:
+                    local = local_ids.get(kid)
+                    if local is None:
+                        local = local_ids[kid] = _FIRST_WORD_ID + len(words)
+                        words.append(word_for_id(kid))
+                    kid = local
+                flat.append(kid)
+            stack.extend(reversed(node.children()))
+        with open(filename, "wb") as outFile:
+            marshal.dump((SNAPSHOT_VERSION, self._templateCount, self._botName,
+                          words, self._templates.templates, flat.tobytes()), outFile)
+
+    @classmethod
+    def load_snapshot(cls, filename):
+        """Load a brain written by save_snapshot()."""
+        with open(filename, "rb") as inFile:
+            version, count, bot_name, words, templates, raw = marshal.load(inFile)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("unsupported brain snapshot version %r" % version)
+        pm = cls()
+        pm._templateCount = count
+        pm._botName = bot_name
+        pm._templates.templates = templates
+        pm._templates.seal()
+        remap = _ids[:_FIRST_WORD_ID] + [word_id(w) for w in words]
+        # Words already in the table (another brain loaded earlier) keep
+        # their IDs, which can reorder a node's keys
+        ordered = all(a < b for a, b in zip(remap, remap[1:]))
+        flat = array('i')
+        flat.frombytes(raw)
+        del raw
+        with _GCPaused():
+            pm._root = _build_node(flat, [0], remap, templates, ordered)
+        return pm
+
+
+def _build_node(flat, pos, remap, templates, ordered=True):
+    i = pos[0]
+    template = flat[i]
+    count = flat[i + 1]
+    kids = [remap[kid] for kid in flat[i + 2:i + 2 + count]]
+    pos[0] = i + 2 + count
+    children = [_build_node(flat, pos, remap, templates, ordered) for _ in range(count)]
+    if not ordered and count > 1:
+        order = sorted(range(count), key=kids.__getitem__)
+        kids = [kids[j] for j in order]
+        children = [children[j] for j in order]
+    return _make_node(kids, children, templates[template - 1] if template else None)
+
+
+def _thaw(node):
+    """Convert a CompactNode trie back into plain dicts."""
+    return {key: (child if key == _TEMPLATE else _thaw(child))
+            for key, child in node.items()}
+
+
+def compact_kernel(kernel):
+    """Swap a kernel's dict-based brain for a CompactPatternMgr in place."""
+    template_compiler.install(kernel)
+    kernel._brain = CompactPatternMgr.from_pattern_mgr(kernel._brain)
+    return kernel._brain
+
+
+def load_compact_brain(kernel, filename):
+    """Load a compact brain snapshot into `kernel`."""
+    template_compiler.install(kernel)
+    kernel._brain = CompactPatternMgr.load_snapshot(filename)
+    return kernel._brain
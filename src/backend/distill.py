@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Distill frequent LLM fallbacks into AIML categories.
+
+Reads the fallback logs written with FALLBACK_LOG (see fallback_log.py),
+normalizes each question the way the AIML kernel does before matching, and
+clusters equivalent questions: identical after normalization, or with word
+sets at least --similarity alike (Jaccard).  Clusters asked at least
+--min-count times get a category whose pattern is the most frequent wording;
+the other wordings <srai> to it.  The answer is reused from the log (one
+given without earlier conversation if there is one), or, with --generate,
+asked afresh from LiteLLM in parallel, without any history.
+
+Skipped: questions of several sentences, questions that refer back to the
+conversation ("it", "that", "he", ...), patterns the data set already has,
+and answers that are errors or AIML fallbacks.
+
+The categories are merged into --output (default
+data/generated-fallbacks.aiml), keeping those distilled earlier: once a
+question is answered from AIML it stops showing up in the logs.  The file
+loads with the rest of data/ in the usual order; the brain dump files are
+older than it, so the next start rebuilds the brain with it.  Finally the
+projected token and latency savings are printed.
+
+Usage (from src/backend):
+    python distill.py logs/fallbacks.jsonl [more.jsonl ...] [--min-count 3]
+        [--generate] [--dry-run] [--report savings.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import string
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+import aiml
+from aiml import Utils
+
+from brain_loader import aiml_files
+from llm_client import LLMClient
+
+DEFAULT_OUTPUT = os.path.join("data", "generated-fallbacks.aiml")
+
+# Questions with these words most likely depend on what was said before
+DEICTIC_WORDS = frozenset(
+    "IT ITS THAT THIS THESE THOSE THEY THEM THEIR HE HIM HIS SHE HER THERE "
+    "THEN ABOVE BEFORE AGAIN ELSE MORE".split())
+
+_punctuation_re = re.compile("[" + re.escape(string.punctuation) + "]")
+_pattern_re = re.compile(r"<pattern>(.*?)</pattern>", re.S | re.I)
+_category_re = re.compile(
+    r"<category>\s*<pattern>(.*?)</pattern>\s*<template>(.*?)</template>\s*</category>", re.S)
+
+
+class Normalizer:
+    """Turn input text into the words PatternMgr.match() compares."""
+
+    def __init__(self):
+        k = aiml.Kernel()
+        k.verbose(False)
+        self.normal = k._subbers['normal']
+
+    def sentences(self, text):
+        return Utils.sentences(text)
+
+    def pattern(self, text):
+        text = self.normal.sub(text).upper()
+        return " ".join(_punctuation_re.sub(" ", text).split())
+
+
+def read_logs(paths, bot=None):
+    """Yield the records of the fallback logs, optionally for one bot only."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash or rotation
+                if bot and record.get("bot", "default") != bot:
+                    continue
+                yield record
+
+
+def existing_patterns(data_dir, skip_file):
+    """Upper-cased <pattern> texts of every AIML file in `data_dir` but `skip_file`."""
+    patterns = set()
+    for filename in aiml_files(data_dir):
+        if filename == skip_file:
+            continue
+        with open(os.path.join(data_dir, filename), encoding="utf-8", errors="replace") as f:
+            for text in _pattern_re.findall(f.read()):
+                patterns.add(" ".join(text.upper().split()))
+    return patterns
+
+
+def read_generated(path):
+    """{pattern: template XML} of a file written by this tool."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {pattern: template for pattern, template in _category_re.findall(f.read())}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def cluster(counts, similarity):
+    """Group patterns into clusters, most frequent first.
+
+    `counts` maps pattern to times asked.  Each pattern joins the first
+    cluster whose leading pattern's word set is similar enough.
+    """
+    clusters = []
+    for pattern, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        words = frozenset(pattern.split())
+        for c in clusters:
+            if jaccard(words, c["words"]) >= similarity:
+                c["patterns"].append(pattern)
+                c["count"] += count
+                break
+        else:
+            clusters.append({"words": words, "patterns": [pattern], "count": count})
+    return clusters
+
+
+def pick_answer(records):
+    """The latest answer given without earlier conversation, else the latest."""
+    fresh = [r for r in records if not r.get("context")]
+    return max(fresh or records, key=lambda r: r.get("time", 0))["answer"]
+
+
+def generate_answers(questions, args):
+    """Ask LiteLLM each question without history; return {question: (answer, tokens)}."""
+    client = LLMClient(args.base_url, args.api_key, timeout=args.timeout, coalesce=False)
+
+    def ask(question):
+        try:
+            result = client.complete({
+                "model": args.model,
+                "messages": [{"role": "user", "content": f"{args.system_prompt}\n\n{question}"}],
+                "temperature": 0.7,
+                "max_tokens": args.max_tokens,
+            })
+        except Exception as e:
+            result = {"content": None, "tokens": {}, "error": str(e)}
+        if result.get("error"):
+            print(f"  generation failed for {question!r}: {result['error']}")
+            return question, (None, result["tokens"])
+        return question, (result["content"], result["tokens"])
+
+    with ThreadPoolExecutor(args.workers) as pool:
+        return dict(pool.map(ask, questions))
+
+
+def usable(answer):
+    return bool(answer and answer.strip()) and "Fallback:" not in answer
+
+
+def write_aiml(path, categories):
+    """Write {pattern: template XML} as an AIML file, atomically."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<!-- Generated by distill.py from logged LLM fallbacks; rerun it instead of editing. -->',
+             '<aiml version="1.0">', '']
+    for pattern in sorted(categories):
+        lines += ["<category>", f"<pattern>{pattern}</pattern>",
+                  f"<template>{categories[pattern]}</template>", "</category>", ""]
+    lines.append("</aiml>")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def savings_report(records, covered, span_seconds, args, generation_tokens):
+    """Projected savings of answering the `covered` records from AIML."""
+    days = span_seconds / 86400.0 if span_seconds >= 3600 else None
+    prompt = sum(r["tokens"].get("prompt", 0) for r in covered)
+    completion = sum(r["tokens"].get("completion", 0) for r in covered)
+    seconds = [r.get("seconds", 0.0) for r in covered]
+    report = {
+        "fallbacks": len(records),
+        "covered": len(covered),
+        "covered_share": round(len(covered) / len(records), 4) if records else 0.0,
+        "log_span_hours": round(span_seconds / 3600.0, 2),
+        "tokens_saved": {"prompt": prompt, "completion": completion, "total": prompt + completion},
+        "llm_seconds_saved": round(sum(seconds), 2),
+        "llm_latency_saved_ms": {
+            "mean": round(1000 * statistics.mean(seconds), 1) if seconds else 0.0,
+            "p50": round(1000 * percentile(seconds, 0.5), 1) if seconds else 0.0,
+            "p95": round(1000 * percentile(seconds, 0.95), 1) if seconds else 0.0,
+        },
+        "cost_saved_usd": round((prompt * args.cost_per_1k_prompt +
+                                 completion * args.cost_per_1k_completion) / 1000.0, 6),
+        "generation_tokens": generation_tokens,
+    }
+    if days:
+        report["per_day"] = {
+            "turns": round(len(covered) / days, 1),
+            "tokens": round((prompt + completion) / days),
+            "cost_usd": round(report["cost_saved_usd"] / days, 4),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\nLLM fallbacks in the logs: {report['fallbacks']} over "
+          f"{report['log_span_hours']} h")
+    print(f"Now answered from AIML:    {report['covered']} "
+          f"({report['covered_share']:.0%})")
+    tokens = report["tokens_saved"]
+    print(f"Tokens saved:              {tokens['total']} "
+          f"({tokens['prompt']} prompt, {tokens['completion']} completion), "
+          f"${report['cost_saved_usd']}")
+    latency = report["llm_latency_saved_ms"]
+    print(f"LLM time saved:            {report['llm_seconds_saved']} s; per turn "
+          f"mean {latency['mean']} ms, p50 {latency['p50']} ms, p95 {latency['p95']} ms "
+          f"(an AIML match takes well under 1 ms)")
+    if "per_day" in report:
+        per_day = report["per_day"]
+        print(f"Projected per day:         {per_day['turns']} turns, {per_day['tokens']} tokens, "
+              f"${per_day['cost_usd']}")
+    if report["generation_tokens"]:
+        print(f"One-off generation cost:   {report['generation_tokens']} tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="fallback log files (JSON lines)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help=f"generated AIML file (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--data", default="data", help="AIML data directory (default data)")
+    parser.add_argument("--bot", default="default",
+                        help="only distill this bot's fallbacks (default: default; '' = all)")
+    parser.add_argument("--min-count", type=int, default=3,
+                        help="times a question must be asked to be distilled (default 3)")
+    parser.add_argument("--similarity", type=float, default=0.8,
+                        help="word-set similarity to merge questions (default 0.8, 1 = same words)")
+    parser.add_argument("--replace", action="store_true",
+                        help="drop the categories distilled earlier")
+    parser.add_argument("--dry-run", action="store_true", help="report only, write nothing")
+    parser.add_argument("--report", help="also write the savings report as JSON to this file")
+    parser.add_argument("--generate", action="store_true",
+                        help="ask LiteLLM for new answers instead of reusing logged ones")
+    parser.add_argument("--workers", type=int, default=4, help="parallel generation requests")
+    parser.add_argument("--base-url", default=os.getenv("LITELLM_BASE_URL", "http://localhost:4000"))
+    parser.add_argument("--api-key", default=os.getenv("LITELLM_API_KEY", ""))
+    parser.add_argument("--model", default=os.getenv("LITELLM_MODEL", ""))
+    parser.add_argument("--system-prompt", default=os.getenv(
+        "LITELLM_SYSTEM_PROMPT", "You are a helpful and friendly chatbot assistant."))
+    parser.add_argument("--max-tokens", type=int,
+                        default=int(os.getenv("LITELLM_MAX_COMPLETION_TOKENS", "150")))
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--cost-per-1k-prompt", type=float, default=0.0)
+    parser.add_argument("--cost-per-1k-completion", type=float, default=0.0)
+    args = parser.parse_args()
+
+    normalizer = Normalizer()
+    records = [r for r in read_logs(args.logs, args.bot or None)
+               if r.get("question") and usable(r.get("answer"))]
+    if not records:
+        print("No usable fallbacks in the logs")
+        return
+    times = [r["time"] for r in records if r.get("time")]
+    span_seconds = max(times) - min(times) if times else 0.0
+
+    by_pattern = defaultdict(list)
+    skipped = Counter()
+    for r in records:
+        if len(normalizer.sentences(r["question"])) != 1:
+            skipped["several sentences"] += 1
+            continue
+        pattern = normalizer.pattern(r["question"])
+        if not pattern:
+            skipped["empty"] += 1
+        elif DEICTIC_WORDS & set(pattern.split()):
+            skipped["refers to the conversation"] += 1
+        else:
+            by_pattern[pattern].append(r)
+
+    output_file = os.path.basename(args.output)
+    known = existing_patterns(args.data, output_file)
+    for pattern in [p for p in by_pattern if p in known]:
+        skipped["already in the data set"] += len(by_pattern.pop(pattern))
+
+    clusters = [c for c in cluster({p: len(rs) for p, rs in by_pattern.items()}, args.similarity)
+                if c["count"] >= args.min_count]
+    print(f"{len(records)} fallbacks, {len(by_pattern)} distinct questions, "
+          f"{len(clusters)} asked at least {args.min_count} times")
+    for reason, count in skipped.most_common():
+        print(f"  skipped {count}: {reason}")
+
+    generation_tokens = 0
+    if args.generate:
+        start = time.time()
+        generated = generate_answers([c["patterns"][0].lower() for c in clusters], args)
+        generation_tokens = sum(tokens.get("total", 0) for _, tokens in generated.values())
+        print(f"Generated {len(generated)} answers in {time.time() - start:.1f}s")
+
+    categories = {} if args.replace else read_generated(args.output)
+    covered = []
+    for c in clusters:
+        lead = c["patterns"][0]
+        if args.generate:
+            answer = generated[lead.lower()][0]
+        else:
+            answer = pick_answer([r for p in c["patterns"] for r in by_pattern[p]])
+        if not usable(answer):
+            continue
+        categories[lead] = escape(answer.strip())
+        for pattern in c["patterns"][1:]:
+            categories[pattern] = f"<srai>{lead}</srai>"
+        covered += [r for p in c["patterns"] for r in by_pattern[p]]
+        print(f"  {c['count']:>5}x {lead}" +
+              (f"  (+{len(c['patterns']) - 1} wordings)" if len(c["patterns"]) > 1 else ""))
+
+    report = savings_report(records, covered, span_seconds, args, generation_tokens)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+
+    if args.dry_run:
+        print(f"\nDry run: {args.output} not written")
+        return
+    if not categories:
+        print("\nNothing to write")
+        return
+    write_aiml(args.output, categories)
+    print(f"\nWrote {len(categories)} categories to {args.output}; "
+          "the brain is rebuilt with them on the next start")
+
+
+if __name__ == "__main__":
+    main()
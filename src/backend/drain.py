@@ -0,0 +1,232 @@
+"""
+Graceful drain on SIGTERM, with session handoff to the pods that stay.
+
+Session predicates and history live in the pod's memory (and its local
+session database), so without a handoff every conversation on a pod that is
+scaled in or replaced by a rollout loses its context.  Drainer.start(),
+called from the SIGTERM handler, runs in three steps:
+
+1. draining: /readyz reports 503 so the pod leaves the Service endpoints,
+   and /chat and /ws turn away new sessions (503, the client retries on
+   another pod); turns for existing sessions are still served.  This lasts
+   at least `settle_seconds` and until both lanes are idle, so in-flight LLM
+   calls finish, but no longer than `timeout`.
+2. handing off: every turn is refused while all sessions, in memory and
+   spilled, are exported as one gzipped JSON file to `handoff_dir`, a volume
+   shared by all backend pods.
+3. the process exits.
+
+Every pod imports the files waiting in `handoff_dir` at startup, and polls
+the directory afterwards so the pods that stay pick up a scale-in handoff.
+A file is claimed by renaming it, so only one pod imports it.  It is deleted
+once imported; a file that fails to import is renamed to `<name>.failed`
+and left in `handoff_dir` so its sessions can still be recovered by hand.
+"""
+
+import gzip
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from metrics import Counter, Gauge
+
+HANDOFF_VERSION = 1
+
+SERVING = "serving"
+DRAINING = "draining"
+HANDING_OFF = "handing_off"
+
+DRAIN_STATE = Gauge(
+    "backend_draining",
+    "1 while the backend drains before shutdown")
+HANDOFF_SECONDS = Gauge(
+    "session_handoff_seconds",
+    "Duration of the last session handoff export or import",
+    ["direction"])
+HANDOFF_SESSIONS = Counter(
+    "session_handoff_sessions_total",
+    "Sessions exported at shutdown or imported from another pod",
+    ["direction"])
+
+_PREFIX = "sessions-"
+_SUFFIX = ".json.gz"
+_FAILED = ".failed"
+
+
+def exit_process():
+    """Exit at once: in-flight turns are done and the sessions handed off."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
+
+
+def encode(records):
+    """Pack SessionStore.export_records() output for the handoff file."""
+    body = json.dumps({"version": HANDOFF_VERSION, "sessions": records},
+                      separators=(",", ":"))
+    return gzip.compress(body.encode("utf-8"), compresslevel=1)
+
+
+def decode(data):
+    body = json.loads(gzip.decompress(data))
+    if body.get("version") != HANDOFF_VERSION:
+        raise ValueError("unsupported session handoff version %r" % body.get("version"))
+    return body["sessions"]
+
+
+class Drainer:
+    """Drain this backend on shutdown and move its sessions to the others."""
+
+    def __init__(self, session_store, lanes, handoff_dir="", settle_seconds=5,
+                 timeout=30, poll_seconds=10, on_done=exit_process):
+        self.session_store = session_store
+        self.lanes = lanes
+        self.handoff_dir = handoff_dir
+        self.settle_seconds = settle_seconds
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        self.on_done = on_done
+        self.state = SERVING
+        self.last_export = None
+        self.last_import = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        DRAIN_STATE.set(0)
+
+    def is_draining(self):
+        return self.state != SERVING
+
+    def accepts(self, session_id):
+        """True if a turn for `session_id` (None for a new one) may start now."""
+        if self.state == SERVING:
+            return True
+        if self.state == DRAINING:
+            return session_id is not None and self.session_store.known(session_id)
+        return False
+
+    def start(self):
+        """Begin draining in the background; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._drain, name="drain", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _drain(self):
+        start = time.time()
+        self.state = DRAINING
+        DRAIN_STATE.set(1)
+        print(f"Draining: refusing new sessions, waiting up to {self.timeout}s for in-flight turns")
+        deadline = start + self.timeout
+        while time.time() < deadline:
+            busy = sum(lane.stats()["queued"] + lane.stats()["active"] for lane in self.lanes)
+            if busy == 0 and time.time() - start >= self.settle_seconds:
+                break
+            time.sleep(0.1)
+        else:
+            print("Drain timeout reached with turns still in flight")
+        self.state = HANDING_OFF
+        try:
+            self.export()
+        except Exception as e:
+            print(f"Session handoff export failed: {e}")
+        print(f"Drained in {time.time() - start:.2f}s, shutting down")
+        self.on_done()
+
+    def export(self):
+        """Write all sessions to a new file in `handoff_dir`; return the path."""
+        if not self.handoff_dir:
+            return None
+        if not os.path.isdir(self.handoff_dir):
+            print(f"Session handoff directory {self.handoff_dir} not found, sessions not exported")
+            return None
+        start = time.time()
+        records = self.session_store.export_records()
+        data = encode(records)
+        name = f"{_PREFIX}{socket.gethostname()}-{int(start * 1000)}{_SUFFIX}"
+        path = os.path.join(self.handoff_dir, name)
+        # Written under a name import_pending() skips, then renamed into place
+        tmp = os.path.join(self.handoff_dir, "." + name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        seconds = time.time() - start
+        self.last_export = {"sessions": len(records), "bytes": len(data),
+                            "seconds": round(seconds, 3), "file": name}
+        HANDOFF_SECONDS.set(seconds, direction="export")
+        HANDOFF_SESSIONS.inc(len(records), direction="export")
+        print(f"Exported {len(records)} sessions ({len(data)} bytes) to {path} in {seconds:.3f}s")
+        return path
+
+    def import_pending(self):
+        """Import every handoff file waiting in `handoff_dir`; return the session count."""
+        if not self.handoff_dir or not os.path.isdir(self.handoff_dir):
+            return 0
+        total = 0
+        for name in sorted(os.listdir(self.handoff_dir)):
+            if not (name.startswith(_PREFIX) and name.endswith(_SUFFIX)):
+                continue
+            path = os.path.join(self.handoff_dir, name)
+            claimed = os.path.join(self.handoff_dir, f".{name}.{socket.gethostname()}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # claimed by another pod
+            start = time.time()
+            try:
+                with open(claimed, "rb") as f:
+                    records = decode(f.read())
+                imported = self.session_store.import_records(records)
+            except Exception as e:
+                failed = path + _FAILED
+                print(f"Session handoff file {name} failed to import ({e}), kept as {failed}")
+                try:
+                    os.rename(claimed, failed)
+                except OSError as rename_error:
+                    print(f"Could not rename {claimed} to {failed}: {rename_error}")
+                continue
+            os.remove(claimed)
+            seconds = time.time() - start
+            self.last_import = {"sessions": imported, "offered": len(records),
+                                "seconds": round(seconds, 3), "file": name}
+            HANDOFF_SECONDS.set(seconds, direction="import")
+            HANDOFF_SESSIONS.inc(imported, direction="import")
+            print(f"Imported {imported} of {len(records)} sessions from {name} in {seconds:.3f}s")
+            total += imported
+        return total
+
+    def watch(self):
+        """Import handoff files every `poll_seconds` in a daemon thread until draining."""
+        if not self.handoff_dir or not self.poll_seconds or self._watcher is not None:
+            return
+
+        def run():
+            while not self.is_draining():
+                time.sleep(self.poll_seconds)
+                if self.is_draining():
+                    break
+                try:
+                    self.import_pending()
+                except Exception as e:
+                    print(f"Session handoff import failed: {e}")
+
+        self._watcher = threading.Thread(target=run, name="handoff-watcher", daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "handoff_dir": self.handoff_dir,
+            "last_export": self.last_export,
+            "last_import": self.last_import,
+        }
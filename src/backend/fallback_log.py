@@ -0,0 +1,58 @@
+"""
+Log of Hybrid-mode turns the LLM answered, for offline distillation.
+
+Each line is a JSON object with the question, the LLM's answer, the bot,
+model, tokens, LLM latency and the number of earlier messages in the
+session.  distill.py mines these files for questions that keep falling
+through to the LLM and turns them into AIML categories.  When the file
+grows past `max_bytes` it is rotated to `<path>.1`.
+"""
+
+import json
+import os
+import threading
+import time
+
+from metrics import Counter
+
+FALLBACKS_LOGGED = Counter(
+    "fallback_log_records_total",
+    "Hybrid-mode LLM fallbacks written to the fallback log")
+
+
+class FallbackLog:
+    """Append LLM fallbacks to a JSON-lines file; does nothing without a path."""
+
+    def __init__(self, path="", max_bytes=0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, question, answer, bot, model, tokens, seconds, context):
+        if not self.path:
+            return
+        line = json.dumps({
+            "time": round(time.time(), 3),
+            "bot": bot,
+            "question": question,
+            "answer": answer,
+            "model": model,
+            "tokens": tokens,
+            "seconds": round(seconds, 4),
+            "context": context,
+        }, ensure_ascii=False)
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line + "\n")
+                self._file.flush()
+                if self.max_bytes and self._file.tell() > self.max_bytes:
+                    self._file.close()
+                    self._file = None
+                    os.replace(self.path, self.path + ".1")
+            except OSError as e:
+                print(f"Fallback log write failed: {e}")
+                return
+        FALLBACKS_LOGGED.inc()
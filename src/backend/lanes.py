@@ -0,0 +1,143 @@
+"""
+Execution lanes and per-session admission control for /chat.
+
+AIML matching takes milliseconds while an LLM call takes seconds, so the two
+run on separately sized executors: the fast lane only ever runs AIML turns,
+and a burst of LLM turns can at most fill the slow lane.  Each lane has a
+bounded queue; once it is full new work is shed (LaneFullError) instead of
+waiting behind everything already queued.
+
+SessionRateLimiter gives every session a token bucket so a single client
+cannot flood either lane.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_stats import sampled_size
+from metrics import Counter, Gauge, Histogram
+
+LANE_QUEUE_DEPTH = Gauge(
+    "lane_queue_depth",
+    "Tasks waiting for a worker",
+    ["lane"])
+LANE_ACTIVE = Gauge(
+    "lane_active_tasks",
+    "Tasks currently running",
+    ["lane"])
+LANE_WAIT = Histogram(
+    "lane_wait_seconds",
+    "Time tasks spent queued before a worker picked them up",
+    ["lane"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+LANE_RUN = Histogram(
+    "lane_run_seconds",
+    "Time tasks spent running",
+    ["lane"])
+LANE_SHED = Counter(
+    "lane_shed_total",
+    "Tasks rejected because the lane queue was full",
+    ["lane"])
+RATE_LIMITED = Counter(
+    "chat_rate_limited_total",
+    "Chat requests rejected by the per-session token bucket")
+
+
+class LaneFullError(Exception):
+    """Raised when a lane's queue is full and the task was shed."""
+
+
+class Lane:
+    """A fixed pool of workers with a bounded wait queue."""
+
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"lane-{name}")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        LANE_QUEUE_DEPTH.set(0, lane=name)
+        LANE_ACTIVE.set(0, lane=name)
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this lane and return its result.
+
+        Raises LaneFullError without running fn when `max_queue` tasks are
+        already waiting.
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                LANE_SHED.inc(lane=self.name)
+                raise LaneFullError(f"{self.name} lane is full ({self._queued} queued)")
+            self._queued += 1
+            LANE_QUEUE_DEPTH.set(self._queued, lane=self.name)
+        enqueued = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                LANE_QUEUE_DEPTH.set(self._queued, lane=self.name)
+                LANE_ACTIVE.set(self._active, lane=self.name)
+            LANE_WAIT.observe(started - enqueued, lane=self.name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                LANE_RUN.observe(time.monotonic() - started, lane=self.name)
+                with self._lock:
+                    self._active -= 1
+                    LANE_ACTIVE.set(self._active, lane=self.name)
+
+        return self._executor.submit(task).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "active": self._active,
+            }
+
+
+class SessionRateLimiter:
+    """Token bucket per session: `rate` turns per second, bursts of `burst`.
+
+    Buckets of the least recently seen sessions are forgotten beyond
+    `max_sessions`; a forgotten session simply starts with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_sessions=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def allow(self, session_id):
+        """Take one token for `session_id`; False if its bucket is empty."""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(session_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[session_id] = (tokens, now)
+            if len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            RATE_LIMITED.inc()
+        return allowed
+
+    def approx_bytes(self):
+        """Approximate size of the per-session buckets (see memory_stats.py)."""
+        with self._lock:
+            return sampled_size(self._buckets)
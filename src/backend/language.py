@@ -0,0 +1,290 @@
+"""
+Input language detection and per-language AIML brains.
+
+data/ mixes languages (std-german.aiml sits next to the English sets) and the
+main brain matches every input against all of them: German input wanders
+through the English reductions before it finds a German pattern, and where
+both sets define a pattern (JA, NEIN) the file loaded last wins.
+LanguageRouter partitions the AIML files by their <meta name="language">
+tag (`default` for files without one) and gives each configured language a
+sub-brain of its own files only.  Like the bots in bots.py, each sub-brain
+has its own kernel sharing the main kernel's sessions, bot predicates and
+respond lock, and it is loaded with BrainLoader, so it gets its own compact
+brain file.  Sub-brains are loaded in the background once the main brain's
+full tier is in, so they do not slow down startup.
+
+NgramDetector is trained on the same files, so it knows exactly the
+languages the brain has: a naive Bayes classifier over character 1- to
+3-grams, tens of microseconds per input and no dependencies.  Inputs it is
+not confident about (short or mixed ones) are matched against the main
+brain as before.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from brain_loader import BrainLoader, aiml_files
+from memory_stats import brain_size
+from metrics import Counter, Gauge
+
+# Letters of the n-grams; inputs with fewer are not classified
+MIN_LETTERS = 4
+# Only the start of long inputs is classified
+MAX_DETECT_CHARS = 500
+
+NAMES = {
+    "de": "German", "en": "English", "es": "Spanish", "fr": "French",
+    "it": "Italian", "nl": "Dutch", "pl": "Polish", "pt": "Portuguese",
+    "ru": "Russian", "tr": "Turkish",
+}
+
+LANGUAGE_DETECTIONS = Counter(
+    "language_detections_total",
+    "Chat inputs by detected language (unknown: below the minimum confidence)",
+    ["language"])
+LANGUAGE_ROUTED = Counter(
+    "aiml_language_routed_total",
+    "AIML matches sent to a language sub-brain instead of the main brain",
+    ["language"])
+LANGUAGE_BRAIN_CATEGORIES = Gauge(
+    "aiml_language_brain_categories",
+    "Categories in each language sub-brain",
+    ["language"])
+
+# German text in the data set is transliterated (faehrst for fährst)
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_nonLetterRE = re.compile(r"[\W\d_]+")
+_commentRE = re.compile(r"<!--.*?-->", re.S)
+_tagRE = re.compile(r"<[^>]*>")
+_metaRE = re.compile(r"<meta\b[^>]*\bname\s*=\s*[\"']language[\"'][^>]*>", re.I)
+_contentRE = re.compile(r"\bcontent\s*=\s*[\"']([^\"']+)[\"']", re.I)
+
+
+def normalize(text):
+    """Lowercase letters only, accents folded, words separated by single spaces."""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text.translate(_FOLD))
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " " + " ".join(_nonLetterRE.sub(" ", text).split()) + " "
+
+
+def ngrams(text, order=3):
+    """Character 1- to `order`-grams of normalized `text` (word boundaries as spaces)."""
+    grams = []
+    for n in range(1, order + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return [g for g in grams if g.strip()]
+
+
+def file_language(path, default):
+    """The <meta name="language"> of an AIML file, or `default`."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(4096).decode("latin-1")
+    except OSError:
+        return default
+    meta = _metaRE.search(_commentRE.sub(" ", head))
+    content = _contentRE.search(meta.group(0)) if meta else None
+    return content.group(1).strip().lower() if content else default
+
+
+def file_text(path, max_bytes):
+    """Up to about `max_bytes` of the text of an AIML file, markup removed.
+
+    Long files are sampled from the middle, past their license header.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    if len(raw) > max_bytes:
+        start = (len(raw) - max_bytes) // 2
+        raw = raw[start:start + max_bytes]
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("latin-1")
+    return _tagRE.sub(" ", _commentRE.sub(" ", text))
+
+
+class NgramDetector:
+    """Naive Bayes language classifier over character n-grams."""
+
+    def __init__(self, order=3):
+        self.order = order
+        # language -> {n-gram: log probability}, and the log probability of unseen n-grams
+        self.profiles = {}
+        self.unseen = {}
+
+    def train(self, language, text):
+        counts = {}
+        for gram in ngrams(normalize(text), self.order):
+            counts[gram] = counts.get(gram, 0) + 1
+        # Add-one smoothing
+        denominator = math.log(sum(counts.values()) + len(counts) + 1)
+        self.profiles[language] = {g: math.log(c + 1) - denominator
+                                   for g, c in counts.items()}
+        self.unseen[language] = -denominator
+
+    def detect(self, text):
+        """(language, confidence) of `text`; (None, 0.0) if it cannot be told."""
+        text = normalize(text[:MAX_DETECT_CHARS])
+        if len(self.profiles) < 2 or len(text.replace(" ", "")) < MIN_LETTERS:
+            return None, 0.0
+        grams = ngrams(text, self.order)
+        scores = {}
+        for language, profile in self.profiles.items():
+            get = profile.get
+            unseen = self.unseen[language]
+            # The n-grams overlap, so each letter is counted `order` times
+            scores[language] = sum(get(g, unseen) for g in grams) / self.order
+        best = max(scores, key=scores.get)
+        # Posterior of the best language, all languages equally likely
+        top = scores[best]
+        return best, 1.0 / sum(math.exp(s - top) for s in scores.values())
+
+
+class LanguageBrain:
+    """A sub-brain of one language's files, with its own kernel and loader."""
+
+    def __init__(self, language, files, kernel, loader):
+        self.language = language
+        self.files = files
+        self.kernel = kernel
+        self.loader = loader
+        self.bytes = None
+
+
+class LanguageRouter:
+    """Detect the language of inputs and route them to per-language sub-brains.
+
+    `brains` lists the languages that get a sub-brain ("auto": every language
+    but `default`, whose files are most of the main brain anyway).  Files
+    matching `exclude_patterns` (bot overlays) are left out of the sub-brains
+    but still train the detector.
+    """
+
+    def __init__(self, kernel, data_dir, compact_brain_file, default="en", brains="auto",
+                 min_confidence=0.9, compact=True, exclude_patterns=(),
+                 training_bytes=300000):
+        self.kernel = kernel
+        self.default = default
+        self.min_confidence = min_confidence
+        self.detector = NgramDetector()
+        self.files = {}
+        self.training_chars = {}
+        self.brains = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+        start = time.time()
+        filenames = aiml_files(data_dir) if os.path.exists(data_dir) else []
+        for filename in filenames:
+            language = file_language(os.path.join(data_dir, filename), default)
+            self.files.setdefault(language, []).append(filename)
+        if len(self.files) < 2:
+            return
+        for language, files in self.files.items():
+            share = max(1, training_bytes // len(files))
+            text = " ".join(file_text(os.path.join(data_dir, f), share) for f in files)
+            self.detector.train(language, text)
+            self.training_chars[language] = len(text)
+
+        if brains == "auto":
+            brains = [language for language in self.files if language != default]
+        for language in brains:
+            if language not in self.files:
+                print(f"No AIML files in language '{language}', not building a sub-brain")
+                continue
+            others = [f for other, files in self.files.items() if other != language
+                      for f in files]
+            loader = BrainLoader(
+                type(kernel)(), data_dir, brain_file=None,
+                compact_brain_file=compact_brain_file, core_brain_file=None,
+                core_patterns=(), compact=compact,
+                exclude_patterns=list(exclude_patterns) + others)
+            files = [f for f in self.files[language] if not loader.is_excluded(f)]
+            if not files:
+                continue
+            sub_kernel = loader.kernel
+            sub_kernel.verbose(False)
+            sub_kernel._sessions = kernel._sessions
+            sub_kernel._botPredicates = kernel._botPredicates
+            sub_kernel._respondLock = kernel._respondLock
+            sub_kernel._brain._botName = kernel._brain._botName
+            self.brains[language] = LanguageBrain(language, files, sub_kernel, loader)
+        print(f"Language detection trained on {', '.join(sorted(self.files))} "
+              f"in {time.time() - start:.2f}s")
+
+    def on_swap(self, brain, tier):
+        """BrainLoader listener: load the sub-brains once the full brain is in."""
+        if tier != "full" or not self.brains or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.load, name="language-brains", daemon=True)
+        self._thread.start()
+
+    def load(self):
+        for sub in self.brains.values():
+            sub.loader.load(tiered=False)
+            if not sub.loader.is_ready():
+                print(f"Language brain '{sub.language}' failed to load, "
+                      f"its inputs stay on the main brain")
+                continue
+            size = brain_size(sub.kernel._brain)
+            with self._lock:
+                sub.bytes = size["trie_bytes"] + size["template_bytes"]
+            LANGUAGE_BRAIN_CATEGORIES.set(sub.kernel.numCategories(), language=sub.language)
+            print(f"Language brain '{sub.language}' ready: {sub.kernel.numCategories()} "
+                  f"categories from {len(sub.files)} files")
+
+    def wait(self, timeout=None):
+        """Block until the sub-brains have been loaded."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def detect(self, text):
+        """(language, confidence); language is None below `min_confidence`."""
+        language, confidence = self.detector.detect(text)
+        if confidence < self.min_confidence:
+            language = None
+        LANGUAGE_DETECTIONS.inc(language=language or "unknown")
+        return language, confidence
+
+    def get_kernel(self, language):
+        """The kernel of `language`'s sub-brain, or None to use the main brain."""
+        sub = self.brains.get(language)
+        if sub is None or not sub.loader.is_ready():
+            return None
+        LANGUAGE_ROUTED.inc(language=language)
+        return sub.kernel
+
+    def hint(self, language):
+        """LLM instruction to answer in `language`, or None for the default language."""
+        if not language or language == self.default:
+            return None
+        return f"Reply in {NAMES.get(language, language)}."
+
+    def approx_bytes(self):
+        """Bytes of the loaded sub-brains, measured once after loading (see memory_stats.py)."""
+        with self._lock:
+            return sum(sub.bytes for sub in self.brains.values() if sub.bytes)
+
+    def stats(self):
+        languages = {}
+        for language, files in sorted(self.files.items()):
+            sub = self.brains.get(language)
+            languages[language] = {
+                "files": len(files),
+                "training_chars": self.training_chars.get(language, 0),
+                "brain": None if sub is None else {
+                    "state": sub.loader.state,
+                    "files": len(sub.files),
+                    "categories": sub.kernel.numCategories(),
+                    "seconds": sub.loader.full_seconds,
+                },
+            }
+        return {"default": self.default, "min_confidence": self.min_confidence,
+                "languages": languages}
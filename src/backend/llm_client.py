@@ -0,0 +1,244 @@
+"""
+HTTP client for LiteLLM's OpenAI-compatible /chat/completions endpoint.
+
+Identical in-flight requests are coalesced: when concurrent sessions send a
+byte-identical payload (same model, parameters, context window and message),
+only one upstream call is made and every waiter receives its result.
+Requests whose history differs produce different payloads and are never
+merged.
+
+Each upstream call goes through the resilience layer in llm_resilience.py:
+an adaptive timeout, a circuit breaker and optional hedged requests.
+
+stream() requests a server-sent-event stream instead and hands each chunk of
+text to a callback as it arrives; streams share the timeout and breaker but
+are never coalesced or hedged.
+"""
+
+import hashlib
+import json
+import time
+
+import requests
+
+from llm_resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, hedge_pool, hedged_call
+from metrics import Counter, Gauge
+from singleflight import SingleFlight
+
+EMPTY_TOKENS = {"prompt": 0, "completion": 0, "total": 0, "cached": 0, "cache_write": 0}
+
+UPSTREAM_CALLS = Counter(
+    "llm_upstream_calls_total",
+    "Chat completion requests actually sent to LiteLLM")
+COALESCED_CALLS = Counter(
+    "llm_coalesced_calls_total",
+    "Chat completion requests answered by another identical in-flight request")
+COALESCED_TOKENS = Counter(
+    "llm_coalesced_tokens_saved_total",
+    "Tokens not spent thanks to coalesced requests",
+    ["kind"])
+IN_FLIGHT = Gauge(
+    "llm_in_flight_requests",
+    "LiteLLM HTTP requests currently in flight")
+
+
+def usage_tokens(usage):
+    """Token counts from a response's `usage`, prompt cache reads and writes included.
+
+    "cached" and "cache_write" are included in "prompt".  LiteLLM reports cache
+    reads as prompt_tokens_details.cached_tokens (OpenAI style) and, for
+    Anthropic and Bedrock models, also as cache_read_input_tokens.
+    """
+    details = usage.get('prompt_tokens_details') or {}
+    return {
+        "prompt": usage.get('prompt_tokens', 0),
+        "completion": usage.get('completion_tokens', 0),
+        "total": usage.get('total_tokens', 0),
+        "cached": details.get('cached_tokens') or usage.get('cache_read_input_tokens') or 0,
+        "cache_write": usage.get('cache_creation_input_tokens') or 0,
+    }
+
+
+def payload_key(payload):
+    """Stable digest of a request payload; equal only for identical prompts."""
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class LLMClient:
+    """Send chat completions to LiteLLM, coalescing identical requests."""
+
+    def __init__(self, base_url, api_key, timeout=30, coalesce=True, min_timeout=5,
+                 breaker_failures=5, breaker_cooldown=30, hedge=False, hedge_workers=32,
+                 name="litellm"):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.coalesce = coalesce
+        self.hedge = hedge
+        self._hedge_pool = hedge_pool(hedge_workers) if hedge else None
+        self.name = name
+        self.latency = LatencyTracker(name, min_timeout=min_timeout, max_timeout=timeout)
+        self.breaker = CircuitBreaker(name, failure_threshold=breaker_failures,
+                                      cooldown=breaker_cooldown)
+        self._flight = SingleFlight()
+
+    def complete(self, payload, timeout=None):
+        """Return {"content", "tokens", "error"} for a chat completion payload.
+
+        `timeout` (seconds) caps the adaptive timeout for this call.  Raises
+        requests exceptions (e.g. Timeout) like requests.post does, and
+        CircuitOpenError while the breaker is open; coalesced waiters receive
+        the same exception as the leader.
+        """
+        if not self.coalesce:
+            return self._call(payload, timeout=timeout)
+
+        result, shared = self._flight.do(payload_key(payload),
+                                         lambda: self._call(payload, timeout=timeout))
+        if not shared:
+            return result
+
+        COALESCED_CALLS.inc()
+        tokens = result["tokens"]
+        COALESCED_TOKENS.inc(tokens["prompt"], kind="prompt")
+        COALESCED_TOKENS.inc(tokens["completion"], kind="completion")
+        # The tokens were paid for by the leader's request, not this one.
+        return dict(result, tokens=dict(EMPTY_TOKENS), coalesced=True)
+
+    def stream(self, payload, on_delta, timeout=None):
+        """Like complete(), but stream the completion, calling on_delta(text)
+        for each chunk of content as it arrives."""
+        return self._call(payload, on_delta, timeout)
+
+    def _call(self, payload, on_delta=None, timeout=None):
+        """One logical upstream call, guarded by the breaker and hedging."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"LLM circuit breaker '{self.name}' is open")
+
+        adaptive = self.latency.timeout()
+        # A call cut short by the caller's cap says little about the model's
+        # latency, so only timeouts at the adaptive value are learnt from.
+        learn = timeout is None or timeout >= adaptive
+        timeout = adaptive if learn else timeout
+        if on_delta is not None:
+            send = lambda: self._post_stream(payload, timeout, on_delta, learn)
+        else:
+            hedge_after = self.latency.percentile(95) if self.hedge else None
+            send = lambda: hedged_call(self.name, lambda: self._post(payload, timeout, learn),
+                                       hedge_after, self._hedge_pool,
+                                       lost=lambda outcome: outcome[0]["error"] is not None)
+        try:
+            result, failed = send()
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # Not the service's fault (e.g. a malformed response body)
+            self.breaker.record_success()
+            raise
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    def _post(self, payload, timeout, learn=True):
+        """Send one HTTP request; return (result, counts_as_failure)."""
+        UPSTREAM_CALLS.inc()
+        IN_FLIGHT.inc()
+        start = time.monotonic()
+        try:
+            response = requests.post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=payload,
+                timeout=timeout
+            )
+        except requests.exceptions.Timeout:
+            if learn:
+                self.latency.record_timeout(timeout)
+            raise
+        finally:
+            IN_FLIGHT.dec()
+
+        if response.status_code == 200:
+            self.latency.record(time.monotonic() - start)
+            data = response.json()
+            usage = data.get('usage', {})
+            return {
+                "content": data['choices'][0]['message']['content'],
+                "tokens": usage_tokens(usage),
+                "error": None
+            }, False
+
+        return self._error_result(response)
+
+    def _post_stream(self, payload, timeout, on_delta, learn=True):
+        """Send one streaming HTTP request; return (result, counts_as_failure)."""
+        UPSTREAM_CALLS.inc()
+        IN_FLIGHT.inc()
+        start = time.monotonic()
+        try:
+            with requests.post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=dict(payload, stream=True, stream_options={"include_usage": True}),
+                timeout=timeout,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    return self._error_result(response)
+
+                parts = []
+                usage = {}
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage
+                    for choice in chunk.get("choices") or []:
+                        text = (choice.get("delta") or {}).get("content")
+                        if text:
+                            parts.append(text)
+                            on_delta(text)
+        except requests.exceptions.Timeout:
+            if learn:
+                self.latency.record_timeout(timeout)
+            raise
+        finally:
+            IN_FLIGHT.dec()
+
+        self.latency.record(time.monotonic() - start)
+        return {
+            "content": "".join(parts),
+            "tokens": usage_tokens(usage),
+            "error": None
+        }, False
+
+    def _error_result(self, response):
+        """Turn a non-200 response into (result, counts_as_failure)."""
+        error_msg = f"Status {response.status_code}"
+        try:
+            error_data = response.json()
+            error_msg = error_data.get('error', {}).get('message', error_msg)
+        except Exception:
+            error_msg = response.text[:200] if response.text else error_msg
+
+        print(f"LLM API Error: {response.status_code} - {error_msg}")
+        # Rate limiting and server errors mean the service is struggling;
+        # other 4xx are problems with this particular request.
+        failed = response.status_code == 429 or response.status_code >= 500
+        return {
+            "content": "Sorry, I'm having trouble connecting to the LLM service.",
+            "tokens": dict(EMPTY_TOKENS),
+            "error": error_msg
+        }, failed
@@ -0,0 +1,193 @@
+"""
+Resilience primitives for the LiteLLM client.
+
+- LatencyTracker keeps a window of recent call latencies and derives an
+  adaptive timeout from their percentiles, instead of always waiting the
+  full hard limit.
+- CircuitBreaker opens after repeated errors or timeouts so callers fail fast
+  (Hybrid mode answers from AIML) until a cool-down has passed and a trial
+  call succeeds.
+- hedged_call() optionally sends a second, identical request once the first
+  has taken longer than the observed p95, and returns whichever succeeds
+  first.  It runs on its own HedgePool, sized apart from the slow lane, so
+  hedges do not queue behind the first attempts they are meant to overtake.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import Counter, Gauge, Histogram
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+BREAKER_STATE = Gauge(
+    "llm_circuit_breaker_state",
+    "Circuit breaker state (0=closed, 1=open, 2=half-open)",
+    ["name"])
+BREAKER_TRANSITIONS = Counter(
+    "llm_circuit_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ["name", "state"])
+BREAKER_REJECTED = Counter(
+    "llm_circuit_breaker_rejected_total",
+    "Calls rejected without contacting LiteLLM because the breaker was open",
+    ["name"])
+HEDGES_SENT = Counter(
+    "llm_hedged_requests_total",
+    "Second requests sent because the first exceeded the hedge delay",
+    ["name"])
+HEDGES_WON = Counter(
+    "llm_hedged_requests_won_total",
+    "Hedged requests that finished before the original",
+    ["name"])
+CALL_LATENCY = Histogram(
+    "llm_call_latency_seconds",
+    "Latency of successful LiteLLM calls",
+    ["name"])
+ADAPTIVE_TIMEOUT = Gauge(
+    "llm_adaptive_timeout_seconds",
+    "Timeout currently applied to LiteLLM calls",
+    ["name"])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling LiteLLM while the circuit breaker is open."""
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with percentile lookups."""
+
+    def __init__(self, name, window=200, min_samples=20,
+                 min_timeout=5.0, max_timeout=30.0, multiplier=2.0):
+        self.name = name
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        ADAPTIVE_TIMEOUT.set(max_timeout, name=name)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+        CALL_LATENCY.observe(seconds, name=self.name)
+        ADAPTIVE_TIMEOUT.set(self.timeout(), name=self.name)
+
+    def record_timeout(self, timeout):
+        """Count a call that timed out as taking `timeout` seconds."""
+        with self._lock:
+            self._samples.append(timeout)
+        ADAPTIVE_TIMEOUT.set(self.timeout(), name=self.name)
+
+    def percentile(self, p):
+        """Return the p-th percentile (0-100), or None without enough samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout(self):
+        """Timeout for the next call: a multiple of p99, within [min, max]."""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, p99 * self.multiplier))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open trial call."""
+
+    def __init__(self, name, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        BREAKER_STATE.set(0, name=name)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _transition(self, state):
+        self._state = state
+        BREAKER_STATE.set(_STATE_VALUES[state], name=self.name)
+        BREAKER_TRANSITIONS.inc(name=self.name, state=state)
+        print(f"LLM circuit breaker '{self.name}' -> {state}")
+
+    def allow(self):
+        """Return True if a call may go out now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        BREAKER_REJECTED.inc(name=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or (
+                    self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+
+def hedge_pool(workers):
+    """Thread pool for hedged calls: each call can hold two of its workers."""
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+
+
+def hedged_call(name, fn, hedge_after, pool, lost=None):
+    """Run fn(); if it is still running after `hedge_after` seconds, run a
+    second fn() and return the first successful result.
+
+    An attempt that raises, or whose result `lost(result)` is true (an
+    error response), loses to the other attempt if that one is still
+    running.  If neither succeeds, the first attempt's outcome is returned
+    or raised.  With `hedge_after` None, fn() simply runs on the calling
+    thread.
+    """
+    if hedge_after is None:
+        return fn()
+
+    first = pool.submit(fn)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+
+    HEDGES_SENT.inc(name=name)
+    second = pool.submit(fn)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and not (lost and lost(future.result())):
+                if future is second:
+                    HEDGES_WON.inc(name=name)
+                return future.result()
+    return first.result()
@@ -0,0 +1,261 @@
+"""
+Latency- and cost-aware routing across several LiteLLM models.
+
+Models are configured with LITELLM_MODELS, a JSON list such as:
+
+    [
+      {"name": "lite", "model": "eu.amazon.nova-2-lite-v1:0",
+       "max_prompt_tokens": 600, "max_history": 2,
+       "cost_per_1k_prompt": 0.00006, "cost_per_1k_completion": 0.00024},
+      {"name": "sonnet", "model": "eu.anthropic.claude-sonnet-4-5-20250929-v1:0",
+       "cost_per_1k_prompt": 0.003, "cost_per_1k_completion": 0.015}
+    ]
+
+Optional per-model keys: "base_url" (defaults to LITELLM_BASE_URL, handy for
+pointing a model at a local mock), "max_prompt_tokens" and "max_history"
+(the largest prompt / number of history messages the model should take) and
+"cost_per_1k_cached_prompt" (the price of prompt tokens read from the
+provider's prompt cache; defaults to "cost_per_1k_prompt").
+
+For each request the router keeps the models whose limits fit the prompt
+size and session context length, drops those whose moving-average latency
+exceeds the request's latency budget (unless none would remain), and tries
+the cheapest expected cost first, inflated by each model's moving-average
+error rate.  Models whose circuit breaker is open are skipped, and a model
+that times out or fails hands the request to the next one.
+"""
+
+import json
+import threading
+import time
+
+import requests
+
+from llm_client import LLMClient
+from llm_resilience import CircuitOpenError
+from metrics import Counter, Gauge
+
+ROUTE_REQUESTS = Counter(
+    "llm_route_requests_total",
+    "Requests routed to each model",
+    ["model"])
+ROUTE_TOKENS = Counter(
+    "llm_route_tokens_total",
+    "Tokens used per model",
+    ["model", "kind"])
+ROUTE_COST = Counter(
+    "llm_route_cost_usd_total",
+    "Estimated spend per model in USD",
+    ["model"])
+ROUTE_LATENCY_EWMA = Gauge(
+    "llm_route_latency_ewma_seconds",
+    "Moving-average latency per model",
+    ["model"])
+ROUTE_ERROR_EWMA = Gauge(
+    "llm_route_error_rate_ewma",
+    "Moving-average error rate per model",
+    ["model"])
+
+
+class ModelRoute:
+    """One routable model with its own client and running statistics."""
+
+    def __init__(self, name, model, client, max_prompt_tokens=None, max_history=None,
+                 cost_per_1k_prompt=0.0, cost_per_1k_completion=0.0,
+                 cost_per_1k_cached_prompt=None, alpha=0.2):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_history = max_history
+        self.cost_per_1k_prompt = cost_per_1k_prompt
+        self.cost_per_1k_completion = cost_per_1k_completion
+        self.cost_per_1k_cached_prompt = cost_per_1k_prompt if cost_per_1k_cached_prompt is None \
+            else cost_per_1k_cached_prompt
+        self.alpha = alpha
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.cost = 0.0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def fits(self, prompt_tokens, history_length):
+        if self.max_prompt_tokens is not None and prompt_tokens > self.max_prompt_tokens:
+            return False
+        if self.max_history is not None and history_length > self.max_history:
+            return False
+        return True
+
+    def expected_cost(self, prompt_tokens, completion_tokens):
+        return (prompt_tokens * self.cost_per_1k_prompt +
+                completion_tokens * self.cost_per_1k_completion) / 1000.0
+
+    def spent(self, tokens):
+        """Cost of one call's `tokens`, cached prompt tokens at their own price."""
+        cached = tokens.get("cached", 0)
+        return ((tokens["prompt"] - cached) * self.cost_per_1k_prompt +
+                cached * self.cost_per_1k_cached_prompt +
+                tokens["completion"] * self.cost_per_1k_completion) / 1000.0
+
+    def observe(self, latency, ok, tokens=None):
+        """Fold one call's outcome into the moving averages."""
+        with self._lock:
+            self.requests += 1
+            self.error_ewma = (1 - self.alpha) * self.error_ewma + self.alpha * (0.0 if ok else 1.0)
+            if ok:
+                self.latency_ewma = latency if self.latency_ewma is None else \
+                    (1 - self.alpha) * self.latency_ewma + self.alpha * latency
+            if tokens:
+                cost = self.spent(tokens)
+                self.cost += cost
+                self.prompt_tokens += tokens["prompt"]
+                self.cached_tokens += tokens.get("cached", 0)
+                ROUTE_COST.inc(cost, model=self.name)
+                ROUTE_TOKENS.inc(tokens["prompt"], model=self.name, kind="prompt")
+                ROUTE_TOKENS.inc(tokens["completion"], model=self.name, kind="completion")
+                ROUTE_TOKENS.inc(tokens.get("cached", 0), model=self.name, kind="cached_prompt")
+                ROUTE_TOKENS.inc(tokens.get("cache_write", 0), model=self.name, kind="cache_write")
+        ROUTE_REQUESTS.inc(model=self.name)
+        ROUTE_ERROR_EWMA.set(round(self.error_ewma, 4), model=self.name)
+        if self.latency_ewma is not None:
+            ROUTE_LATENCY_EWMA.set(round(self.latency_ewma, 4), model=self.name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "model": self.model,
+                "base_url": self.client.base_url,
+                "requests": self.requests,
+                "latency_ewma_seconds": None if self.latency_ewma is None else round(self.latency_ewma, 4),
+                "error_rate_ewma": round(self.error_ewma, 4),
+                "cost_usd": round(self.cost, 6),
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_tokens,
+                "prompt_cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 4)
+                if self.prompt_tokens else None,
+                "breaker": self.client.breaker.state,
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "max_history": self.max_history,
+            }
+
+
+class LLMRouter:
+    """Pick a model per request and send the completion through its client."""
+
+    def __init__(self, routes, max_completion_tokens=150, latency_budget=None):
+        if not routes:
+            raise ValueError("LLMRouter needs at least one model")
+        self.routes = routes
+        self.max_completion_tokens = max_completion_tokens
+        self.latency_budget = latency_budget
+
+    def rank(self, prompt_tokens, history_length, latency_budget=None):
+        """Return the routes to try for a request, best first."""
+        budget = latency_budget if latency_budget is not None else self.latency_budget
+        candidates = [r for r in self.routes if r.fits(prompt_tokens, history_length)]
+        if not candidates:
+            # Nothing is configured for prompts this large; use the largest.
+            candidates = sorted(self.routes, key=lambda r: r.max_prompt_tokens or float("inf"))[-1:]
+        if budget:
+            within = [r for r in candidates if r.latency_ewma is None or r.latency_ewma <= budget]
+            if within:
+                candidates = within
+
+        def score(route):
+            cost = route.expected_cost(prompt_tokens, self.max_completion_tokens)
+            reliability = max(0.05, 1.0 - route.error_ewma)
+            return (cost / reliability, route.latency_ewma or 0.0)
+
+        return sorted(candidates, key=score)
+
+    def complete(self, payload, prompt_tokens, history_length, latency_budget=None,
+                 on_delta=None):
+        """Send `payload` to the best available model.
+
+        Returns the client result with "model" set to the route name.  With
+        `on_delta` the completion is streamed (see LLMClient.stream).  When a
+        model times out, fails to connect or returns an error, the request
+        falls over to the next candidate (a stream only until its first
+        chunk has been passed on).  With a latency budget each attempt gets
+        what is left of it as its timeout.  When every candidate fails, the
+        last error result is returned or the last exception raised
+        (CircuitOpenError when every breaker is open).
+        """
+        budget = latency_budget if latency_budget is not None else self.latency_budget
+        deadline = time.monotonic() + budget if budget else None
+        streamed = []
+
+        def forward(text):
+            streamed.append(text)
+            on_delta(text)
+
+        last_error = last_result = None
+        for route in self.rank(prompt_tokens, history_length, latency_budget):
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            routed = dict(payload, model=route.model)
+            start = time.monotonic()
+            try:
+                if on_delta is None:
+                    result = route.client.complete(routed, timeout)
+                else:
+                    result = route.client.stream(routed, forward, timeout)
+            except CircuitOpenError as e:
+                last_error, last_result = e, None
+                continue
+            except requests.exceptions.RequestException as e:
+                route.observe(time.monotonic() - start, ok=False)
+                if streamed:
+                    raise
+                print(f"LLM model '{route.name}' failed ({type(e).__name__}), trying the next one")
+                last_error, last_result = e, None
+                continue
+            except Exception:
+                route.observe(time.monotonic() - start, ok=False)
+                raise
+            ok = result.get("error") is None
+            route.observe(time.monotonic() - start, ok=ok,
+                          tokens=None if result.get("coalesced") else result["tokens"])
+            result = dict(result, model=route.name)
+            if ok or streamed:
+                return result
+            last_error, last_result = None, result
+        if last_result is not None:
+            return last_result
+        raise last_error or CircuitOpenError("no LLM model available")
+
+    def stats(self):
+        return [route.stats() for route in self.routes]
+
+
+def build_router(models_json, default_model, base_url, api_key, max_completion_tokens,
+                 latency_budget=None, **client_options):
+    """Build an LLMRouter from LITELLM_MODELS, or a single-model router."""
+    if models_json:
+        specs = json.loads(models_json)
+    else:
+        specs = [{"name": default_model or "default", "model": default_model}]
+
+    routes = []
+    for spec in specs:
+        name = spec.get("name") or spec["model"]
+        client = LLMClient(spec.get("base_url", base_url), api_key, name=name, **client_options)
+        routes.append(ModelRoute(
+            name,
+            spec["model"],
+            client,
+            max_prompt_tokens=spec.get("max_prompt_tokens"),
+            max_history=spec.get("max_history"),
+            cost_per_1k_prompt=float(spec.get("cost_per_1k_prompt", 0.0)),
+            cost_per_1k_completion=float(spec.get("cost_per_1k_completion", 0.0)),
+            cost_per_1k_cached_prompt=float(spec["cost_per_1k_cached_prompt"])
+            if "cost_per_1k_cached_prompt" in spec else None,
+        ))
+    return LLMRouter(routes, max_completion_tokens=max_completion_tokens,
+                     latency_budget=latency_budget)
@@ -0,0 +1,179 @@
+"""
+Step- and time-bounded AIML responses.
+
+A long or adversarial input can send python-aiml into deep <srai> chains and
+heavy wildcard backtracking, all while holding the kernel's respond lock that
+every other request waits on.  Inside BudgetedKernel.bounded() a MatchBudget
+is attached to the kernel and its brain: every trie node visited by
+CompactPatternMgr, every template element and every <srai> costs one step,
+and the work is aborted with BudgetExceeded once it runs out of steps or
+time.  The session's input stack is reset and its <input>/<that> history
+put back as it was before the block, so the next turn starts clean.
+The budget is attached while the respond lock is held, so no other thread
+can charge it.
+
+cap_input() trims inputs to a maximum length and sentence count before they
+reach the kernel.
+"""
+
+import re
+import time
+from contextlib import contextmanager
+
+import aiml
+
+from metrics import Counter, Histogram
+
+BUDGET_EXCEEDED = Counter(
+    "aiml_budget_exceeded_total",
+    "AIML responses aborted for exceeding the matching budget",
+    ["reason"])
+BUDGET_STEPS = Histogram(
+    "aiml_match_steps",
+    "Matching steps (trie nodes, template elements, srai calls) per AIML response",
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000))
+BUDGET_SECONDS = Histogram(
+    "aiml_match_seconds",
+    "Time spent in a budgeted AIML response, lock wait excluded",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+INPUT_CAPPED = Counter(
+    "aiml_input_capped_total",
+    "Inputs trimmed before matching",
+    ["reason"])
+
+# Check the clock every this many steps
+_TIME_CHECK_INTERVAL = 64
+
+_sentenceEndRE = re.compile(r"[.?!]")
+
+
+class BudgetExceeded(Exception):
+    """Raised inside respond() when the active MatchBudget runs out."""
+
+    def __init__(self, reason, steps, elapsed):
+        Exception.__init__(self, f"AIML matching budget exceeded ({reason}: "
+                                 f"{steps} steps in {elapsed * 1000:.1f}ms)")
+        self.reason = reason
+        self.steps = steps
+        self.elapsed = elapsed
+
+
+class MatchBudget:
+    """A step and wall-clock allowance for one response (0 = unlimited)."""
+
+    def __init__(self, max_steps=0, max_seconds=0):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.steps = 0
+        self.started = time.perf_counter()
+        self.deadline = self.started + max_seconds if max_seconds else None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def charge(self, steps=1):
+        self.steps += steps
+        if self.max_steps and self.steps > self.max_steps:
+            raise BudgetExceeded("steps", self.steps, self.elapsed())
+        if (self.deadline is not None and self.steps % _TIME_CHECK_INTERVAL == 0 and
+                time.perf_counter() > self.deadline):
+            raise BudgetExceeded("time", self.steps, self.elapsed())
+
+
+class BudgetedKernel(aiml.Kernel):
+    """aiml.Kernel whose responses can be bounded by a MatchBudget."""
+
+    _budget = None
+
+    @contextmanager
+    def bounded(self, sessionID, max_steps=0, max_seconds=0):
+        """Hold the respond lock with a budget of `max_steps` and `max_seconds`.
+
+        Matching and responding inside the block raise BudgetExceeded once
+        the budget runs out.  Nested blocks share the outermost budget.
+        """
+        with self._respondLock:
+            if self._budget is not None or (not max_steps and not max_seconds):
+                yield
+                return
+            budget = MatchBudget(max_steps, max_seconds)
+            inputs = list(self.getPredicate(self._inputHistory, sessionID))
+            outputs = list(self.getPredicate(self._outputHistory, sessionID))
+            brain = self._brain
+            self._budget = brain._budget = budget
+            try:
+                yield
+            except BudgetExceeded as e:
+                BUDGET_EXCEEDED.inc(reason=e.reason)
+                # respond() unwound mid-<srai>: drop the half-pushed inputs
+                # and the input it logged without a matching output
+                self.setPredicate(self._inputStack, [], sessionID)
+                self.setPredicate(self._inputHistory, inputs, sessionID)
+                self.setPredicate(self._outputHistory, outputs, sessionID)
+                raise
+            finally:
+                self._budget = brain._budget = None
+                BUDGET_STEPS.observe(budget.steps)
+                BUDGET_SECONDS.observe(budget.elapsed())
+
+    def respond_within(self, input_, sessionID, max_steps=0, max_seconds=0):
+        """respond() that raises BudgetExceeded past `max_steps` or `max_seconds`."""
+        with self.bounded(sessionID, max_steps, max_seconds):
+            return self.respond(input_, sessionID)
+
+    def respond_in_place(self, input_, sessionID, accept, max_steps=0, max_seconds=0):
+        """Answer `input_` in place of the session's last response.
+
+        The <input> history is left as it was and, when accept(response) is
+        true, the response replaces the last entry of the <that> history.
+        Returns the accepted response, or None (rejected or over budget).
+        """
+        with self._respondLock:
+            inputs = list(self.getPredicate(self._inputHistory, sessionID))
+            outputs = list(self.getPredicate(self._outputHistory, sessionID))
+            try:
+                response = self.respond_within(input_, sessionID, max_steps, max_seconds)
+            except BudgetExceeded:
+                response = None
+            if response is not None and not accept(response):
+                response = None
+            if response is not None and outputs:
+                outputs[-1] = response
+            self.setPredicate(self._inputHistory, inputs, sessionID)
+            self.setPredicate(self._outputHistory, outputs, sessionID)
+        return response
+
+    def _respond(self, input_, sessionID):
+        if self._budget is not None:
+            self._budget.charge()
+        return aiml.Kernel._respond(self, input_, sessionID)
+
+    def _processElement(self, elem, sessionID):
+        if self._budget is not None:
+            self._budget.charge()
+        return aiml.Kernel._processElement(self, elem, sessionID)
+
+
+def cap_input(text, max_chars=0, max_sentences=0):
+    """Trim `text` to `max_chars` and `max_sentences` (0 = no limit).
+
+    Sentences are counted the way the kernel splits them (on . ? !); text is
+    cut at a word boundary.  Returns (text, reason) with reason None, "chars"
+    or "sentences".
+    """
+    reason = None
+    if max_sentences:
+        for i, match in enumerate(_sentenceEndRE.finditer(text)):
+            if i + 1 == max_sentences:
+                if text[match.end():].strip():
+                    text = text[:match.end()]
+                    reason = "sentences"
+                break
+    if max_chars and len(text) > max_chars:
+        cut = text[:max_chars]
+        space = cut.rfind(" ")
+        text = cut[:space] if space > 0 else cut
+        reason = "chars"
+    if reason:
+        INPUT_CAPPED.inc(reason=reason)
+    return text, reason
@@ -0,0 +1,352 @@
+"""
+Approximate memory accounting for the backend's large structures.
+
+Sizes are sys.getsizeof() sums, so they leave out allocator overhead and
+fragmentation; the gap to the process RSS is reported as "unaccounted".
+Sampling is cheap enough to run in production:
+
+- the brain is walked once per brain swap, in a background thread, knowing
+  its layout (trie nodes, the shared template table, the word table) so no
+  set of visited objects is needed.  Its bytes are attributed to the AIML
+  files it was built from in proportion to their category counts;
+- sessions, the spelling and near-miss indexes and other large dicts are
+  estimated from a random sample of their entries (see sampled_size()).
+
+MemoryAccountant.start() refreshes the gauges every `interval` seconds.
+TracemallocDiff traces allocations on demand and diffs snapshots to find
+leaks; tracing slows every allocation, so it only runs between start and
+stop.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from aiml.PatternMgr import PatternMgr
+
+import compact_brain
+from brain_loader import aiml_files
+from metrics import Gauge
+
+SAMPLE = 200
+
+RSS_BYTES = Gauge(
+    "process_resident_memory_bytes",
+    "Resident set size of the backend process")
+STRUCTURE_BYTES = Gauge(
+    "memory_structure_bytes",
+    "Approximate bytes held by each major in-memory structure",
+    ["structure"])
+SESSIONS = Gauge(
+    "memory_sessions",
+    "Sessions by storage tier",
+    ["tier"])
+SESSION_BYTES = Gauge(
+    "memory_session_bytes",
+    "Approximate session bytes by tier (stored: size of the session database)",
+    ["tier"])
+BRAIN_FILE_CATEGORIES = Gauge(
+    "memory_brain_file_categories",
+    "Categories of each AIML file in the loaded brain",
+    ["file"])
+BRAIN_FILE_BYTES = Gauge(
+    "memory_brain_file_bytes",
+    "Approximate brain bytes attributed to each AIML file",
+    ["file"])
+
+_categoryRE = re.compile(rb"<category[\s>]", re.I)
+
+
+def process_memory():
+    """{"rss_bytes", "peak_rss_bytes"} of this process (Linux only; zeros elsewhere)."""
+    found = {"VmRSS:": 0, "VmHWM:": 0}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key = line.split(None, 1)[0]
+                if key in found:
+                    found[key] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return {"rss_bytes": found["VmRSS:"], "peak_rss_bytes": found["VmHWM:"]}
+
+
+def deep_size(obj, seen=None):
+    """Bytes of `obj` and the containers, strings and numbers it holds."""
+    if seen is None:
+        seen = set()
+    getsizeof = sys.getsizeof
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+    return size
+
+
+def sampled_size(container, sample=SAMPLE):
+    """Approximate deep_size() of a large dict or list from a random sample of its entries."""
+    size = sys.getsizeof(container)
+    entries = list(container)
+    if not entries:
+        return size
+    picked = entries if len(entries) <= sample else random.sample(entries, sample)
+    if isinstance(container, dict):
+        total = sum(deep_size(key) + deep_size(container.get(key)) for key in picked)
+    else:
+        total = sum(deep_size(entry) for entry in picked)
+    return size + total * len(entries) // len(picked)
+
+
+def brain_size(brain):
+    """Bytes of a brain's trie nodes and templates: {"nodes", "trie_bytes", "template_bytes"}."""
+    getsizeof = sys.getsizeof
+    templates = set()
+    template_bytes = 0
+    nodes = trie = 0
+    stack = [brain._root]
+    if isinstance(brain._root, compact_brain.CompactNode):
+        # Key IDs are small shared ints and the words live in the word table
+        empty = (compact_brain._NO_KEYS, compact_brain._NO_CHILDREN)
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            trie += getsizeof(node)
+            keys, children = node._keys, node._children
+            if keys.__class__ is int:
+                stack.append(children)
+            else:
+                if keys is not empty[0]:
+                    trie += getsizeof(keys)
+                if children is not empty[1]:
+                    trie += getsizeof(children)
+                stack.extend(children)
+        template_bytes = deep_size(brain._templates.templates, templates)
+    else:
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            trie += getsizeof(node)
+            for key, child in node.items():
+                if key == PatternMgr._TEMPLATE:
+                    template_bytes += deep_size(child, templates)
+                    continue
+                if key.__class__ is str:
+                    trie += getsizeof(key)
+                stack.append(child)
+    return {"nodes": nodes, "trie_bytes": trie, "template_bytes": template_bytes}
+
+
+def word_table_size():
+    """Bytes of compact_brain's process-wide word table."""
+    return (sampled_size(compact_brain._word_ids) + sys.getsizeof(compact_brain._words) +
+            sys.getsizeof(compact_brain._ids))
+
+
+def brain_files(loader):
+    """The AIML files `loader` builds its brain from (overlay files excluded)."""
+    if not os.path.exists(loader.data_dir):
+        return []
+    return [f for f in aiml_files(loader.data_dir) if not loader.is_excluded(f)]
+
+
+def file_categories(data_dir, filenames):
+    """{filename: number of <category> elements} for AIML files in `data_dir`."""
+    counts = {}
+    for filename in filenames:
+        try:
+            with open(os.path.join(data_dir, filename), "rb") as f:
+                counts[filename] = len(_categoryRE.findall(f.read()))
+        except OSError:
+            counts[filename] = 0
+    return counts
+
+
+class MemoryAccountant:
+    """Approximate sizes of the brain, sessions and caches, as a report and as gauges.
+
+    `caches` maps a name to a callable returning that cache's approximate
+    bytes; `in_flight` returns request counts that hold buffers right now.
+    """
+
+    def __init__(self, brain_loader, session_store, caches=None, in_flight=None,
+                 interval=60):
+        self.brain_loader = brain_loader
+        self.session_store = session_store
+        self.caches = caches or {}
+        self.in_flight = in_flight
+        self.interval = interval
+        self.brain = None
+        self.last = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def on_swap(self, brain, tier):
+        """BrainLoader listener: measure the new brain in the background."""
+        def run():
+            try:
+                self.measure_brain(brain, tier)
+            except Exception as e:
+                print(f"Measuring the {tier} brain failed: {e}")
+
+        threading.Thread(target=run, name="memory-brain", daemon=True).start()
+
+    def measure_brain(self, brain, tier):
+        start = time.time()
+        sizes = brain_size(brain)
+        loader = self.brain_loader
+        filenames = [f for f in brain_files(loader)
+                     if tier == "full" or loader.is_core_file(f)]
+        counts = file_categories(loader.data_dir, filenames)
+        total_categories = sum(counts.values()) or 1
+        brain_bytes = sizes["trie_bytes"] + sizes["template_bytes"]
+        files = sorted(({"file": f, "categories": n,
+                         "bytes": brain_bytes * n // total_categories}
+                        for f, n in counts.items()), key=lambda entry: -entry["bytes"])
+        measured = dict(sizes, tier=tier, categories=brain._templateCount,
+                        word_table_bytes=word_table_size(), files=files,
+                        measure_seconds=round(time.time() - start, 3))
+        with self._lock:
+            self.brain = measured
+        for entry in files:
+            BRAIN_FILE_CATEGORIES.set(entry["categories"], file=entry["file"])
+            BRAIN_FILE_BYTES.set(entry["bytes"], file=entry["file"])
+        print(f"Measured the {tier} brain: {brain_bytes / 1e6:.1f} MB in "
+              f"{sizes['nodes']} nodes ({measured['measure_seconds']}s)")
+
+    def sample(self):
+        """Take a fresh sample, update the gauges and return the report."""
+        start = time.time()
+        process = process_memory()
+        sessions = self.session_store.memory_stats()
+        caches = {}
+        for name, size in self.caches.items():
+            try:
+                caches[name] = size()
+            except Exception as e:
+                print(f"Memory accounting for {name} failed: {e}")
+                caches[name] = None
+        with self._lock:
+            brain = self.brain
+        structures = dict(caches)
+        if brain is not None:
+            structures["brain_trie"] = brain["trie_bytes"]
+            structures["brain_templates"] = brain["template_bytes"]
+            structures["brain_words"] = brain["word_table_bytes"]
+        structures["session_predicates"] = sessions["hot"]["predicate_bytes"]
+        structures["session_history"] = sessions["hot"]["history_bytes"]
+        accounted = sum(v for v in structures.values() if v)
+
+        RSS_BYTES.set(process["rss_bytes"])
+        for name, value in structures.items():
+            if value is not None:
+                STRUCTURE_BYTES.set(value, structure=name)
+        for tier in ("hot", "stored"):
+            SESSIONS.set(sessions[tier]["count"], tier=tier)
+            SESSION_BYTES.set(sessions[tier]["bytes"], tier=tier)
+        SESSIONS.set(sessions["pinned"], tier="pinned")
+
+        report = {
+            "process": process,
+            "brain": brain,
+            "sessions": sessions,
+            "caches": caches,
+            "in_flight": self.in_flight() if self.in_flight else None,
+            "accounted_bytes": accounted,
+            "unaccounted_bytes": process["rss_bytes"] - accounted if process["rss_bytes"] else None,
+            "sampled_at": round(start, 3),
+            "sample_seconds": round(time.time() - start, 4),
+        }
+        with self._lock:
+            self.last = report
+        return report
+
+    def start(self):
+        """Refresh the gauges every `interval` seconds in a daemon thread."""
+        if not self.interval or self._thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"Memory sampling failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="memory-sampler", daemon=True)
+        self._thread.start()
+
+
+class TracemallocDiff:
+    """Diff tracemalloc snapshots against a baseline to find what keeps growing."""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.baseline = None
+        self.baseline_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start tracing (if needed) and take the baseline snapshot."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self.baseline = self._snapshot()
+            self.baseline_at = time.time()
+            return self.status()
+
+    def stop(self):
+        with self._lock:
+            self.baseline = None
+            self.baseline_at = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            return self.status()
+
+    def diff(self, limit=20, group_by="lineno"):
+        """Top `limit` allocation sites by growth since the baseline."""
+        with self._lock:
+            if self.baseline is None:
+                return None
+            current = self._snapshot()
+            stats = current.compare_to(self.baseline, group_by)
+            return dict(self.status(), group_by=group_by, top=[{
+                "where": [str(frame) for frame in stat.traceback],
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            } for stat in stats[:limit]])
+
+    def status(self):
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": self.frames,
+            "baseline_age_seconds": round(time.time() - self.baseline_at, 1)
+            if self.baseline_at else None,
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        }
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
@@ -0,0 +1,209 @@
+"""
+Near-miss retrieval over literal AIML patterns.
+
+An input that misses every category by an extra filler word or a different
+word order ("HOW OLD ARE YOU PLEASE") falls through to the catch-all
+Fallback category and costs an LLM call.  NearMissIndex holds a TF-IDF index
+of character 3-grams (taken within word boundaries) over every literal
+pattern, i.e. one without wildcards, <that> or <topic>.  The closest pattern
+by cosine similarity is returned when it scores at or above the threshold,
+and the kernel is asked that pattern instead.
+
+The index is a term-major sparse matrix kept in three NumPy arrays, so no
+SciPy is needed; it is rebuilt whenever the brain is swapped.
+"""
+
+import re
+import threading
+import time
+
+import numpy as np
+
+from compact_brain import iter_categories
+from memory_stats import sampled_size
+from metrics import Counter, Gauge, Histogram
+
+NGRAM = 3
+
+NEAR_MISS_LOOKUPS = Counter(
+    "near_miss_lookups_total",
+    "Near-miss retrievals for inputs with no AIML match",
+    ["result"])
+NEAR_MISS_LATENCY = Histogram(
+    "near_miss_latency_seconds",
+    "Time spent on near-miss retrieval",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+NEAR_MISS_PATTERNS = Gauge(
+    "near_miss_index_patterns",
+    "Literal patterns in the near-miss index")
+
+_puncStripRE = re.compile(r"[^A-Z0-9 ]")
+
+# PatternMgr's reserved node keys (see compact_brain.py)
+_STAR = 1
+_THAT = 3
+_TOPIC = 4
+_CONTEXT_FREE = (_THAT, _STAR, _TOPIC, _STAR)
+
+
+def normalize(text):
+    """Upper-case, strip punctuation and collapse whitespace."""
+    return " ".join(_puncStripRE.sub(" ", text.upper()).split())
+
+
+def ngrams(text):
+    """Character n-grams of each word, padded with a space on both sides."""
+    grams = []
+    for word in text.split():
+        word = " " + word + " "
+        grams.extend(word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1))
+    return grams
+
+
+def literal_patterns(root):
+    """Yield the pattern text of every context-free category without wildcards."""
+    for keys, _ in iter_categories(root):
+        words = keys[:-len(_CONTEXT_FREE)]
+        if keys[-len(_CONTEXT_FREE):] != _CONTEXT_FREE or not words:
+            continue
+        if all(word.__class__ is str for word in words):
+            yield " ".join(words)
+
+
+class NearMissIndex:
+    """TF-IDF index over literal patterns with cosine-similarity lookup."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        vocab = {}
+        terms = []
+        counts = []
+        lengths = []
+        for pattern in self.patterns:
+            tf = {}
+            for gram in ngrams(pattern):
+                term = vocab.get(gram)
+                if term is None:
+                    term = vocab[gram] = len(vocab)
+                tf[term] = tf.get(term, 0) + 1
+            terms.extend(tf.keys())
+            counts.extend(tf.values())
+            lengths.append(len(tf))
+        self.vocab = vocab
+
+        n = len(self.patterns)
+        terms = np.array(terms, dtype=np.int32)
+        docs = np.repeat(np.arange(n, dtype=np.int32), lengths)
+        df = np.bincount(terms, minlength=len(vocab))
+        self.idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+        # Weights unknown n-grams get in the query norm: as rare as possible
+        self.unknown_idf = float(np.log(1.0 + n) + 1.0)
+
+        weights = (1.0 + np.log(np.array(counts, dtype=np.float32))) * self.idf[terms]
+        norms = np.sqrt(np.bincount(docs, weights=weights * weights, minlength=n))
+        weights /= norms[docs].astype(np.float32)
+
+        order = np.argsort(terms, kind="stable")
+        self.term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.term_ptr[1:])
+        self.term_docs = docs[order]
+        self.term_weights = weights[order].astype(np.float32)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    @classmethod
+    def from_brain(cls, brain):
+        """Build the index from a PatternMgr (dict or compact)."""
+        return cls(literal_patterns(brain._root))
+
+    def search(self, text):
+        """Return (pattern, similarity) of the closest pattern, or None."""
+        tf = {}
+        unknown = set()
+        for gram in ngrams(normalize(text)):
+            term = self.vocab.get(gram)
+            if term is None:
+                unknown.add(gram)
+            else:
+                tf[term] = tf.get(term, 0) + 1
+        if not tf or not self.patterns:
+            return None
+
+        terms = np.fromiter(tf.keys(), dtype=np.int64, count=len(tf))
+        query = (1.0 + np.log(np.fromiter(tf.values(), dtype=np.float32, count=len(tf)))) * self.idf[terms]
+        query /= np.sqrt(float(query @ query) + len(unknown) * self.unknown_idf ** 2)
+
+        starts = self.term_ptr[terms]
+        ends = self.term_ptr[terms + 1]
+        docs = np.concatenate([self.term_docs[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([self.term_weights[s:e] for s, e in zip(starts, ends)])
+        weights *= np.repeat(query, ends - starts)
+        scores = np.bincount(docs, weights=weights, minlength=len(self.patterns))
+        best = int(scores.argmax())
+        return self.patterns[best], float(scores[best])
+
+
+class NearMissRetriever:
+    """Holds the current index and answers lookups against it."""
+
+    def __init__(self, threshold=0.75, enabled=True):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.index = None
+        self._lock = threading.Lock()
+        self._building = None
+
+    def rebuild(self, brain):
+        """Build an index for `brain` in the background; the old one serves meanwhile."""
+        if not self.enabled:
+            return
+
+        def build():
+            start = time.time()
+            try:
+                index = NearMissIndex.from_brain(brain)
+            except Exception as e:
+                print(f"Near-miss index build failed: {e}")
+                return
+            with self._lock:
+                if self._building is not thread:
+                    return  # superseded by a newer brain
+                self.index = index
+            NEAR_MISS_PATTERNS.set(len(index))
+            print(f"Near-miss index ready ({len(index)} patterns in {time.time() - start:.2f}s)")
+
+        thread = threading.Thread(target=build, name="near-miss-index", daemon=True)
+        with self._lock:
+            self._building = thread
+        thread.start()
+
+    def wait(self, timeout=None):
+        """Block until the index build in progress (if any) has finished."""
+        with self._lock:
+            thread = self._building
+        if thread is not None:
+            thread.join(timeout)
+
+    def approx_bytes(self):
+        """Approximate size of the current index (see memory_stats.py)."""
+        index = self.index
+        if index is None:
+            return 0
+        arrays = (index.idf, index.term_ptr, index.term_docs, index.term_weights)
+        return (sum(a.nbytes for a in arrays) + sampled_size(index.patterns) +
+                sampled_size(index.vocab))
+
+    def lookup(self, text):
+        """Return (pattern, similarity) when a pattern is close enough, else None."""
+        index = self.index
+        if not self.enabled or index is None:
+            return None
+        start = time.perf_counter()
+        found = index.search(text)
+        NEAR_MISS_LATENCY.observe(time.perf_counter() - start)
+        if found is None or found[1] < self.threshold:
+            NEAR_MISS_LOOKUPS.inc(result="miss")
+            return None
+        NEAR_MISS_LOOKUPS.inc(result="hit")
+        return found
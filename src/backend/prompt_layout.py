@@ -0,0 +1,99 @@
+"""
+Stable-prefix prompt assembly, so provider-side prompt caching can hit.
+
+The legacy layout sends the system prompt with the first turn only and
+slides a five-message window over the history, so the start of the request
+changes on every turn and no provider cache ever matches it.  The stable
+layout keeps the request byte-identical from one turn to the next except
+for what is appended at the end:
+
+- the prefix (system prompt plus the optional pinned context) is sent on
+  every turn, either as a system message or in front of the first user
+  message (the Bedrock-safe form the legacy layout also uses);
+- the history window starts at a fixed message and only grows at the tail.
+  When it gets longer than `window` messages (or over the token budget) its
+  start jumps ahead by half a window at once, so the prefix changes once
+  every few turns instead of every turn.  The start is a pure function of
+  the history, so it survives session spill and handoff;
+- the window always starts with a user message (Bedrock requirement).
+
+With cache_control, the prefix and the last history message are marked
+{"cache_control": {"type": "ephemeral"}}; LiteLLM passes these breakpoints
+on to Anthropic and Bedrock models, while OpenAI-style providers cache
+matching prefixes on their own.  Providers only cache prefixes above a
+minimum size (1024 tokens for most Anthropic models).
+"""
+
+LEGACY = "legacy"
+STABLE = "stable"
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def content_text(content):
+    """The text of a message content, plain or a list of content blocks."""
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content)
+    return content
+
+
+def estimate_tokens(text):
+    # Rough estimate: 1 token ≈ 0.75 words ≈ 4 characters
+    return len(text) // 4
+
+
+def window_start(history, window, max_tokens=None, reserved_tokens=0):
+    """Index of the first history message to send in the stable layout."""
+    step = max(1, window // 2)
+    start = 0
+    if len(history) > window:
+        start = -(-(len(history) - window) // step) * step
+    if max_tokens is not None:
+        used = reserved_tokens + sum(estimate_tokens(m['text']) for m in history[start:])
+        while start < len(history) and used > max_tokens:
+            used -= sum(estimate_tokens(m['text']) for m in history[start:start + step])
+            start += step
+    while start < len(history) and history[start]['role'] != 'user':
+        start += 1
+    return start
+
+
+def _block(text, cache):
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = EPHEMERAL
+    return block
+
+
+def stable_messages(prefix, history, message, window=10, max_tokens=None,
+                    system_role=False, cache_control=False):
+    """Chat messages for `message` with a stable prefix and tail-only growth.
+
+    `history` is the session's {"role", "text"} list without the current
+    turn.  `max_tokens` bounds the prefix plus the history sent.
+    """
+    recent = history[window_start(history, window, max_tokens, estimate_tokens(prefix)):]
+    turns = [{"role": "user" if m['role'] == 'user' else "assistant", "text": m['text']}
+             for m in recent]
+    turns.append({"role": "user", "text": message})
+
+    messages = []
+    if system_role:
+        messages.append({"role": "system",
+                         "content": [_block(prefix, True)] if cache_control else prefix})
+    for i, turn in enumerate(turns):
+        text = turn["text"]
+        if i == 0 and not system_role:
+            if cache_control:
+                # The prefix gets its own block so its cache entry is shared
+                # by every session, whatever their first message
+                content = [_block(prefix, True), _block(text, len(turns) == 2)]
+                messages.append({"role": turn["role"], "content": content})
+                continue
+            text = f"{prefix}\n\n{text}"
+        if cache_control and i == len(turns) - 2:
+            # The conversation so far: cached now, read back on the next turn
+            messages.append({"role": turn["role"], "content": [_block(text, True)]})
+        else:
+            messages.append({"role": turn["role"], "content": text})
+    return messages
@@ -0,0 +1,308 @@
+"""
+Tiered storage for per-session conversation state.
+
+python-aiml keeps a predicate dict (with input/output history) in
+Kernel._sessions for every session ID it has seen, and app.py keeps a
+message list per session in session_history; neither is ever freed.
+SessionStore keeps recently active sessions in memory and spills idle ones
+(or the least recently used, once more than `max_hot` are in memory) to a
+SQLite database.  A spilled session is paged back in on its next turn.
+
+The database itself is capped at `max_stored` sessions; the least recently
+seen ones are dropped beyond that.  Sessions with a turn in progress, or
+an open WebSocket, are pinned in memory and never spilled.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from memory_stats import sampled_size
+from metrics import Counter, Gauge
+
+SESSIONS_HOT = Gauge(
+    "aiml_sessions_hot",
+    "Sessions currently held in memory")
+SESSIONS_STORED = Gauge(
+    "aiml_sessions_stored",
+    "Idle sessions spilled to the session database")
+SESSIONS_SPILLED = Counter(
+    "aiml_sessions_spilled_total",
+    "Sessions moved from memory to the session database",
+    ["reason"])
+SESSIONS_RESTORED = Counter(
+    "aiml_sessions_restored_total",
+    "Sessions paged back into memory from the session database")
+SESSIONS_DROPPED = Counter(
+    "aiml_sessions_dropped_total",
+    "Stored sessions deleted because the database was full")
+
+MEMORY = "memory"
+DISK = "disk"
+
+
+class SessionStore:
+    """Keep hot sessions in the kernel and spill idle ones to SQLite.
+
+    `history` is app.py's session_history dict; its entries travel with the
+    kernel predicates.  With an empty `db_path` sessions are only tracked,
+    never spilled.
+    """
+
+    def __init__(self, kernel, history, db_path, max_hot=1000, idle_seconds=600,
+                 max_stored=100000):
+        self.kernel = kernel
+        self.history = history
+        self.db_path = db_path
+        self.max_hot = max_hot
+        self.idle_seconds = idle_seconds
+        self.max_stored = max_stored
+
+        self._lock = threading.RLock()
+        self._last_seen = OrderedDict()
+        self._pinned = {}
+        self._thread = None
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " last_seen REAL NOT NULL,"
+                " data TEXT NOT NULL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+            self._db.commit()
+            SESSIONS_STORED.set(self._count_stored())
+
+    def touch(self, session_id):
+        """Mark a session active, paging it back in if it was spilled.
+
+        Call before handling a turn for `session_id`.
+        """
+        with self._lock:
+            if session_id not in self._last_seen:
+                self._restore(session_id)
+            self._last_seen[session_id] = time.time()
+            self._last_seen.move_to_end(session_id)
+            over_cap = len(self._last_seen) > self.max_hot
+            SESSIONS_HOT.set(len(self._last_seen))
+        if over_cap:
+            self.evict()
+
+    def pin(self, session_id):
+        """Keep a session in memory until unpin(); pins are counted."""
+        with self._lock:
+            self._pinned[session_id] = self._pinned.get(session_id, 0) + 1
+        self.touch(session_id)
+
+    def unpin(self, session_id):
+        with self._lock:
+            count = self._pinned.pop(session_id, 0) - 1
+            if count > 0:
+                self._pinned[session_id] = count
+            if session_id in self._last_seen:
+                self._last_seen[session_id] = time.time()
+                self._last_seen.move_to_end(session_id)
+
+    @contextmanager
+    def active(self, session_id):
+        """Touch `session_id` and keep it in memory while a turn uses it."""
+        self.pin(session_id)
+        try:
+            yield
+        finally:
+            self.unpin(session_id)
+
+    def known(self, session_id):
+        """True if `session_id` is in memory or stored in the session database."""
+        with self._lock:
+            if session_id in self._last_seen or session_id in self.kernel._sessions:
+                return True
+            return self._db is not None and self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def get(self, session_id):
+        """Return (tier, predicates, messages) for a session, or None."""
+        with self._lock:
+            if session_id in self._last_seen or session_id in self.kernel._sessions:
+                with self.kernel._respondLock:
+                    predicates = self.kernel.getSessionData(session_id)
+                return MEMORY, predicates, list(self.history.get(session_id, {}).get('messages', []))
+            record = self._load(session_id)
+        if record is None:
+            return None
+        return DISK, record["predicates"], record["messages"]
+
+    def evict(self):
+        """Spill idle sessions, then the least recently used above `max_hot`."""
+        if self._db is None:
+            return 0
+        now = time.time()
+        spilled = 0
+        with self._lock:
+            for session_id, seen in list(self._last_seen.items()):
+                if session_id in self._pinned:
+                    continue
+                if now - seen >= self.idle_seconds:
+                    reason = "idle"
+                elif len(self._last_seen) > self.max_hot:
+                    reason = "capacity"
+                else:
+                    break
+                self._spill(session_id, seen)
+                SESSIONS_SPILLED.inc(reason=reason)
+                spilled += 1
+            if spilled:
+                self._db.commit()
+                self._trim()
+                SESSIONS_HOT.set(len(self._last_seen))
+                SESSIONS_STORED.set(self._count_stored())
+        return spilled
+
+    def export_records(self):
+        """Return every session, in memory or stored, as [id, last_seen, predicates, messages]."""
+        now = time.time()
+        with self._lock:
+            with self.kernel._respondLock:
+                ids = (set(self.kernel._sessions) | set(self.history)) - {self.kernel._globalSessionID}
+                records = [[session_id, self._last_seen.get(session_id, now),
+                            self.kernel._sessions.get(session_id, {}),
+                            self.history.get(session_id, {}).get('messages', [])]
+                           for session_id in ids]
+            if self._db is not None:
+                for session_id, seen, data in self._db.execute(
+                        "SELECT session_id, last_seen, data FROM sessions"):
+                    if session_id not in ids:
+                        record = json.loads(data)
+                        records.append([session_id, seen, record["predicates"], record["messages"]])
+        return records
+
+    def import_records(self, records):
+        """Add sessions exported by another backend; return how many were taken.
+
+        Sessions this backend has seen more recently are kept.  With a
+        session database the imported ones are stored there and paged in on
+        their next turn; otherwise they go straight into memory.
+        """
+        imported = 0
+        with self._lock:
+            for session_id, seen, predicates, messages in records:
+                if self._last_seen.get(session_id, 0) >= seen:
+                    continue
+                if self._db is not None and session_id not in self._last_seen:
+                    cursor = self._db.execute(
+                        "INSERT INTO sessions (session_id, last_seen, data) VALUES (?, ?, ?)"
+                        " ON CONFLICT (session_id) DO UPDATE SET"
+                        " last_seen = excluded.last_seen, data = excluded.data"
+                        " WHERE excluded.last_seen > sessions.last_seen",
+                        (session_id, seen, json.dumps({"predicates": predicates, "messages": messages})))
+                    imported += cursor.rowcount
+                    continue
+                with self.kernel._respondLock:
+                    self.kernel._sessions[session_id] = predicates
+                    if messages:
+                        self.history[session_id] = {'messages': messages}
+                self._last_seen[session_id] = seen
+                imported += 1
+            if self._db is not None:
+                self._db.commit()
+                self._trim()
+                SESSIONS_STORED.set(self._count_stored())
+            SESSIONS_HOT.set(len(self._last_seen))
+        return imported
+
+    def start(self, interval=60):
+        """Run evict() every `interval` seconds in a daemon thread."""
+        if self._db is None or self._thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict()
+                except Exception as e:
+                    print(f"Session eviction failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="session-evictor", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hot": len(self._last_seen),
+                "pinned": len(self._pinned),
+                "stored": self._count_stored() if self._db is not None else 0,
+                "max_hot": self.max_hot,
+                "idle_seconds": self.idle_seconds,
+                "max_stored": self.max_stored,
+            }
+
+    def memory_stats(self):
+        """Session counts by tier with approximate bytes; stored bytes are the database size."""
+        with self._lock:
+            hot = len(self._last_seen)
+            pinned = len(self._pinned)
+            stored = stored_bytes = 0
+            if self._db is not None:
+                stored = self._count_stored()
+                stored_bytes = (self._db.execute("PRAGMA page_count").fetchone()[0] *
+                                self._db.execute("PRAGMA page_size").fetchone()[0])
+        predicate_bytes = sampled_size(self.kernel._sessions)
+        history_bytes = sampled_size(self.history)
+        return {
+            "hot": {"count": hot, "bytes": predicate_bytes + history_bytes,
+                    "predicate_bytes": predicate_bytes, "history_bytes": history_bytes},
+            "pinned": pinned,
+            "stored": {"count": stored, "bytes": stored_bytes},
+        }
+
+    def _spill(self, session_id, seen):
+        with self.kernel._respondLock:
+            predicates = self.kernel._sessions.pop(session_id, None)
+            messages = self.history.pop(session_id, {}).get('messages', [])
+        del self._last_seen[session_id]
+        if predicates is None and not messages:
+            return
+        data = json.dumps({"predicates": predicates or {}, "messages": messages})
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, last_seen, data) VALUES (?, ?, ?)",
+            (session_id, seen, data))
+
+    def _restore(self, session_id):
+        record = self._load(session_id)
+        if record is None:
+            return
+        with self.kernel._respondLock:
+            # State already in memory is newer than the stored record
+            if session_id not in self.kernel._sessions and session_id not in self.history:
+                self.kernel._sessions[session_id] = record["predicates"]
+                if record["messages"]:
+                    self.history[session_id] = {'messages': record["messages"]}
+        self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._db.commit()
+        SESSIONS_RESTORED.inc()
+        SESSIONS_STORED.dec()
+
+    def _load(self, session_id):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _trim(self):
+        excess = self._count_stored() - self.max_stored
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                " SELECT session_id FROM sessions ORDER BY last_seen LIMIT ?)", (excess,))
+            self._db.commit()
+            SESSIONS_DROPPED.inc(excess)
+
+    def _count_stored(self):
+        return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
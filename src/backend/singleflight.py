@@ -0,0 +1,64 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When several threads ask for the same key at the same time, only the first
+(the leader) runs the call; the others wait for it and receive the same
+result, or the same exception.  Nothing is cached: once the leader finishes,
+the next request for that key starts a new call.
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self):
+        """Number of distinct keys currently being fetched."""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, fn):
+        """Return (result, shared) for `fn()`, coalescing concurrent callers.
+
+        `shared` is False for the leader that actually ran `fn` and True for
+        callers that received the leader's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
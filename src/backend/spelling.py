@@ -0,0 +1,281 @@
+"""
+Spelling correction against the AIML pattern vocabulary.
+
+SpellIndex is a symmetric-delete (SymSpell-style) index over every word that
+appears in a loaded pattern: each word is stored under all the strings
+obtained by deleting up to `max_edit` characters from its prefix, so looking
+up an unknown word only needs the deletes of that word and a few dict hits,
+not a scan of the vocabulary.  Candidates are verified with the optimal
+string alignment distance (adjacent transpositions count as one edit) and
+the most frequent word at the smallest distance wins.
+
+SpellCorrector only rewrites an input when the uncorrected input would land
+in the catch-all category and the corrected one would not.  Inputs that
+already match keep the user's own words, so names and other wildcard
+captures are never "corrected".
+"""
+
+import re
+import threading
+import time
+
+from aiml import Utils
+
+from compact_brain import iter_categories
+from memory_stats import sampled_size
+from metrics import Counter, Gauge, Histogram
+
+MIN_WORD_LENGTH = 3
+PREFIX_LENGTH = 7
+
+SPELL_CORRECTIONS = Counter(
+    "spell_corrections_total",
+    "Words rewritten by spelling correction in inputs sent to the kernel")
+SPELL_FALLBACKS_AVOIDED = Counter(
+    "spell_fallbacks_avoided_total",
+    "Inputs that matched a category only after spelling correction")
+SPELL_LATENCY = Histogram(
+    "spell_correction_seconds",
+    "Time spent correcting an input, including the match checks",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+SPELL_VOCABULARY = Gauge(
+    "spell_vocabulary_words",
+    "Words in the spelling correction index")
+
+_wordRE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+
+# PatternMgr's reserved node keys (see compact_brain.py)
+_STAR = 1
+_TEMPLATE = 2
+_THAT = 3
+_TOPIC = 4
+
+
+def _deletes(word, max_edit):
+    """All strings reachable from word's prefix by deleting up to max_edit chars."""
+    word = word[:PREFIX_LENGTH]
+    found = {word}
+    frontier = [word]
+    for _ in range(max_edit):
+        next_frontier = []
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                shorter = item[:i] + item[i + 1:]
+                if shorter not in found:
+                    found.add(shorter)
+                    next_frontier.append(shorter)
+        frontier = next_frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1 and
+                    a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _within_one_edit(a, b):
+    """Fast edit_distance(a, b, 1) <= 1 for the default max_edit of 1."""
+    la, lb = len(a), len(b)
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) <= 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1 and
+                a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if la < lb:
+        a, b, la, lb = b, a, lb, la
+    if la - lb != 1:
+        return False
+    i = 0
+    while i < lb and a[i] == b[i]:
+        i += 1
+    return a[i + 1:] == b[i:]
+
+
+def pattern_vocabulary(root):
+    """Count, for every word in a pattern, the categories it appears in."""
+    counts = {}
+    for keys, _ in iter_categories(root):
+        for key in keys:
+            if key == _THAT:
+                break
+            if key.__class__ is str:
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class SpellIndex:
+    """Symmetric-delete index over a word -> frequency vocabulary."""
+
+    def __init__(self, counts, max_edit=1):
+        self.max_edit = max_edit
+        self.counts = {w: n for w, n in counts.items() if w.isalpha()}
+        # delete -> word, or a list of words when several share the delete
+        self._deletes = {}
+        for word in self.counts:
+            for delete in _deletes(word, max_edit):
+                entry = self._deletes.get(delete)
+                if entry is None:
+                    self._deletes[delete] = word
+                elif entry.__class__ is list:
+                    entry.append(word)
+                else:
+                    self._deletes[delete] = [entry, word]
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_brain(cls, brain, max_edit=1):
+        return cls(pattern_vocabulary(brain._root), max_edit)
+
+    def correct_word(self, word):
+        """Return the best in-vocabulary replacement for `word` (upper case), or None."""
+        if word in self.counts or len(word) < MIN_WORD_LENGTH:
+            return None
+        best = None
+        best_key = None
+        seen = set()
+        for delete in _deletes(word, self.max_edit):
+            entry = self._deletes.get(delete)
+            if entry is None:
+                continue
+            for candidate in (entry if entry.__class__ is list else (entry,)):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if self.max_edit == 1:
+                    if not _within_one_edit(word, candidate):
+                        continue
+                    distance = 1
+                else:
+                    distance = edit_distance(word, candidate, self.max_edit)
+                    if distance > self.max_edit:
+                        continue
+                key = (distance, -self.counts[candidate], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    def correct(self, text):
+        """Rewrite out-of-vocabulary words; return (text, [(old, new), ...])."""
+        corrections = []
+
+        def replace(match):
+            token = match.group(0)
+            if "'" in token:
+                return token  # left to the kernel's contraction substitutions
+            fixed = self.correct_word(token.upper())
+            if fixed is None:
+                return token
+            if token.islower():
+                fixed = fixed.lower()
+            elif not token.isupper():
+                fixed = fixed.capitalize()
+            corrections.append((token, fixed))
+            return fixed
+
+        return _wordRE.sub(replace, text), corrections
+
+
+def falls_back(kernel, text, session_id):
+    """True if any sentence of `text` would match only the catch-all category."""
+    brain = kernel._brain
+    try:
+        catch_all = brain._root[_STAR][_THAT][_STAR][_TOPIC][_STAR][_TEMPLATE]
+    except KeyError:
+        catch_all = None
+    normal = kernel._subbers['normal']
+    with kernel._respondLock:
+        history = kernel.getPredicate(kernel._outputHistory, session_id)
+        that = normal.sub(history[-1]) if history else ""
+        topic = normal.sub(kernel.getPredicate("topic", session_id))
+        for sentence in Utils.sentences(text):
+            template = brain.match(normal.sub(sentence), that, topic)
+            if template is None or template is catch_all:
+                return True
+    return False
+
+
+class SpellCorrector:
+    """Holds the current SpellIndex and corrects inputs before matching."""
+
+    def __init__(self, max_edit=1, enabled=True):
+        self.max_edit = max_edit
+        self.enabled = enabled
+        self.index = None
+        self._lock = threading.Lock()
+        self._building = None
+
+    def rebuild(self, brain):
+        """Build an index for `brain` in the background; the old one serves meanwhile."""
+        if not self.enabled:
+            return
+
+        def build():
+            start = time.time()
+            try:
+                index = SpellIndex.from_brain(brain, self.max_edit)
+            except Exception as e:
+                print(f"Spelling index build failed: {e}")
+                return
+            with self._lock:
+                if self._building is not thread:
+                    return  # superseded by a newer brain
+                self.index = index
+            SPELL_VOCABULARY.set(len(index))
+            print(f"Spelling index ready ({len(index)} words in {time.time() - start:.2f}s)")
+
+        thread = threading.Thread(target=build, name="spelling-index", daemon=True)
+        with self._lock:
+            self._building = thread
+        thread.start()
+
+    def wait(self, timeout=None):
+        """Block until the index build in progress (if any) has finished."""
+        with self._lock:
+            thread = self._building
+        if thread is not None:
+            thread.join(timeout)
+
+    def approx_bytes(self):
+        """Approximate size of the current index (see memory_stats.py)."""
+        index = self.index
+        if index is None:
+            return 0
+        return sampled_size(index.counts) + sampled_size(index._deletes)
+
+    def apply(self, kernel, text, session_id):
+        """Return (input to send to the kernel, [(old, new), ...])."""
+        index = self.index
+        if not self.enabled or index is None:
+            return text, []
+        start = time.perf_counter()
+        try:
+            corrected, corrections = index.correct(text)
+            if not corrections or not falls_back(kernel, text, session_id):
+                return text, []
+            if falls_back(kernel, corrected, session_id):
+                return text, []
+            SPELL_CORRECTIONS.inc(len(corrections))
+            SPELL_FALLBACKS_AVOIDED.inc()
+            return corrected, corrections
+        finally:
+            SPELL_LATENCY.observe(time.perf_counter() - start)
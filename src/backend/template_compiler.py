@@ -0,0 +1,98 @@
+"""
+Compile AIML templates into flat instruction lists.
+
+python-aiml evaluates a template by walking its element tree on every
+response, dispatching on the tag name of each element, text nodes included.
+compile_template() does the constant part of that walk once, when the brain
+is built: text is whitespace-collapsed and merged with its neighbours, and
+<uppercase>, <lowercase>, <formal>, <sentence> and <think> over constant
+content are evaluated.  The result is
+
+    ["compiled", {}, part, part, ...]
+
+where each part is either a pre-built string or an element that depends on
+the session (<star/>, <srai>, <get>, <random>, ...) with its own children
+compiled the same way.  A constant template is a single string.  Compiled
+templates are plain lists, dicts and strings, so they are stored in the
+compact brain snapshot as they are.
+
+A kernel evaluates them once install() has registered the "compiled"
+handler; BrainLoader does that whenever it swaps a brain in.
+"""
+
+import re
+import string
+
+COMPILED = "compiled"
+
+_whitespaceRE = re.compile(r"\s+")
+_TEXT_ATTRS = {"xml:space": "preserve"}
+
+
+def _sentence(text):
+    # Kernel._processSentence()
+    words = text.strip().split(" ", 1)
+    words[0] = words[0].capitalize()
+    return " ".join(words)
+
+
+# Tags whose value only depends on their (constant) content
+_FOLDABLE = {
+    "uppercase": str.upper,
+    "lowercase": str.lower,
+    "formal": string.capwords,
+    "sentence": _sentence,
+    "think": lambda text: "",
+}
+
+
+def compile_template(template):
+    """Return the compiled form of a <template> element tree."""
+    if template[0] == COMPILED:
+        return template
+    return [COMPILED, {}] + [part for part in _compile_children(template[2:]) if part != ""]
+
+
+def is_constant(compiled):
+    """True if a compiled template is a single pre-built string."""
+    return len(compiled) == 3 and compiled[2].__class__ is str
+
+
+def _compile_children(children):
+    parts = []
+    for child in children:
+        part = _compile_element(child)
+        if part.__class__ is str and parts and parts[-1].__class__ is str:
+            parts[-1] += part
+        else:
+            parts.append(part)
+    return parts
+
+
+def _compile_element(elem):
+    """Return a constant string, or the element with compiled children."""
+    tag, attrs = elem[0], elem[1]
+    if tag == "text":
+        if attrs.get("xml:space") == "default":
+            return _whitespaceRE.sub(" ", elem[2])
+        return elem[2]
+    children = _compile_children(elem[2:])
+    fold = _FOLDABLE.get(tag)
+    if fold is not None and all(part.__class__ is str for part in children):
+        return fold("".join(children))
+    # Element handlers expect child elements, so constants become text nodes
+    return [tag, attrs] + [["text", _TEXT_ATTRS, part] if part.__class__ is str else part
+                           for part in children]
+
+
+def install(kernel):
+    """Register the handler for compiled templates on `kernel`."""
+    process = kernel._processElement
+
+    def process_compiled(elem, sessionID):
+        response = ""
+        for part in elem[2:]:
+            response += part if part.__class__ is str else process(part, sessionID)
+        return response
+
+    kernel._elementProcessors[COMPILED] = process_compiled
@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The backend modules are flat files in src/backend
+sys.path.insert(0, BACKEND)
+
+CORE_AIML = """<aiml version="1.0">
+<category><pattern>*</pattern><template><srai>CATCHALL</srai></template></category>
+<category><pattern>CATCHALL</pattern><template>Fallback: I do not understand.</template></category>
+<category><pattern>HELLO</pattern><template>Hi there.</template></category>
+<category><pattern>WHAT IS YOUR NAME</pattern><template>My name is Testbot.</template></category>
+<category><pattern>HOW OLD ARE YOU</pattern><template>I am two years old.</template></category>
+<category><pattern>MY NAME IS *</pattern><template>Nice to meet you <star/>.</template></category>
+<category><pattern>WHAT DID I SAY</pattern><template>You said <input index="2"/>.</template></category>
+</aiml>
+"""
+
+TOPICS_AIML = """<aiml version="1.0">
+<category><pattern>TELL ME ABOUT PYTHON</pattern><template>Python is a language.</template></category>
+<category><pattern>DO YOU LIKE MUSIC</pattern><template>I like jazz.</template></category>
+</aiml>
+"""
+
+GERMAN_AIML = """<?xml version="1.0" encoding="UTF-8"?>
+<aiml version="1.0">
+<meta name="language" content="de"/>
+<category><pattern>HALLO</pattern><template>Hallo! Wie geht es dir heute?</template></category>
+<category><pattern>WIE GEHT ES DIR</pattern><template>Mir geht es gut, danke der Nachfrage.</template></category>
+<category><pattern>WAS MACHST DU GERNE</pattern><template>Ich unterhalte mich gerne mit Menschen.</template></category>
+<category><pattern>WO WOHNST DU</pattern><template>Ich wohne in einem Rechner in Deutschland.</template></category>
+<category><pattern>WIE HEISST DU</pattern><template>Ich heisse Testbot und spreche auch Deutsch.</template></category>
+<category><pattern>ICH BIN MUEDE</pattern><template>Dann solltest du schlafen gehen, gute Nacht.</template></category>
+<category><pattern>*</pattern><template>Fallback: Das verstehe ich leider nicht.</template></category>
+</aiml>
+"""
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """app.py imported against a small data set and a local mock LiteLLM.
+
+    Imported once per test session: tests that change module globals should
+    do so with monkeypatch.
+    """
+    sys.path.insert(0, os.path.join(BACKEND, "bench"))
+    import mock_litellm
+    mock_litellm.settings.update(latency=0.0, chunk_delay=0.0, error_rate=0.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), mock_litellm.MockLiteLLM)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    root = tmp_path_factory.mktemp("app")
+    data = root / "data"
+    data.mkdir()
+    (data / "std-test.aiml").write_text(CORE_AIML)
+    (data / "topics.aiml").write_text(TOPICS_AIML)
+    (data / "std-german.aiml").write_text(GERMAN_AIML, encoding="utf-8")
+
+    os.environ.update({
+        "LITELLM_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "LITELLM_MODEL": "test-model",
+        "LITELLM_MODELS": "",
+        "AIML_SESSION_DB": "",
+        "AIML_BOTS": "",
+        "SESSION_RATE_LIMIT": "0",
+        "SESSION_HANDOFF_DIR": "",
+        "FALLBACK_LOG": "",
+        "LANGUAGE_MIN_CONFIDENCE": "0.6",
+    })
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        import app as backend
+        backend.brain_loader.wait()
+        backend.language_router.wait()
+        backend.spell_corrector.wait()
+        backend.near_miss.wait()
+        yield backend
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
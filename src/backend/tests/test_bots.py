@@ -0,0 +1,69 @@
+import aiml
+import pytest
+
+import template_compiler
+from bots import BotRegistry
+from compact_brain import CompactPatternMgr
+
+BASE = """<aiml version="1.0">
+<category><pattern>HELLO</pattern><template>Hi from the base.</template></category>
+<category><pattern>WHAT IS UP</pattern><template>Not much.</template></category>
+</aiml>
+"""
+
+PIRATE = """<aiml version="1.0">
+<category><pattern>HELLO</pattern><template>Ahoy!</template></category>
+</aiml>
+"""
+
+
+@pytest.fixture(params=["compact", "dict"])
+def registry(request, tmp_path):
+    (tmp_path / "base.aiml").write_text(BASE)
+    (tmp_path / "pirate.aiml").write_text(PIRATE)
+    scratch = aiml.Kernel()
+    scratch.verbose(False)
+    scratch.learn(str(tmp_path / "base.aiml"))
+    brain = scratch._brain
+    if request.param == "compact":
+        brain = CompactPatternMgr.from_pattern_mgr(brain)
+
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    template_compiler.install(kernel)
+    kernel._brain = brain
+    bots = BotRegistry(kernel, str(tmp_path), {"pirate": ["pirate.aiml"]})
+    bots.load()
+    bots.rebuild(brain, "full")
+    return bots
+
+
+def learn(kernel, tmp_path, pattern, template):
+    """Add a category at runtime, as a <learn> tag does."""
+    path = tmp_path / "learned.aiml"
+    path.write_text(f"<aiml><category><pattern>{pattern}</pattern>"
+                    f"<template>{template}</template></category></aiml>")
+    kernel.learn(str(path))
+
+
+def test_overlay_answers_over_the_base(registry):
+    assert registry.get_kernel().respond("hello", "s") == "Hi from the base."
+    assert registry.get_kernel("pirate").respond("hello", "s") == "Ahoy!"
+    assert registry.get_kernel("pirate").respond("what is up", "s") == "Not much."
+
+
+def test_learn_on_the_base_does_not_leak_into_overlays(registry, tmp_path):
+    base, pirate = registry.get_kernel(), registry.get_kernel("pirate")
+    learn(base, tmp_path, "WHAT IS NEW", "Base only.")
+    learn(base, tmp_path, "WHAT IS UP", "Changed in the base.")
+    assert base.respond("what is new", "s") == "Base only."
+    assert base.respond("what is up", "s") == "Changed in the base."
+    assert pirate.respond("what is new", "s") == ""
+    assert pirate.respond("what is up", "s") == "Not much."
+
+
+def test_learn_on_an_overlay_does_not_leak_into_the_base(registry, tmp_path):
+    base, pirate = registry.get_kernel(), registry.get_kernel("pirate")
+    learn(pirate, tmp_path, "WHAT IS UP", "Sailing.")
+    assert pirate.respond("what is up", "s") == "Sailing."
+    assert base.respond("what is up", "s") == "Not much."
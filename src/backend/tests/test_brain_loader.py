@@ -0,0 +1,58 @@
+import os
+
+import aiml
+import pytest
+
+from brain_loader import READY, BrainLoader
+
+GREETINGS = """<aiml version="1.0">
+<category><pattern>HELLO</pattern><template>Hi there.</template></category>
+</aiml>
+"""
+
+DISTILLED = """<aiml version="1.0">
+<category><pattern>WHAT IS A TOKEN</pattern><template>A piece of a word.</template></category>
+</aiml>
+"""
+
+
+def load(data_dir, compact):
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    loader = BrainLoader(kernel, str(data_dir),
+                         brain_file=str(data_dir / "brain.dump"),
+                         compact_brain_file=str(data_dir / "compact.dump"),
+                         core_brain_file=None, core_patterns=(), compact=compact)
+    loader.load(tiered=False)
+    assert loader.state == READY
+    return kernel, loader
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_unchanged_data_loads_from_the_cache(tmp_path, compact):
+    (tmp_path / "greetings.aiml").write_text(GREETINGS)
+    load(tmp_path, compact)
+    kernel, loader = load(tmp_path, compact)
+    assert loader.source.endswith(".dump")
+    assert kernel.respond("hello", "s") == "Hi there."
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_added_file_rebuilds_the_cache(tmp_path, compact):
+    (tmp_path / "greetings.aiml").write_text(GREETINGS)
+    load(tmp_path, compact)
+
+    # Saved a minute before distill.py writes its file
+    for dump in tmp_path.glob("*.dump"):
+        earlier = os.path.getmtime(dump) - 60
+        os.utime(dump, (earlier, earlier))
+    (tmp_path / "generated-fallbacks.aiml").write_text(DISTILLED)
+
+    kernel, loader = load(tmp_path, compact)
+    assert loader.source == str(tmp_path)
+    assert kernel.respond("what is a token", "s") == "A piece of a word."
+    assert kernel.respond("hello", "s") == "Hi there."
+    # The rebuilt cache is fresh again
+    kernel, loader = load(tmp_path, compact)
+    assert loader.source.endswith(".dump")
+    assert kernel.respond("what is a token", "s") == "A piece of a word."
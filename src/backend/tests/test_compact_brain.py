@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORE = """<aiml version="1.0">
+<category><pattern>ZULU *</pattern><template>Core <star/>.</template></category>
+<category><pattern>HELLO</pattern><template>Hi.</template></category>
+</aiml>
+"""
+
+TOPICS = """<aiml version="1.0">
+<category><pattern>ALPHA *</pattern><template>First <star/>.</template></category>
+<category><pattern>BRAVO CHARLIE</pattern><template><srai>ALPHA DELTA</srai></template></category>
+<category><pattern>YANKEE</pattern><that>HI</that><template>After hi.</template></category>
+</aiml>
+"""
+
+
+def write_data(tmp_path):
+    (tmp_path / "core.aiml").write_text(CORE)
+    (tmp_path / "topics.aiml").write_text(TOPICS)
+
+
+def run_fresh(code):
+    """Run `code` in a new interpreter, whose word table starts empty."""
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=BACKEND,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_tiered_core_then_full_load(tmp_path):
+    write_data(tmp_path)
+    # Saved in one process, loaded in another: the core tier registers its
+    # words first, so the full snapshot's words get out-of-order IDs.
+    run_fresh(f"""
+        import aiml
+        from compact_brain import CompactPatternMgr
+        for name, files in (("full", ["topics.aiml", "core.aiml"]), ("core", ["core.aiml"])):
+            k = aiml.Kernel()
+            k.verbose(False)
+            for f in files:
+                k.learn({str(tmp_path)!r} + "/" + f)
+            CompactPatternMgr.from_pattern_mgr(k._brain).save_snapshot(
+                {str(tmp_path)!r} + "/" + name + ".dump")
+    """)
+    out = run_fresh(f"""
+        import aiml
+        import template_compiler
+        from compact_brain import CompactPatternMgr
+        k = aiml.Kernel()
+        k.verbose(False)
+        template_compiler.install(k)
+        k._brain = CompactPatternMgr.load_snapshot({str(tmp_path)!r} + "/core.dump")
+        print(k.respond("zulu one", "s"))
+        k._brain = CompactPatternMgr.load_snapshot({str(tmp_path)!r} + "/full.dump")
+        for text in ("zulu two", "alpha three", "bravo charlie", "hello", "yankee"):
+            print(k.respond(text, "s"))
+    """)
+    assert out.splitlines() == ["Core one.", "Core two.", "First three.", "First DELTA.",
+                                "Hi.", "After hi."]
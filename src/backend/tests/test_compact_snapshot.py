@@ -0,0 +1,59 @@
+import aiml
+
+import template_compiler
+from compact_brain import CompactPatternMgr, iter_categories
+
+CORE = """<aiml version="1.0">
+<category><pattern>ZULU *</pattern><template>Core <star/>.</template></category>
+<category><pattern>HELLO</pattern><template>Hi.</template></category>
+</aiml>
+"""
+
+TOPICS = """<aiml version="1.0">
+<category><pattern>ALPHA *</pattern><template>First <star/>.</template></category>
+<category><pattern>BRAVO CHARLIE</pattern><template><srai>ALPHA DELTA</srai></template></category>
+<category><pattern>YANKEE</pattern><that>HI</that><template>After hi.</template></category>
+</aiml>
+"""
+
+
+def write_data(tmp_path):
+    (tmp_path / "core.aiml").write_text(CORE)
+    (tmp_path / "topics.aiml").write_text(TOPICS)
+
+
+def compact_brain(*paths):
+    scratch = aiml.Kernel()
+    scratch.verbose(False)
+    for path in paths:
+        scratch.learn(str(path))
+    return CompactPatternMgr.from_pattern_mgr(scratch._brain)
+
+
+def kernel_with(brain):
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    template_compiler.install(kernel)
+    kernel._brain = brain
+    return kernel
+
+
+def categories(brain):
+    return sorted((tuple(map(str, keys)), repr(template))
+                  for keys, template in iter_categories(brain._root))
+
+
+def test_snapshot_round_trip(tmp_path):
+    write_data(tmp_path)
+    brain = compact_brain(tmp_path / "core.aiml", tmp_path / "topics.aiml")
+    brain.save_snapshot(str(tmp_path / "brain.dump"))
+
+    loaded = CompactPatternMgr.load_snapshot(str(tmp_path / "brain.dump"))
+    assert loaded._templateCount == brain._templateCount
+    assert categories(loaded) == categories(brain)
+
+    kernel = kernel_with(loaded)
+    assert kernel.respond("zulu one", "s") == "Core one."
+    assert kernel.respond("bravo charlie", "s") == "First DELTA."
+    assert kernel.respond("hello", "s") == "Hi."
+    assert kernel.respond("yankee", "s") == "After hi."
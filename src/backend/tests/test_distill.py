@@ -0,0 +1,163 @@
+import json
+import os
+import sys
+
+import aiml
+
+import distill
+from distill import Normalizer, cluster, jaccard, pick_answer, read_generated, write_aiml
+from fallback_log import FallbackLog
+
+DATA_AIML = """<aiml version="1.0">
+<category><pattern>*</pattern><template>Fallback: What?</template></category>
+<category><pattern>HELLO</pattern><template>Hi.</template></category>
+</aiml>
+"""
+
+ANSWER = 'Use <b> & "quotes" for it\'s sake.'
+
+
+def test_jaccard():
+    assert jaccard({"A", "B"}, {"A", "B"}) == 1
+    assert jaccard({"A", "B"}, {"B", "C"}) == 1 / 3
+
+
+def test_cluster():
+    counts = {"WHAT TIME IS IT NOW": 2, "WHAT TIME IS IT": 5, "NOW WHAT TIME IS IT": 1,
+              "TELL ME A JOKE": 3}
+    clusters = cluster(counts, 0.8)
+    assert [(c["patterns"], c["count"]) for c in clusters] == [
+        (["WHAT TIME IS IT", "WHAT TIME IS IT NOW", "NOW WHAT TIME IS IT"], 8),
+        (["TELL ME A JOKE"], 3)]
+    # Same words only: the reordering still joins, the extra word does not
+    clusters = cluster(counts, 1.0)
+    assert [c["patterns"] for c in clusters] == [
+        ["WHAT TIME IS IT"], ["TELL ME A JOKE"], ["WHAT TIME IS IT NOW", "NOW WHAT TIME IS IT"]]
+
+
+def test_normalizer():
+    normalizer = Normalizer()
+    assert normalizer.pattern("What's the   time, please?") == "WHAT IS THE TIME PLEASE"
+    assert len(normalizer.sentences("One. Two?")) == 2
+
+
+def test_pick_answer_prefers_answers_without_context():
+    records = [{"answer": "old fresh", "context": 0, "time": 1},
+               {"answer": "new fresh", "context": 0, "time": 2},
+               {"answer": "in context", "context": 4, "time": 3}]
+    assert pick_answer(records) == "new fresh"
+    assert pick_answer(records[2:]) == "in context"
+
+
+def test_write_aiml_round_trip(tmp_path):
+    path = str(tmp_path / "generated.aiml")
+    categories = {"HOW DO I QUOTE": distill.escape(ANSWER), "QUOTING": "<srai>HOW DO I QUOTE</srai>"}
+    write_aiml(path, categories)
+    assert read_generated(path) == categories
+    assert not (tmp_path / "generated.aiml.tmp").exists()
+
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    kernel.learn(path)
+    assert kernel.numCategories() == 2
+    assert kernel.respond("how do I quote", "s") == ANSWER
+    assert kernel.respond("quoting", "s") == ANSWER
+
+
+def write_log(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            record = dict({"tokens": {"prompt": 40, "completion": 20, "total": 60},
+                           "seconds": 1.5, "context": 0}, **record)
+            f.write(json.dumps(record) + "\n")
+        f.write('{"question": "cut sh')  # a line cut short by rotation
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["distill.py", *args])
+    distill.main()
+
+
+def test_main(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "std.aiml").write_text(DATA_AIML)
+    output = str(data / "generated-fallbacks.aiml")
+    records = (
+        [{"question": "How do I quote?", "answer": ANSWER, "bot": "default", "time": 1}] * 2 +
+        [{"question": "How do I quote", "answer": "Later answer.", "bot": "default", "time": 2,
+          "context": 2},
+         {"question": "how do i QUOTE please", "answer": "x", "bot": "default", "time": 3,
+          "context": 2},
+         {"question": "So how do I quote", "answer": "x", "bot": "default", "time": 3,
+          "context": 2},
+         {"question": "How do I quote", "answer": "x", "bot": "other", "time": 4},
+         {"question": "Hello", "answer": "x", "bot": "default", "time": 5},
+         {"question": "Hello", "answer": "x", "bot": "default", "time": 5},
+         {"question": "Hello", "answer": "x", "bot": "default", "time": 5},
+         {"question": "What is it", "answer": "x", "bot": "default", "time": 6},
+         {"question": "What is it", "answer": "x", "bot": "default", "time": 6},
+         {"question": "What is it", "answer": "x", "bot": "default", "time": 6},
+         {"question": "Bye", "answer": "Fallback: What?", "bot": "default", "time": 7}] +
+        [{"question": "Tell me a joke", "answer": "Knock knock.", "bot": "default", "time": 8}] * 3)
+    write_log(tmp_path / "fallbacks.jsonl", records)
+
+    run(monkeypatch, str(tmp_path / "fallbacks.jsonl"), "--data", str(data), "--output", output)
+    # HELLO is in the data set, WHAT IS IT refers back and BYE fell back.
+    # The wordings asked once join HOW DO I QUOTE, whose answer is the
+    # latest one given without earlier conversation.
+    assert read_generated(output) == {
+        "HOW DO I QUOTE": distill.escape(ANSWER),
+        "HOW DO I QUOTE PLEASE": "<srai>HOW DO I QUOTE</srai>",
+        "SO HOW DO I QUOTE": "<srai>HOW DO I QUOTE</srai>",
+        "TELL ME A JOKE": "Knock knock."}
+
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    kernel.learn(str(data / "std.aiml"))
+    kernel.learn(output)
+    assert kernel.respond("How do I quote?", "s") == ANSWER
+    assert kernel.respond("how do I quote please", "s") == ANSWER
+
+    # Categories distilled earlier are kept when they no longer show up
+    write_log(tmp_path / "later.jsonl",
+              [{"question": "Are you real", "answer": "Yes.", "bot": "default", "time": 9}] * 3)
+    run(monkeypatch, str(tmp_path / "later.jsonl"), "--data", str(data), "--output", output)
+    assert sorted(read_generated(output)) == [
+        "ARE YOU REAL", "HOW DO I QUOTE", "HOW DO I QUOTE PLEASE", "SO HOW DO I QUOTE",
+        "TELL ME A JOKE"]
+    run(monkeypatch, str(tmp_path / "later.jsonl"), "--data", str(data), "--output", output,
+        "--replace")
+    assert sorted(read_generated(output)) == ["ARE YOU REAL"]
+
+
+def read_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f]
+
+
+def test_fallback_log_rotates_at_max_bytes(tmp_path):
+    path = str(tmp_path / "fallbacks.jsonl")
+    log = FallbackLog(path, max_bytes=1000)
+    count = 0
+    while not os.path.exists(path + ".1"):
+        log.record(f"question {count}", "answer", "default", "m", {"total": 1}, 0.5, 0)
+        count += 1
+    assert count > 1
+    # Rotated by the write that took the file past max_bytes
+    assert read_questions(path + ".1") == [f"question {i}" for i in range(count)]
+    size = os.path.getsize(path + ".1")
+    assert size > 1000 and size - size // count <= 1000
+    assert not os.path.exists(path)
+
+    log.record("next", "answer", "default", "m", {"total": 1}, 0.5, 0)
+    assert read_questions(path) == ["next"]
+    with open(path, encoding="utf-8") as f:
+        assert set(json.loads(f.readline())) == {
+            "time", "bot", "question", "answer", "model", "tokens", "seconds", "context"}
+
+
+def test_fallback_log_without_a_path(tmp_path):
+    log = FallbackLog("")
+    log.record("q", "a", "default", "m", {}, 0.1, 0)
+    assert log._file is None
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import drain
+from drain import Drainer
+
+
+class FakeStore:
+    def __init__(self, records=(), fail=False):
+        self.records = list(records)
+        self.fail = fail
+        self.imported = []
+
+    def export_records(self):
+        return self.records
+
+    def import_records(self, records):
+        if self.fail:
+            raise RuntimeError("session database unavailable")
+        self.imported.extend(records)
+        return len(records)
+
+    def known(self, session_id):
+        return False
+
+
+@pytest.fixture
+def handoff_dir(tmp_path):
+    return str(tmp_path)
+
+
+def exported_file(handoff_dir, records):
+    return Drainer(FakeStore(records), [], handoff_dir).export()
+
+
+def test_export_then_import_moves_sessions(handoff_dir):
+    records = [["s1", 1.0, {"name": "Ada"}, [{"role": "user", "text": "hi"}]]]
+    exported_file(handoff_dir, records)
+    store = FakeStore()
+    assert Drainer(store, [], handoff_dir).import_pending() == 1
+    assert store.imported == records
+    assert os.listdir(handoff_dir) == []
+
+
+def test_failed_import_keeps_the_file(handoff_dir):
+    path = exported_file(handoff_dir, [["s1", 1.0, {}, []]])
+    assert Drainer(FakeStore(fail=True), [], handoff_dir).import_pending() == 0
+    assert os.listdir(handoff_dir) == [os.path.basename(path) + ".failed"]
+    # A .failed file is not picked up again
+    store = FakeStore()
+    assert Drainer(store, [], handoff_dir).import_pending() == 0
+    assert store.imported == []
+
+
+def test_corrupt_file_is_kept(handoff_dir):
+    name = f"{drain._PREFIX}other-pod-1{drain._SUFFIX}"
+    with open(os.path.join(handoff_dir, name), "wb") as f:
+        f.write(b"not gzip")
+    assert Drainer(FakeStore(), [], handoff_dir).import_pending() == 0
+    assert os.listdir(handoff_dir) == [name + ".failed"]
+
+
+def test_draining_accepts_only_known_sessions(handoff_dir):
+    drainer = Drainer(FakeStore(), [], handoff_dir)
+    assert drainer.accepts(None)
+    drainer.state = drain.DRAINING
+    assert not drainer.accepts(None)
+    assert not drainer.accepts("unknown")
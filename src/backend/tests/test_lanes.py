@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+import lanes
+from lanes import Lane, LaneFullError, SessionRateLimiter
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_lane_runs_and_returns():
+    lane = Lane("test-run", 2, 4)
+    assert lane.run(lambda a, b=0: a + b, 1, b=2) == 3
+    with pytest.raises(ZeroDivisionError):
+        lane.run(lambda: 1 / 0)
+    assert lane.stats() == {"workers": 2, "max_queue": 4, "queued": 0, "active": 0}
+
+
+def test_full_lane_sheds():
+    lane = Lane("test-shed", 1, 1)
+    release = threading.Event()
+    results = []
+    running = threading.Thread(target=lambda: results.append(lane.run(release.wait, 5)))
+    running.start()
+    wait_for(lambda: lane.stats()["active"] == 1)
+    queued = threading.Thread(target=lambda: results.append(lane.run(lambda: "queued")))
+    queued.start()
+    wait_for(lambda: lane.stats()["queued"] == 1)
+
+    ran = []
+    with pytest.raises(LaneFullError):
+        lane.run(ran.append, "shed")
+    assert ran == []
+
+    release.set()
+    running.join()
+    queued.join()
+    assert sorted(map(str, results)) == ["True", "queued"]
+    assert lane.run(lambda: "after") == "after"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lanes.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refill(clock):
+    limiter = SessionRateLimiter(rate=2, burst=3)
+    assert [limiter.allow("s") for _ in range(4)] == [True, True, True, False]
+    clock[0] += 0.25            # half a token
+    assert not limiter.allow("s")
+    clock[0] += 0.25            # one token
+    assert limiter.allow("s")
+    assert not limiter.allow("s")
+    clock[0] += 60              # refills up to the burst, no further
+    assert [limiter.allow("s") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("other")
+
+
+def test_least_recently_seen_sessions_are_forgotten(clock):
+    limiter = SessionRateLimiter(rate=1, burst=1, max_sessions=2)
+    assert limiter.allow("a") and limiter.allow("b")
+    assert not limiter.allow("a")   # seen again: now the most recent
+    assert limiter.allow("c")       # evicts b
+    assert list(limiter._buckets) == ["a", "c"]
+    assert limiter.allow("b")       # forgotten, so a full bucket again; evicts a
+    assert limiter.allow("a")
+
+
+def test_rate_zero_is_off():
+    limiter = SessionRateLimiter(rate=0, burst=0)
+    assert all(limiter.allow("s") for _ in range(100))
+    assert limiter._buckets == {}
+
+
+def anonymous_turn(client, remote_addr, forwarded=None):
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    return client.post("/chat", json={"message": "hello", "mode": "AIML"}, headers=headers,
+                       environ_base={"REMOTE_ADDR": remote_addr}).status_code
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_anonymous_turns_are_keyed_by_address(app, monkeypatch, trusted):
+    monkeypatch.setattr(app, "rate_limiter", SessionRateLimiter(rate=0.001, burst=1))
+    monkeypatch.setattr(app, "TRUST_X_FORWARDED_FOR", trusted)
+    client = app.app.test_client()
+
+    assert anonymous_turn(client, "10.0.0.1", "203.0.113.5, 10.0.0.1") == 200
+    # A second client behind the same proxy
+    assert anonymous_turn(client, "10.0.0.1", "203.0.113.6, 10.0.0.1") == (200 if trusted else 429)
+    assert anonymous_turn(client, "10.0.0.1", "203.0.113.5") == 429
+    assert anonymous_turn(client, "10.0.0.2") == 200
+    # A session has a bucket of its own, whatever its address
+    response = client.post("/chat", json={"message": "hello", "mode": "AIML", "session_id": "keyed"},
+                           environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert response.status_code == 200
+    assert set(app.rate_limiter._buckets) == (
+        {"addr:203.0.113.5", "addr:203.0.113.6", "addr:10.0.0.2", "keyed"} if trusted else
+        {"addr:10.0.0.1", "addr:10.0.0.2", "keyed"})
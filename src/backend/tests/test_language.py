@@ -0,0 +1,110 @@
+import aiml
+import pytest
+
+from language import MIN_LETTERS, LanguageRouter, NgramDetector, file_language
+
+ENGLISH = ("Hello, how are you today? I am fine, thank you. What is your name? "
+           "The weather is nice and the sun is shining. Where do you live? "
+           "I like to read books and listen to music in the evening.")
+GERMAN = ("Hallo, wie geht es dir heute? Mir geht es gut, danke. Wie heisst du? "
+          "Das Wetter ist schoen und die Sonne scheint. Wo wohnst du? "
+          "Ich lese gerne Buecher und hoere am Abend Musik.")
+
+ENGLISH_AIML = """<aiml version="1.0">
+<category><pattern>HOW ARE YOU</pattern><template>I am fine, thank you.</template></category>
+<category><pattern>WHERE DO YOU LIVE</pattern><template>I live in a computer.</template></category>
+</aiml>
+"""
+
+GERMAN_AIML = """<aiml version="1.0">
+<!-- <meta name="language" content="fr"/> in a comment does not count -->
+<meta name="language" content="de"/>
+<category><pattern>WIE GEHT ES DIR</pattern><template>Mir geht es gut, danke.</template></category>
+<category><pattern>WO WOHNST DU</pattern><template>Ich wohne in einem Rechner.</template></category>
+</aiml>
+"""
+
+
+@pytest.fixture
+def detector():
+    detector = NgramDetector()
+    detector.train("en", ENGLISH)
+    detector.train("de", GERMAN)
+    return detector
+
+
+def test_detect(detector):
+    language, confidence = detector.detect("wie geht es dir heute")
+    assert language == "de" and confidence > 0.9
+    language, confidence = detector.detect("how are you today")
+    assert language == "en" and confidence > 0.9
+
+
+def test_detect_declines_short_inputs(detector):
+    assert detector.detect("ja") == (None, 0.0)
+    assert detector.detect("a" * (MIN_LETTERS - 1) + " 123 !") == (None, 0.0)
+    assert detector.detect("a" * MIN_LETTERS)[0] is not None
+
+
+def test_detect_needs_two_languages():
+    detector = NgramDetector()
+    assert detector.detect("how are you today") == (None, 0.0)
+    detector.train("en", ENGLISH)
+    assert detector.detect("how are you today") == (None, 0.0)
+
+
+def test_file_language(tmp_path):
+    (tmp_path / "de.aiml").write_text(GERMAN_AIML)
+    (tmp_path / "en.aiml").write_text(ENGLISH_AIML)
+    (tmp_path / "single.aiml").write_text("<aiml><meta content='es' name='language'/></aiml>")
+    assert file_language(str(tmp_path / "de.aiml"), "en") == "de"
+    assert file_language(str(tmp_path / "en.aiml"), "en") == "en"
+    assert file_language(str(tmp_path / "single.aiml"), "en") == "es"
+    assert file_language(str(tmp_path / "missing.aiml"), "en") == "en"
+
+
+def test_router_uses_the_sub_brain_once_it_is_ready(tmp_path):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "en.aiml").write_text(ENGLISH_AIML)
+    (tmp_path / "data" / "de.aiml").write_text(GERMAN_AIML)
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    router = LanguageRouter(kernel, str(tmp_path / "data"), str(tmp_path / "compact.dump"),
+                            min_confidence=0.6)
+    assert sorted(router.files) == ["de", "en"]
+    assert sorted(router.brains) == ["de"]  # "auto" leaves the default language out
+
+    assert router.get_kernel("de") is None  # not loaded yet
+    router.on_swap(kernel._brain, "core")   # only the full tier starts loading
+    assert router._thread is None
+    router.on_swap(kernel._brain, "full")
+    router.wait()
+
+    sub = router.get_kernel("de")
+    assert sub is not None and sub is not kernel
+    assert sub._sessions is kernel._sessions
+    assert sub.respond("wie geht es dir", "s") == "Mir geht es gut, danke."
+    assert sub.respond("where do you live", "s") == ""  # English is not in it
+    assert router.get_kernel("en") is None
+    assert router.get_kernel(None) is None
+    assert router.hint("de") == "Reply in German."
+    assert router.hint("en") is None
+
+
+def test_routed_turns_skip_spelling_and_near_miss(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app.spell_corrector, "apply",
+                        lambda kernel, text, sid: calls.append("spell") or (text, []))
+    monkeypatch.setattr(app.near_miss, "lookup", lambda text: calls.append("near") or None)
+    client = app.app.test_client()
+
+    body = client.post("/chat", json={"message": "wie heisst du eigentlich mein freund",
+                                      "mode": "Hybrid"}).get_json()
+    assert body["language"] == "de"
+    assert body["source"] == "LLM (AIML fallback)"
+    assert calls == []
+
+    body = client.post("/chat", json={"message": "tell me about the weather please",
+                                      "mode": "Hybrid"}).get_json()
+    assert body["language"] != "de"
+    assert calls == ["spell", "near"]
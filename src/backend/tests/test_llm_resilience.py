@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import llm_resilience
+from llm_resilience import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LatencyTracker,
+                            hedge_pool, hedged_call)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, cooldown=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_adaptive_timeout_learns_from_timeouts():
+    tracker = LatencyTracker("test", min_samples=5, min_timeout=1, max_timeout=30)
+    for _ in range(5):
+        tracker.record(1.0)
+    assert tracker.timeout() == 2.0
+    tracker.record_timeout(2.0)
+    tracker.record_timeout(2.0)
+    assert tracker.timeout() == 4.0
+
+
+def test_hedge_waits_for_success_over_fast_failure():
+    pool = hedge_pool(4)
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(None)
+            attempt = len(calls)
+        if attempt == 1:
+            time.sleep(0.3)
+            return {"error": None, "content": "slow success"}
+        return {"error": "Status 500", "content": "fast failure"}
+
+    result = hedged_call("test", fn, 0.05, pool, lost=lambda r: r["error"] is not None)
+    assert result["content"] == "slow success"
+    assert len(calls) == 2
+
+
+def test_hedge_returns_first_outcome_when_both_fail():
+    pool = hedge_pool(4)
+    attempts = iter(["first", "second"])
+
+    def fn():
+        name = next(attempts)
+        time.sleep(0.1 if name == "first" else 0.0)
+        return {"error": name}
+
+    result = hedged_call("test", fn, 0.02, pool, lost=lambda r: r["error"] is not None)
+    assert result == {"error": "first"}
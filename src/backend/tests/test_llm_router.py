@@ -0,0 +1,101 @@
+import pytest
+import requests
+
+from llm_resilience import CircuitOpenError
+from llm_router import LLMRouter, ModelRoute
+
+TOKENS = {"prompt": 10, "completion": 5, "total": 15}
+
+
+class FakeClient:
+    """Stands in for LLMClient: each call pops the next outcome."""
+
+    base_url = "http://fake"
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def complete(self, payload, timeout=None):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def stream(self, payload, on_delta, timeout=None):
+        result = self.complete(payload, timeout)
+        if result["error"] is None:
+            on_delta(result["content"])
+        return result
+
+
+def ok(content):
+    return {"content": content, "tokens": dict(TOKENS), "error": None}
+
+
+def error(message):
+    return {"content": "Sorry", "tokens": {"prompt": 0, "completion": 0, "total": 0},
+            "error": message}
+
+
+def router(*clients, latency_budget=None):
+    # Cheapest first, so the routes are tried in the order given.
+    routes = [ModelRoute(f"m{i}", f"model-{i}", client, cost_per_1k_prompt=i + 1)
+              for i, client in enumerate(clients)]
+    return LLMRouter(routes, latency_budget=latency_budget)
+
+
+@pytest.mark.parametrize("failure", [
+    requests.exceptions.Timeout("slow"),
+    requests.exceptions.ConnectionError("refused"),
+    CircuitOpenError("open"),
+])
+def test_falls_over_on_exceptions(failure):
+    llm = router(FakeClient(failure), FakeClient(ok("from m1")))
+    result = llm.complete({"messages": []}, 10, 0)
+    assert result["content"] == "from m1"
+    assert result["model"] == "m1"
+
+
+def test_falls_over_on_error_results():
+    first = FakeClient(error("Status 503"))
+    llm = router(first, FakeClient(ok("from m1")))
+    result = llm.complete({"messages": []}, 10, 0)
+    assert result["model"] == "m1"
+    assert llm.routes[0].error_ewma > 0
+
+
+def test_returns_last_failure_when_every_model_fails():
+    llm = router(FakeClient(error("Status 500")), FakeClient(error("Status 502")))
+    assert llm.complete({"messages": []}, 10, 0)["error"] == "Status 502"
+
+    llm = router(FakeClient(error("Status 500")),
+                 FakeClient(requests.exceptions.Timeout("slow")))
+    with pytest.raises(requests.exceptions.Timeout):
+        llm.complete({"messages": []}, 10, 0)
+
+
+def test_attempts_share_the_latency_budget():
+    first, second = FakeClient(requests.exceptions.Timeout("slow")), FakeClient(ok("hi"))
+    llm = router(first, second, latency_budget=5.0)
+    llm.complete({"messages": []}, 10, 0)
+    assert 0 < second.timeouts[0] <= first.timeouts[0] <= 5.0
+
+    unbudgeted = FakeClient(ok("hi"))
+    router(unbudgeted).complete({"messages": []}, 10, 0)
+    assert unbudgeted.timeouts == [None]
+
+
+def test_stream_does_not_fall_over_after_the_first_chunk():
+    class Broken(FakeClient):
+        def stream(self, payload, on_delta, timeout=None):
+            on_delta("partial ")
+            raise requests.exceptions.ConnectionError("reset")
+
+    second = FakeClient(ok("again"))
+    chunks = []
+    with pytest.raises(requests.exceptions.ConnectionError):
+        router(Broken(), second).complete({"messages": []}, 10, 0, on_delta=chunks.append)
+    assert chunks == ["partial "]
+    assert second.timeouts == []
@@ -0,0 +1,106 @@
+import pytest
+
+from match_budget import BudgetedKernel, BudgetExceeded, cap_input
+
+AIML = """<aiml version="1.0">
+<category><pattern>HELLO</pattern><template>Hi there.</template></category>
+<category><pattern>LOOP</pattern><template><srai>LOOP</srai></template></category>
+<category><pattern>LOOP *</pattern><template><srai>LOOP <star/></srai></template></category>
+</aiml>
+"""
+
+
+@pytest.fixture
+def kernel(tmp_path):
+    (tmp_path / "test.aiml").write_text(AIML)
+    k = BudgetedKernel()
+    k.verbose(False)
+    k.learn(str(tmp_path / "test.aiml"))
+    return k
+
+
+def steps_for(kernel, text):
+    with kernel.bounded("probe", max_steps=100000):
+        kernel.respond(text, "probe")
+        return kernel._budget.steps
+
+
+def history(kernel, sessionID):
+    return tuple(list(kernel.getPredicate(name, sessionID))
+                 for name in (kernel._inputHistory, kernel._outputHistory, kernel._inputStack))
+
+
+def test_cap_input_chars_cuts_at_a_word_boundary():
+    assert cap_input("hello there world", max_chars=13) == ("hello there", "chars")
+    assert cap_input("abcdefghij", max_chars=4) == ("abcd", "chars")
+    assert cap_input("hello", max_chars=5) == ("hello", None)
+
+
+def test_cap_input_sentences():
+    assert cap_input("One. Two? Three!", max_sentences=2) == ("One. Two?", "sentences")
+    # Trailing punctuation alone is not another sentence
+    assert cap_input("One. Two.  ", max_sentences=2) == ("One. Two.  ", None)
+    assert cap_input("One. Two. Three.", max_sentences=0) == ("One. Two. Three.", None)
+    # Both caps: chars is applied to what the sentence cap left
+    assert cap_input("one two. three. four.", max_chars=6, max_sentences=2) == ("one", "chars")
+
+
+def test_unbounded_respond(kernel):
+    assert kernel.respond_within("hello", "s") == "Hi there."
+    assert kernel._budget is None
+
+
+def test_step_exhaustion(kernel):
+    needed = steps_for(kernel, "hello")
+    assert kernel.respond_within("hello", "s", max_steps=needed) == "Hi there."
+    with pytest.raises(BudgetExceeded) as e:
+        kernel.respond_within("hello", "s", max_steps=needed - 1)
+    assert e.value.reason == "steps"
+    assert e.value.steps == needed
+    assert kernel._budget is None and kernel._brain._budget is None
+
+
+def test_time_exhaustion(kernel):
+    with pytest.raises(BudgetExceeded) as e:
+        kernel.respond_within("loop", "s", max_seconds=1e-9)
+    assert e.value.reason == "time"
+    assert e.value.steps % 64 == 0
+    assert kernel._budget is None
+
+
+def test_nested_blocks_share_one_budget(kernel):
+    needed = steps_for(kernel, "hello")
+    with kernel.bounded("s", max_steps=2 * needed):
+        outer = kernel._budget
+        assert kernel.respond("hello", "s") == "Hi there."
+        with kernel.bounded("s", max_steps=1):  # ignored: the outer budget applies
+            assert kernel._budget is outer
+            assert kernel.respond("hello", "s") == "Hi there."
+        assert outer.steps == 2 * needed
+
+    with pytest.raises(BudgetExceeded):
+        with kernel.bounded("s", max_steps=2 * needed - 1):
+            kernel.respond("hello", "s")
+            with kernel.bounded("s", max_steps=100000):
+                kernel.respond("hello", "s")
+
+
+def test_abort_restores_the_session_history(kernel):
+    kernel.respond("hello", "s")
+    before = history(kernel, "s")
+    assert before == (["hello"], ["Hi there."], [])
+
+    with pytest.raises(BudgetExceeded):
+        kernel.respond_within("loop forever", "s", max_steps=50)
+    assert history(kernel, "s") == before
+    assert kernel.respond("hello", "s") == "Hi there."
+    assert history(kernel, "s")[:2] == (["hello", "hello"], ["Hi there.", "Hi there."])
+
+
+def test_abort_restores_a_multi_sentence_turn(kernel):
+    kernel.respond("hello", "s")
+    before = history(kernel, "s")
+    # The first sentence completes before the second one runs out
+    with pytest.raises(BudgetExceeded):
+        kernel.respond_within("hello. loop", "s", max_steps=50)
+    assert history(kernel, "s") == before
@@ -0,0 +1,87 @@
+import sys
+import threading
+
+import aiml
+import pytest
+from aiml.PatternMgr import PatternMgr
+
+from compact_brain import CompactPatternMgr
+from memory_stats import SAMPLE, MemoryAccountant, brain_size, deep_size, sampled_size
+
+AIML = """<aiml version="1.0">
+<category><pattern>*</pattern><template>Fallback: What?</template></category>
+<category><pattern>HELLO</pattern><template>Hi there.</template></category>
+<category><pattern>HELLO *</pattern><template>Hi <star/>.</template></category>
+<category><pattern>WHAT IS YOUR NAME</pattern><template>Testbot.</template></category>
+<category><pattern>WHAT IS *</pattern><template><srai>DEFINE <star/></srai></template></category>
+<category><pattern>YES</pattern><that>DO YOU LIKE TEA</that><template>Me too.</template></category>
+</aiml>
+"""
+
+
+@pytest.fixture
+def brain(tmp_path):
+    (tmp_path / "test.aiml").write_text(AIML)
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    kernel.learn(str(tmp_path / "test.aiml"))
+    return kernel._brain
+
+
+def test_deep_size_counts_shared_objects_once():
+    item = ["x" * 100]
+    assert deep_size([item, item]) == sys.getsizeof([item, item]) + deep_size(item)
+    assert deep_size({"a": (1, 2)}) > sys.getsizeof({"a": (1, 2)})
+
+
+def test_sampled_size_is_exact_for_small_containers():
+    container = {f"key {i}": [f"value {i}", i * 1000003] for i in range(SAMPLE)}
+    assert sampled_size(container) == deep_size(container)
+    entries = [f"entry {i}" for i in range(SAMPLE)]
+    assert sampled_size(entries) == deep_size(entries)
+    assert sampled_size({}) == deep_size({})
+
+
+def test_sampled_size_estimates_large_containers():
+    container = {f"key {i:05}": [f"value {i:05}", float(i)] for i in range(20 * SAMPLE)}
+    assert sampled_size(container) == pytest.approx(deep_size(container), rel=0.02)
+
+
+def test_brain_size_matches_deep_size(brain):
+    sizes = brain_size(brain)
+    # deep_size also counts the few small ints PatternMgr uses as node keys
+    assert sizes["trie_bytes"] + sizes["template_bytes"] == \
+        pytest.approx(deep_size(brain._root), rel=0.02)
+    assert sizes["nodes"] == 1 + sum(1 for _ in walk(brain._root))
+
+
+def walk(node):
+    for key, child in node.items():
+        if key != PatternMgr._TEMPLATE:
+            yield child
+            yield from walk(child)
+
+
+def test_compact_brain_size(brain):
+    compact = CompactPatternMgr.from_pattern_mgr(brain, compile_templates=False)
+    sizes = brain_size(compact)
+    assert sizes["nodes"] == brain_size(brain)["nodes"]
+    assert sizes["template_bytes"] == deep_size(compact._templates.templates)
+    assert 0 < sizes["trie_bytes"] < brain_size(brain)["trie_bytes"]
+
+
+class Loader:
+    data_dir = "missing"
+
+    def is_excluded(self, filename):
+        return False
+
+
+def test_failed_brain_measurement_is_reported(capsys):
+    accountant = MemoryAccountant(Loader(), session_store=None)
+    accountant.on_swap(None, "full")  # no brain to walk
+    for thread in threading.enumerate():
+        if thread.name == "memory-brain":
+            thread.join(5)
+    assert "Measuring the full brain failed" in capsys.readouterr().out
+    assert accountant.brain is None
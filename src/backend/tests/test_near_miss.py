@@ -0,0 +1,105 @@
+import pytest
+
+from match_budget import BudgetedKernel
+from near_miss import NearMissIndex, NearMissRetriever, literal_patterns, normalize
+
+AIML = """<aiml version="1.0">
+<category><pattern>*</pattern><template>Fallback: What?</template></category>
+<category><pattern>HOW OLD ARE YOU</pattern><template>I am two.</template></category>
+<category><pattern>WHAT IS YOUR NAME</pattern><template>Testbot.</template></category>
+<category><pattern>MY NAME IS *</pattern><template>Hello <star/>.</template></category>
+<category><pattern>YES</pattern><that>DO YOU LIKE TEA</that><template>Me too.</template></category>
+<category><pattern>LOOP</pattern><template><srai>LOOP</srai></template></category>
+</aiml>
+"""
+
+
+@pytest.fixture
+def kernel(tmp_path):
+    (tmp_path / "test.aiml").write_text(AIML)
+    k = BudgetedKernel()
+    k.verbose(False)
+    k.learn(str(tmp_path / "test.aiml"))
+    return k
+
+
+@pytest.fixture
+def retriever(kernel):
+    retriever = NearMissRetriever(threshold=0.75)
+    retriever.rebuild(kernel._brain)
+    retriever.wait()
+    return retriever
+
+
+def history(kernel, sessionID):
+    return (list(kernel.getPredicate(kernel._inputHistory, sessionID)),
+            list(kernel.getPredicate(kernel._outputHistory, sessionID)))
+
+
+def accept(response):
+    return "Fallback:" not in response
+
+
+def test_only_literal_context_free_patterns_are_indexed(kernel):
+    assert sorted(literal_patterns(kernel._brain._root)) == [
+        "HOW OLD ARE YOU", "LOOP", "WHAT IS YOUR NAME"]
+    assert normalize("how  old, are you?") == "HOW OLD ARE YOU"
+
+
+def test_lookup_threshold(kernel, retriever):
+    pattern, similarity = retriever.lookup("how old are you now")
+    assert pattern == "HOW OLD ARE YOU" and 0.75 <= similarity < 1
+    assert retriever.lookup("HOW OLD ARE YOU") == ("HOW OLD ARE YOU", pytest.approx(1.0))
+    # Closest, but below the threshold
+    found = NearMissIndex.from_brain(kernel._brain).search("how is the weather")
+    assert found is not None and found[1] < 0.75
+    assert retriever.lookup("how is the weather") is None
+    assert retriever.lookup("!!!") is None
+    strict = NearMissRetriever(threshold=0.99)
+    strict.index = retriever.index
+    assert strict.lookup("how old are you now") is None
+
+
+def test_lookup_without_an_index():
+    assert NearMissRetriever().lookup("how old are you") is None
+    retriever = NearMissRetriever(enabled=False)
+    retriever.rebuild(None)
+    assert retriever.index is None and retriever.lookup("how old are you") is None
+
+
+def test_respond_in_place_replaces_the_last_response(kernel):
+    assert kernel.respond("how old are you now", "s") == "Fallback: What?"
+    inputs, _ = history(kernel, "s")
+
+    assert kernel.respond_in_place("HOW OLD ARE YOU", "s", accept) == "I am two."
+    assert history(kernel, "s") == (inputs, ["I am two."])
+    assert kernel.getPredicate(kernel._inputStack, "s") == []
+
+
+def test_respond_in_place_rejected_or_over_budget(kernel):
+    kernel.respond("hello", "s")
+    before = history(kernel, "s")
+    assert kernel.respond_in_place("xyzzy", "s", accept) is None
+    assert history(kernel, "s") == before
+    assert kernel.respond_in_place("loop", "s", accept, max_steps=50) is None
+    assert history(kernel, "s") == before
+
+
+def test_near_miss_answer_becomes_the_last_that(app):
+    client = app.app.test_client()
+    body = client.post("/chat", json={"message": "how old are you now",
+                                      "mode": "Hybrid"}).get_json()
+    assert body["source"] == "AIML (near match)"
+    assert body["response"] == "I am two years old."
+    assert body["matched_pattern"] == "HOW OLD ARE YOU"
+
+    session_id = body["session_id"]
+    inputs, outputs = history(app.k, session_id)
+    assert inputs == ["how old are you now"]
+    assert outputs == ["I am two years old."]
+    assert app.session_history[session_id]["messages"][-1] == {
+        "role": "bot", "text": "I am two years old."}
+    # <input index="2"/> still sees the user's words, not the matched pattern
+    body = client.post("/chat", json={"message": "what did i say", "mode": "Hybrid",
+                                      "session_id": session_id}).get_json()
+    assert body["response"] == "You said how old are you now."
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import prompt_layout
+from prompt_layout import content_text, stable_messages, window_start
+
+PREFIX = "You are a helpful assistant."
+
+
+def conversation(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "text": f"question {i}"})
+        history.append({"role": "bot", "text": f"answer {i}"})
+    return history
+
+
+def dumps(messages):
+    return json.dumps(messages, sort_keys=True)
+
+
+def test_window_start_jumps_by_half_a_window():
+    history = conversation(10)
+    starts = [window_start(history[:length], 4) for length in range(0, 13)]
+    # Fixed at 0 until the window is full, then half a window at a time
+    assert starts == [0, 0, 0, 0, 0, 2, 2, 4, 4, 6, 6, 8, 8]
+
+
+def test_window_start_lands_on_a_user_message():
+    history = conversation(5)
+    assert window_start(history[:4], 3) == 2  # the jump lands on index 1, a bot message
+    assert window_start(history, 3) == 8      # and here on index 7
+    assert window_start(history, 4) == 6
+
+
+def test_window_start_token_budget():
+    history = [{"role": "user" if i % 2 == 0 else "bot", "text": "x" * 40} for i in range(8)]
+    # 10 tokens a message: 80 in all, a 45-token budget drops half-windows
+    # until 40 are left
+    assert window_start(history, 8) == 0
+    assert window_start(history, 8, max_tokens=45) == 4
+    assert window_start(history, 8, max_tokens=45, reserved_tokens=20) == 8
+    assert window_start(history, 8, max_tokens=1000) == 0
+
+
+@pytest.mark.parametrize("system_role, cache_control", [
+    (False, False), (True, False), (False, True), (True, True)])
+def test_prefix_is_byte_identical_across_turns(system_role, cache_control):
+    history = conversation(8)
+    previous = None
+    changes = 0
+    for length in range(0, len(history), 2):
+        messages = stable_messages(PREFIX, history[:length], f"question {length // 2}", window=6,
+                                   system_role=system_role, cache_control=cache_control)
+        plain = [{"role": m["role"], "content": content_text(m["content"])} for m in messages]
+        if previous is not None:
+            # The request so far reappears unchanged unless the window moved
+            if dumps(plain[:len(previous)]) != dumps(previous):
+                changes += 1
+        previous = plain
+        assert PREFIX in content_text(messages[0]["content"])
+    # Eight turns through a six-message window move its start three times
+    assert changes == 3
+
+
+def test_prefix_is_unchanged_between_window_jumps():
+    history = conversation(3)
+    first = stable_messages(PREFIX, history[:2], "question 1", window=10, cache_control=True)
+    second = stable_messages(PREFIX, history[:4], "question 2", window=10, cache_control=True)
+    # Only the cache breakpoints move: the text of every earlier message is kept
+    assert [content_text(m["content"]) for m in second[:len(first)]] == \
+        [content_text(m["content"]) for m in first]
+    assert first[0]["content"][0] == second[0]["content"][0] == \
+        {"type": "text", "text": PREFIX, "cache_control": prompt_layout.EPHEMERAL}
+
+
+@pytest.fixture
+def session(app, monkeypatch):
+    monkeypatch.setattr(app, "LITELLM_HISTORY_WINDOW", 10)
+    monkeypatch.setattr(app, "LITELLM_SYSTEM_ROLE", False)
+    monkeypatch.setattr(app, "LITELLM_CACHE_CONTROL", False)
+    history = conversation(2) + [{"role": "user", "text": "what now"},
+                                 {"role": "bot", "text": ""}]
+    monkeypatch.setitem(app.session_history, "layout-test", {"messages": history})
+    return "layout-test"
+
+
+def test_legacy_layout(app, monkeypatch, session):
+    monkeypatch.setattr(app, "LITELLM_PROMPT_LAYOUT", prompt_layout.LEGACY)
+    messages = app.build_llm_messages("what now", session, in_history=True)
+    # The last five messages, from the first user message, then the turn
+    assert [m["content"] for m in messages] == ["question 1", "answer 1", "what now", "",
+                                                "what now"]
+    assert app.build_llm_messages("hello")[0]["content"].startswith(app.LITELLM_SYSTEM_PROMPT)
+
+
+def test_stable_layout_answers_the_turn_once(app, monkeypatch, session):
+    monkeypatch.setattr(app, "LITELLM_PROMPT_LAYOUT", prompt_layout.STABLE)
+    messages = app.build_llm_messages("what now", session, in_history=True)
+    contents = [content_text(m["content"]) for m in messages]
+    assert contents == [f"{app.LLM_PROMPT_PREFIX}\n\nquestion 0", "answer 0",
+                        "question 1", "answer 1", "what now"]
+    assert sum("what now" in c for c in contents) == 1
+    assert "" not in contents
+
+    # Not yet recorded: the whole history is sent
+    messages = app.build_llm_messages("and then", session)
+    assert [content_text(m["content"]) for m in messages][-3:] == ["what now", "", "and then"]
@@ -0,0 +1,74 @@
+import aiml
+import pytest
+
+from session_store import DISK, MEMORY, SessionStore
+
+
+@pytest.fixture
+def kernel():
+    k = aiml.Kernel()
+    k.verbose(False)
+    return k
+
+
+def make_store(kernel, tmp_path, **kwargs):
+    history = {}
+    store = SessionStore(kernel, history, str(tmp_path / "sessions.db"), **kwargs)
+    return store, history
+
+
+def start_session(store, kernel, history, session_id, name):
+    store.touch(session_id)
+    kernel.setPredicate("name", name, session_id)
+    history[session_id] = {'messages': [{'role': 'user', 'text': f"I am {name}"}]}
+
+
+def test_capacity_eviction_spills_and_touch_restores(kernel, tmp_path):
+    store, history = make_store(kernel, tmp_path, max_hot=2)
+    for i, name in enumerate(["Ada", "Bob", "Cy"]):
+        start_session(store, kernel, history, f"s{i}", name)
+    # touch() of the third session spilled the least recently used one
+    assert "s0" not in kernel._sessions and "s0" not in history
+    assert store.get("s0")[0] == DISK
+    assert store.stats()["stored"] == 1
+
+    store.touch("s0")
+    assert kernel.getPredicate("name", "s0") == "Ada"
+    assert history["s0"]["messages"][0]["text"] == "I am Ada"
+    assert store.get("s0")[0] == MEMORY
+
+
+def test_idle_eviction(kernel, tmp_path):
+    store, history = make_store(kernel, tmp_path, idle_seconds=0)
+    start_session(store, kernel, history, "s0", "Ada")
+    assert store.evict() == 1
+    tier, predicates, messages = store.get("s0")
+    assert tier == DISK
+    assert predicates["name"] == "Ada"
+    assert messages == [{'role': 'user', 'text': "I am Ada"}]
+
+
+def test_active_session_is_not_spilled(kernel, tmp_path):
+    store, history = make_store(kernel, tmp_path, max_hot=1, idle_seconds=0)
+    with store.active("busy"):
+        kernel.setPredicate("name", "Ada", "busy")
+        history["busy"] = {'messages': []}
+        for i in range(3):
+            store.touch(f"other{i}")
+        store.evict()
+        assert kernel.getPredicate("name", "busy") == "Ada"
+        assert "busy" in history
+    assert store.stats()["pinned"] == 0
+    store.evict()
+    assert store.get("busy")[0] == DISK
+
+
+def test_restore_keeps_newer_state_in_memory(kernel, tmp_path):
+    store, history = make_store(kernel, tmp_path, idle_seconds=0)
+    start_session(store, kernel, history, "s0", "Ada")
+    store.evict()
+    # The session came back into memory without going through touch()
+    kernel.setPredicate("name", "Bob", "s0")
+    store.touch("s0")
+    assert kernel.getPredicate("name", "s0") == "Bob"
+    assert store.stats()["stored"] == 0
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Call flight.do(key, fn) from `callers` threads; return their outcomes."""
+    outcomes = [None] * callers
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_for_waiters(flight, key, count):
+    """Block until `count` callers are waiting on the leader's call for `key`."""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters >= count:
+                return
+        time.sleep(0.001)
+    raise AssertionError(f"fewer than {count} callers joined the call")
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        release.wait(5)
+        return "answer"
+
+    threads, outcomes = run_concurrently(flight, "k", fetch, 5)
+    wait_for_waiters(flight, "k", 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert sorted(shared for _, shared in outcomes) == [False, True, True, True, True]
+    assert all(result == "answer" for result, _ in outcomes)
+    assert flight.in_flight() == 0
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise TimeoutError("upstream timed out")
+
+    threads, outcomes = run_concurrently(flight, "k", fail, 3)
+    wait_for_waiters(flight, "k", 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(outcome, TimeoutError) for outcome in outcomes)
+    assert flight.in_flight() == 0
+
+
+def test_nothing_is_cached_between_calls():
+    flight = SingleFlight()
+    calls = iter(["first", "second"])
+    assert flight.do("k", lambda: next(calls)) == ("first", False)
+    assert flight.do("k", lambda: next(calls)) == ("second", False)
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    with pytest.raises(ValueError):
+        flight.do("c", lambda: int("x"))
+    assert flight.in_flight() == 0
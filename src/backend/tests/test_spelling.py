@@ -0,0 +1,118 @@
+import aiml
+import pytest
+
+from compact_brain import CompactPatternMgr
+from spelling import (PREFIX_LENGTH, SpellCorrector, SpellIndex, _deletes, _within_one_edit,
+                      edit_distance, falls_back)
+
+AIML = """<aiml version="1.0">
+<category><pattern>*</pattern><template>Fallback: What?</template></category>
+<category><pattern>HELLO</pattern><template>Hi there.</template></category>
+<category><pattern>HELLO *</pattern><template>Hi to you too.</template></category>
+<category><pattern>WHAT IS THE WEATHER</pattern><template>Sunny.</template></category>
+<category><pattern>MY NAME IS *</pattern><template>Nice to meet you.</template></category>
+<category><pattern>WHO IS JOHN</pattern><template>A friend.</template></category>
+</aiml>
+"""
+
+
+@pytest.fixture
+def kernel(tmp_path):
+    (tmp_path / "test.aiml").write_text(AIML)
+    k = aiml.Kernel()
+    k.verbose(False)
+    k.learn(str(tmp_path / "test.aiml"))
+    k._brain = CompactPatternMgr.from_pattern_mgr(k._brain, compile_templates=False)
+    return k
+
+
+@pytest.fixture
+def corrector(kernel):
+    corrector = SpellCorrector()
+    corrector.rebuild(kernel._brain)
+    corrector.wait()
+    return corrector
+
+
+@pytest.mark.parametrize("a, b, within", [
+    ("HELLO", "HELLO", True),
+    ("HELLO", "HALLO", True),      # substitution
+    ("HELLO", "HLELO", True),      # adjacent transposition
+    ("HELLO", "HLLEO", False),     # two substitutions
+    ("HELLO", "HELO", True),       # deletion
+    ("HELO", "HELLO", True),       # insertion
+    ("HELLO", "HELLOOO", False),   # two insertions
+    ("HELLO", "JELLY", False),
+    ("ABCD", "BACD", True),
+    ("ABCD", "ACBD", True),
+])
+def test_within_one_edit_agrees_with_edit_distance(a, b, within):
+    assert _within_one_edit(a, b) is within
+    assert (edit_distance(a, b, 1) <= 1) is within
+
+
+def test_edit_distance_with_a_larger_limit():
+    assert edit_distance("WEATHER", "WHETHER", 2) == 2
+    assert edit_distance("WETHR", "WEATHER", 2) == 2
+    assert edit_distance("HOUSE", "HOSUE", 2) == 1
+    # Beyond the limit the result is limit + 1, however far apart they are
+    assert edit_distance("KITTEN", "SITTING", 2) == 3
+    assert edit_distance("A", "ABCDEF", 2) == 3
+
+
+def test_deletes_only_cover_the_prefix():
+    deletes = _deletes("INTERNATIONAL", 1)
+    prefix = "INTERNATIONAL"[:PREFIX_LENGTH]
+    assert prefix in deletes
+    assert all(len(d) in (PREFIX_LENGTH, PREFIX_LENGTH - 1) for d in deletes)
+    assert "NTERNA" in deletes
+    assert len(_deletes("CAT", 2)) == 7  # CAT, AT, CT, CA, A, T, C
+
+
+def test_correct_restores_case():
+    index = SpellIndex({"HELLO": 1})
+    assert index.correct("helo") == ("hello", [("helo", "hello")])
+    assert index.correct("Helo") == ("Hello", [("Helo", "Hello")])
+    assert index.correct("HELO") == ("HELLO", [("HELO", "HELLO")])
+    assert index.correct("Hi, helo!") == ("Hi, hello!", [("helo", "hello")])
+
+
+def test_correct_word_picks_the_most_frequent_and_leaves_short_words():
+    index = SpellIndex({"CAT": 1, "CAR": 5, "HELLO": 1})
+    assert index.correct_word("CAX") == "CAR"
+    assert index.correct_word("CAT") is None        # in the vocabulary
+    assert index.correct_word("CA") is None         # too short
+    assert index.correct_word("ZZZZZ") is None
+    assert index.correct("don't") == ("don't", [])  # contractions are left alone
+
+
+def test_long_words_are_corrected_past_the_prefix():
+    index = SpellIndex({"INTERNATIONAL": 1})
+    assert index.correct_word("INTERNATIONL") == "INTERNATIONAL"
+
+
+def test_max_edit_two():
+    index = SpellIndex({"WEATHER": 1}, max_edit=2)
+    assert index.correct_word("WETHR") == "WEATHER"
+    assert SpellIndex({"WEATHER": 1}).correct_word("WETHR") is None
+
+
+def test_falls_back(kernel):
+    assert falls_back(kernel, "xyzzy", "s")
+    assert not falls_back(kernel, "hello", "s")
+    # Any sentence hitting the catch-all counts
+    assert falls_back(kernel, "hello. xyzzy", "s")
+
+
+def test_apply_rewrites_only_inputs_it_rescues_from_the_catch_all(kernel, corrector):
+    assert corrector.apply(kernel, "what is the wether", "s") == (
+        "what is the weather", [("wether", "weather")])
+    # Matches already (through MY NAME IS *): the user's words are kept
+    assert corrector.apply(kernel, "my name is jonh", "s") == ("my name is jonh", [])
+    # Still the catch-all after correction: nothing is rewritten
+    assert corrector.apply(kernel, "wether xyzzy", "s") == ("wether xyzzy", [])
+
+
+def test_apply_without_an_index(kernel):
+    assert SpellCorrector().apply(kernel, "helo", "s") == ("helo", [])
+    assert SpellCorrector(enabled=False).apply(kernel, "helo", "s") == ("helo", [])
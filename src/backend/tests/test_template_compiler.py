@@ -0,0 +1,89 @@
+import aiml
+import pytest
+
+import template_compiler
+from compact_brain import CompactPatternMgr
+from template_compiler import COMPILED, compile_template, is_constant
+
+AIML = """<aiml version="1.0">
+<category><pattern>UPPER</pattern><template>a <uppercase>shout  it</uppercase> b</template></category>
+<category><pattern>LOWER</pattern><template><lowercase>QUIET Please</lowercase></template></category>
+<category><pattern>FORMAL</pattern><template><formal>john   ronald reuel</formal></template></category>
+<category><pattern>SENTENCE</pattern><template><sentence>  hello world. bye</sentence></template></category>
+<category><pattern>THINK</pattern><template>Before<think>hidden text</think> after.</template></category>
+<category><pattern>NESTED</pattern>
+<template>
+  <sentence><lowercase>THE QUICK</lowercase> <uppercase>brown <formal>fox jumps</formal></uppercase></sentence>
+  over.
+</template></category>
+<category><pattern>UPPER *</pattern><template><uppercase>hi <star/></uppercase>!</template></category>
+<category><pattern>CALL ME *</pattern><template><think><set name="name"><formal><star/></formal></set></think>Noted.</template></category>
+<category><pattern>WHO AM I</pattern><template><sentence>you are <get name="name"/></sentence>.</template></category>
+<category><pattern>REDIRECT</pattern><template><lowercase><srai>UPPER</srai></lowercase></template></category>
+</aiml>
+"""
+
+INPUTS = ["upper", "lower", "formal", "sentence", "think", "nested", "upper there you",
+          "call me ada lovelace", "who am i", "redirect"]
+
+
+def kernels(tmp_path):
+    (tmp_path / "test.aiml").write_text(AIML)
+    stock = aiml.Kernel()
+    stock.verbose(False)
+    stock.learn(str(tmp_path / "test.aiml"))
+
+    compiled = aiml.Kernel()
+    compiled.verbose(False)
+    template_compiler.install(compiled)
+    compiled._brain = CompactPatternMgr.from_pattern_mgr(stock._brain)
+    return stock, compiled
+
+
+def template(kernel, pattern):
+    return kernel._brain.match(pattern, "", "")
+
+
+def test_compiled_templates_answer_like_the_stock_handlers(tmp_path):
+    stock, compiled = kernels(tmp_path)
+    for text in INPUTS:
+        assert compiled.respond(text, "s") == stock.respond(text, "s"), text
+
+
+def test_constant_content_is_folded(tmp_path):
+    _, compiled = kernels(tmp_path)
+    folded = {"UPPER": "a SHOUT IT b", "LOWER": "quiet please", "FORMAL": "John Ronald Reuel",
+              "SENTENCE": "Hello world. bye", "THINK": "Before after."}
+    for pattern, text in folded.items():
+        compiled_template = template(compiled, pattern)
+        assert is_constant(compiled_template), pattern
+        assert compiled_template[2] == text
+
+
+def test_session_dependent_content_is_left_alone(tmp_path):
+    _, compiled = kernels(tmp_path)
+    assert template(compiled, "UPPER X") == [
+        COMPILED, {}, ["uppercase", {}, ["text", {"xml:space": "preserve"}, "hi "],
+                       ["star", {}]], "!"]
+    call = template(compiled, "CALL ME X")
+    assert call[2][0] == "think" and call[3] == "Noted."
+    assert template(compiled, "REDIRECT")[2][0] == "lowercase"
+
+
+def test_compile_template_is_idempotent():
+    tree = ["template", {}, ["text", {"xml:space": "default"}, "a  b"]]
+    compiled = compile_template(tree)
+    assert compiled == [COMPILED, {}, "a b"]
+    assert compile_template(compiled) is compiled
+
+
+@pytest.mark.parametrize("tag", ["uppercase", "lowercase", "formal", "sentence", "think"])
+def test_each_foldable_tag_matches_its_stock_handler(tag):
+    stock = aiml.Kernel()
+    stock.verbose(False)
+    text = ["text", {"xml:space": "default"}, "  mIxed   case words. and more "]
+    elem = [tag, {}, text]
+    folded = compile_template(["template", {}, elem])
+    assert is_constant(folded) or folded == [COMPILED, {}]
+    expected = stock._processElement(elem, "s")
+    assert (folded[2] if len(folded) > 2 else "") == expected
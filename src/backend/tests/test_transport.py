@@ -0,0 +1,67 @@
+import json
+import threading
+
+import pytest
+import simple_websocket
+from werkzeug.serving import make_server
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+@pytest.fixture
+def ws(app):
+    """A WebSocket connected to /ws on a local server, past its "session" frame."""
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    socket = simple_websocket.Client.connect(f"ws://127.0.0.1:{server.server_port}/ws")
+    first = receive(socket)
+    assert first["type"] == "session" and first["session_id"]
+    yield socket
+    socket.close()
+    server.shutdown()
+
+
+def receive(socket, skip=("usage",)):
+    while True:
+        frame = json.loads(socket.receive(timeout=10))
+        if frame["type"] not in skip:
+            return frame
+
+
+def test_chat_turn(client):
+    response = client.post("/chat", json={"message": "hello", "mode": "AIML"})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["response"] == "Hi there."
+    assert body["session_id"]
+
+
+@pytest.mark.parametrize("body", ["null", "[]", '"x"', "3", "not json"])
+def test_chat_rejects_bodies_that_are_not_objects(client, body):
+    response = client.post("/chat", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object"}
+
+
+def test_ws_turn(ws):
+    ws.send(json.dumps({"type": "chat", "message": "hello"}))
+    reply = receive(ws)
+    assert reply["type"] == "reply"
+    assert reply["status"] == 200
+    assert reply["response"] == "Hi there."
+
+
+@pytest.mark.parametrize("frame, error", [
+    ("{not json", "Invalid JSON"),
+    ("[1]", "Frames must be JSON objects"),
+    ("3", "Frames must be JSON objects"),
+    ('{"type": "ping"}', "Unknown message type: ping"),
+])
+def test_ws_bad_frames_get_an_error_and_keep_the_connection(ws, frame, error):
+    ws.send(frame)
+    assert receive(ws) == {"type": "error", "error": error}
+    ws.send(json.dumps({"type": "chat", "message": "what is your name"}))
+    assert receive(ws)["response"] == "My name is Testbot."
@@ -16,13 +16,84 @@ function App() {
   const [sessionId, setSessionId] = useState(null)
   const [llmError, setLlmError] = useState(null)
   const messagesEndRef = useRef(null)
+  const wsRef = useRef(null)
+  const sessionIdRef = useRef(null)
+  const streamingRef = useRef(false)
 
   // Backend URL from environment variable
   const BACKEND_URL = import.meta.env.VITE_BACKEND_URL || 'http://localhost:3011'
+  const WS_URL = BACKEND_URL.replace(/^http/, 'ws') + '/ws'
 
-  // Fetch stats from backend on mount and periodically
+  const wsOpen = () => wsRef.current && wsRef.current.readyState === WebSocket.OPEN
+
+  // Keep one WebSocket per session for chat turns, streamed LLM output and
+  // pushed usage stats; reconnect with the same session if it drops.
+  useEffect(() => {
+    let closed = false
+    let retryTimer = null
+
+    const connect = () => {
+      const query = sessionIdRef.current ? `?session_id=${encodeURIComponent(sessionIdRef.current)}` : ''
+      const ws = new WebSocket(WS_URL + query)
+      wsRef.current = ws
+
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data)
+        if (data.type === 'session') {
+          sessionIdRef.current = data.session_id
+          setSessionId(data.session_id)
+        } else if (data.type === 'usage') {
+          setTotalTokens(data.total_tokens || 0)
+          setTotalSpend(data.total_spend || 0)
+        } else if (data.type === 'delta') {
+          appendDelta(data.text)
+        } else if (data.type === 'reply') {
+          ws.pendingTurn = false
+          handleReply(data)
+          setIsLoading(false)
+        } else if (data.type === 'error') {
+          // The server could not run the turn: show why and stop waiting
+          ws.pendingTurn = false
+          streamingRef.current = false
+          setIsLoading(false)
+          setMessages(prev => [...prev, { 
+            type: 'bot', 
+            text: `Sorry, something went wrong: ${data.error}` 
+          }])
+        }
+      }
+
+      ws.onclose = () => {
+        if (wsRef.current === ws) {
+          wsRef.current = null
+        }
+        if (ws.pendingTurn) {
+          streamingRef.current = false
+          setIsLoading(false)
+          setMessages(prev => [...prev, { 
+            type: 'bot', 
+            text: 'Sorry, I\'m having trouble connecting to the server. Please try again.' 
+          }])
+        }
+        if (!closed) {
+          retryTimer = setTimeout(connect, 2000)
+        }
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(retryTimer)
+      wsRef.current?.close()
+    }
+  }, [])
+
+  // Fetch stats from backend on mount and periodically (only while the
+  // WebSocket is down; otherwise the backend pushes them)
   useEffect(() => {
     const fetchStats = async () => {
+      if (wsOpen()) return
       try {
         const response = await fetch(`${BACKEND_URL}/stats`)
         if (response.ok) {
@@ -48,6 +119,57 @@ function App() {
     scrollToBottom()
   }, [messages])
 
+  // Show streamed LLM output as it arrives
+  const appendDelta = (text) => {
+    if (!streamingRef.current) {
+      streamingRef.current = true
+      setMessages(prev => [...prev, { type: 'bot', text, streaming: true }])
+    } else {
+      setMessages(prev => {
+        const last = prev[prev.length - 1]
+        return [...prev.slice(0, -1), { ...last, text: last.text + text }]
+      })
+    }
+  }
+
+  const handleReply = (data) => {
+    // Check for LiteLLM errors
+    if (data.error) {
+      setLlmError(data.error)
+    } else {
+      setLlmError(null)
+    }
+    
+    // Store session ID for conversation continuity
+    if (data.session_id && !sessionIdRef.current) {
+      sessionIdRef.current = data.session_id
+      setSessionId(data.session_id)
+    }
+    
+    // Update session token count
+    const tokens = data.tokens || { total: 0 }
+    setSessionTokens(prev => prev + tokens.total)
+    
+    // Add bot response with source info and token count
+    const responseText = data.response
+    const sourceInfo = data.source ? ` 💭 ${data.source}` : ''
+    const reply = { 
+      type: 'bot', 
+      text: responseText + sourceInfo,
+      source: data.source,
+      mode: data.mode,
+      tokens: tokens
+    }
+    
+    if (streamingRef.current) {
+      // Replace the streamed message with the final one
+      streamingRef.current = false
+      setMessages(prev => [...prev.slice(0, -1), reply])
+    } else {
+      setMessages(prev => [...prev, reply])
+    }
+  }
+
   const sendMessage = async () => {
     if (!inputValue.trim() || isLoading) return
 
@@ -58,6 +180,16 @@ function App() {
     // Add user message
     setMessages(prev => [...prev, { type: 'user', text: userMessage }])
 
+    if (wsOpen()) {
+      wsRef.current.pendingTurn = true
+      wsRef.current.send(JSON.stringify({
+        type: 'chat',
+        message: userMessage,
+        mode: chatMode
+      }))
+      return
+    }
+
     try {
       const response = await fetch(`${BACKEND_URL}/chat`, {
         method: 'POST',
@@ -67,7 +199,7 @@ function App() {
         body: JSON.stringify({ 
           message: userMessage,
           mode: chatMode,
-          session_id: sessionId
+          session_id: sessionIdRef.current
         }),
       })
 
@@ -76,34 +208,7 @@ function App() {
       }
 
       const data = await response.json()
-      
-      // Check for LiteLLM errors
-      if (data.error) {
-        setLlmError(data.error)
-      } else {
-        setLlmError(null)
-      }
-      
-      // Store session ID for conversation continuity
-      if (data.session_id && !sessionId) {
-        setSessionId(data.session_id)
-      }
-      
-      // Update session token count
-      const tokens = data.tokens || { total: 0 }
-      setSessionTokens(prev => prev + tokens.total)
-      
-      // Add bot response with source info and token count
-      const responseText = data.response
-      const sourceInfo = data.source ? ` 💭 ${data.source}` : ''
-      
-      setMessages(prev => [...prev, { 
-        type: 'bot', 
-        text: responseText + sourceInfo,
-        source: data.source,
-        mode: data.mode,
-        tokens: tokens
-      }])
+      handleReply(data)
     } catch (error) {
       console.error('Error:', error)
       setLlmError(error.message || 'Connection error')
@@ -243,7 +348,7 @@ function App() {
               </button>
             </div>
           ))}
-          {isLoading && (
+          {isLoading && !streamingRef.current && (
             <div className="message bot">
               <div className="message-content loading">
                 <div className="typing-indicator">